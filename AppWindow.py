@@ -6,6 +6,60 @@ import numpy as np
 
 from TreeProject import TreeProject
 from properties_field import PropertiesField
+import evp_parser
+from event_catalog import EventCatalog
+from geometry_cache import catalog_cache
+from glyph_instancing import GLYPH_TYPES, DEFAULT_ENERGY_COLORS, default_energy_colors
+from loader_pipeline import LoaderPipeline
+from object_constructors import prepare_dxf_geometry
+
+
+# Загрузчики для фонового потока: только разбор файлов в массивы, без OpenGL и виджетов
+
+def transform_event_coordinates(x, y, z):
+    """ПРОСТОЕ преобразование координат событий: меняем Y и Z местами (работает и с массивами)"""
+    # Берем Z как Y (высота), Y как Z (глубина)
+    return x, z, y
+
+
+def load_evp_events(file_path, progress=None):
+    """Разбор .evp/.evg в каталог событий (повторно - из двоичного кэша)"""
+    catalog = catalog_cache.load(file_path, loader="evp")
+    if catalog is not None:
+        return catalog
+
+    events = evp_parser.parse_evp_file(file_path, progress)
+    positions = np.column_stack(transform_event_coordinates(events['x'], events['y'], events['z']))
+    catalog = EventCatalog(positions, events['energy'], magnitude=events['magnitude'],
+                           type_code=events['event_type'], date=events['date'], time=events['time'])
+    catalog_cache.store(file_path, catalog, loader="evp")
+    return catalog
+
+
+def load_events_csv(file_path, progress=None):
+    """Разбор events.csv в каталог событий (повторно - из двоичного кэша)"""
+    catalog = catalog_cache.load(file_path, loader="csv")
+    if catalog is not None:
+        return catalog
+
+    fx = lambda x: float(x.replace(',', '.'))
+    positions, energies, event_types = [], [], []
+    with open(file_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=';', quotechar='|')
+        for row in reader:
+            if len(row) >= 6:
+                try:
+                    positions.append((fx(row[1]), fx(row[3]), fx(row[2])))
+                    energies.append(fx(row[5]) if len(row) > 5 else 1.0)
+                    event_types.append(row[-1] if row[-1] else "unknown")
+                except (ValueError, IndexError) as e:
+                    print(f"Ошибка загрузки события: {e}")
+                    continue
+
+    catalog = EventCatalog.from_type_names(np.array(positions, dtype=np.float64).reshape(-1, 3),
+                                           np.array(energies, dtype=np.float64), event_types)
+    catalog_cache.store(file_path, catalog, loader="csv")
+    return catalog
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -18,8 +72,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.glWidget = glWidget
         self.loaded_files = {}
 
+        # Фоновая загрузка файлов с прогрессом в дереве проектов
+        self.loader = LoaderPipeline(self)
+
         # Создаем treeView через новый класс
         self.treeView = TreeProject(self)
+        self.loader.progressChanged.connect(self.treeView.set_file_progress)
+        self.loader.loadEnded.connect(self.treeView.set_file_progress)
 
         # Создаем поле свойств
         self.properties_field = PropertiesField(self)
@@ -32,7 +91,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # GUI
         self.initGUI()
-        self.initTimer()
+
+        # Сведения об элементе под курсором - в строке состояния
+        self.statusBar()
+        self.glWidget.hoverChanged.connect(self.show_picked_item)
+        self.glWidget.selectionChanged.connect(self.show_picked_item)
 
     def initMenu(self):
         fileMenu = self.menuBar.addMenu('Файл')
@@ -54,6 +117,26 @@ class MainWindow(QtWidgets.QMainWindow):
         collapseAllAction.triggered.connect(self.treeView.collapseAll)
         refreshAction.triggered.connect(self.treeView.refresh_projects)
 
+        # Сетка ребер моделей: по умолчанию только границы, изломы и полилинии
+        allEdgesAction = QtWidgets.QAction('Все ребра моделей', self)
+        allEdgesAction.setCheckable(True)
+        allEdgesAction.setChecked(self.glWidget.allEdges)
+        allEdgesAction.toggled.connect(self.glWidget.set_all_edges)
+
+        # Раскраска поверхностей моделей - переключается без перезагрузки
+        elevationAction = QtWidgets.QAction('Раскраска моделей по высоте', self)
+        elevationAction.setCheckable(True)
+        elevationAction.toggled.connect(lambda checked: self.glWidget.set_surface_style(elevation_ramp=checked))
+        slopeAction = QtWidgets.QAction('Подсветка уступов и откосов', self)
+        slopeAction.setCheckable(True)
+        slopeAction.toggled.connect(lambda checked: self.glWidget.set_surface_style(slope_highlight=checked))
+
+        # Сферы и пляжные мячики событий: импостеры (квадрат на событие) или сетки с уровнями детализации
+        impostorAction = QtWidgets.QAction('Сферы событий импостерами', self)
+        impostorAction.setCheckable(True)
+        impostorAction.setChecked(self.glWidget.glyphs.impostors)
+        impostorAction.toggled.connect(self.glWidget.set_glyph_impostors)
+
         fileMenu.addAction(createProjectAction)
         fileMenu.addAction(openProjectAction)
 
@@ -61,6 +144,11 @@ class MainWindow(QtWidgets.QMainWindow):
         viewMenu.addAction(expandAllAction)
         viewMenu.addAction(collapseAllAction)
         viewMenu.addAction(refreshAction)
+        viewMenu.addSeparator()
+        viewMenu.addAction(allEdgesAction)
+        viewMenu.addAction(elevationAction)
+        viewMenu.addAction(slopeAction)
+        viewMenu.addAction(impostorAction)
 
     def initToolBar(self):
         self.menuToolBar = QtWidgets.QToolBar('Меню с иконками')
@@ -157,138 +245,64 @@ class MainWindow(QtWidgets.QMainWindow):
         self.main_splitter = main_splitter
         self.left_splitter = left_splitter
 
-    def initTimer(self):
-        timer = QtCore.QTimer(self)
-        timer.setInterval(20)  # 20 мс
-        timer.timeout.connect(self.glWidget.updateGL)
-        timer.start()
-
-    # Все остальные методы остаются без изменений
-    def parse_evp_file(self, file_path):
-        """Парсинг .evp файла с сейсмическими событиями"""
-        try:
-            # Пробуем разные кодировки
-            encodings = ['windows-1251', 'cp1251', 'iso-8859-1', 'utf-8']
-            file_content = None
-
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        file_content = f.readlines()
-                    break
-                except UnicodeDecodeError:
-                    continue
-
-            if file_content is None:
-                QtWidgets.QMessageBox.warning(self, "Ошибка", "Не удалось определить кодировку файла")
-                return []
-
-            events_data = []
-            events_count = 0
-
-            # ДОБАВЛЯЕМ СТАТИСТИКУ ПО КООРДИНАТАМ
-            all_x, all_y, all_z = [], [], []
-
-            for line_num, line in enumerate(file_content, 1):
-                line = line.strip()
-
-                # Пропускаем пустые строки и комментарии
-                if not line or line.startswith('#'):
-                    continue
-
-                # Разбиваем строку по пробелам (убираем множественные пробелы)
-                parts = line.split()
-
-                # В вашем файле минимум нужно: дата, время, магнитуда, X, Y, Z
-                if len(parts) < 6:
-                    print(f"Пропущена строка {line_num}: недостаточно данных ({len(parts)} колонок)")
-                    continue
-
-                try:
-                    # Парсим основные параметры события из .evp файла
-                    date_str = parts[0]  # Дата (например: 20160411)
-                    time_str = parts[1]  # Время (например: 081902)
-                    magnitude = float(parts[2]) if parts[2] != 'NaN' else 0.0
-                    x = float(parts[3])  # Координата X
-                    y = float(parts[4])  # Координата Y
-                    z = float(parts[5])  # Координата Z (глубина)
-
-                    # Сохраняем координаты для статистики
-                    all_x.append(x)
-                    all_y.append(y)
-                    all_z.append(z)
-
-                    # Ищем энергию в следующих колонках (может быть в разных позициях)
-                    energy = 0.0
-                    energy_found = False
-
-                    # Пробуем найти числовые значения энергии в колонках 6-20
-                    for i in range(6, min(20, len(parts))):
-                        try:
-                            part = parts[i]
-                            # Пропускаем нулевые значения и NaN
-                            if part in ['0.000000e+00', 'NaN', '0.0', '0']:
-                                continue
-
-                            # Пробуем преобразовать в float
-                            energy_val = float(part)
-                            if energy_val > 0:
-                                energy = energy_val
-                                energy_found = True
-                                break
-                        except (ValueError, IndexError):
-                            continue
-
-                    # Если не нашли энергию, используем магнитуду как приближение
-                    if not energy_found and magnitude > 0:
-                        energy = 10 ** (1.5 * magnitude + 4.8)  # Примерная формула
-                    elif not energy_found:
-                        energy = 1.0  # Значение по умолчанию
-
-                    # Определяем тип события по магнитуде
-                    if magnitude > 2.0:
-                        event_type = "explosion"
-                    elif magnitude > 0.5:
-                        event_type = "earthquake"
-                    else:
-                        event_type = "microseismic"
-
-                    events_data.append({
-                        'x': x, 'y': y, 'z': z,
-                        'event_type': event_type,
-                        'energy': energy,
-                        'magnitude': magnitude
-                    })
-                    events_count += 1
-
-                except (ValueError, IndexError) as e:
-                    print(f"Ошибка в строке {line_num}: {e}")
-                    continue
-
-            print(f"Загружено {events_count} событий из {file_path}")
-            if all_x:
-                print(f"=== EVP ФАЙЛ: {os.path.basename(file_path)} ===")
-                print(f"Количество событий: {len(all_x)}")
-                print(f"Координата X: min={min(all_x):.1f}, max={max(all_x):.1f}, avg={np.mean(all_x):.1f}")
-                print(f"Координата Y: min={min(all_y):.1f}, max={max(all_y):.1f}, avg={np.mean(all_y):.1f}")
-                print(f"Координата Z: min={min(all_z):.1f}, max={max(all_z):.1f}, avg={np.mean(all_z):.1f}")
-                print("=" * 50)
-            return events_data
-
-        except Exception as e:
-            QtWidgets.QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить .evp файл: {str(e)}")
-            return []
-
-    def transform_event_coordinates(self, x, y, z):
-        """ПРОСТОЕ преобразование координат событий: меняем Y и Z местами"""
-        # Просто меняем Y и Z местами
-        new_x = x
-        new_y = z  # Берем Z как Y (высота)
-        new_z = y  # Берем Y как Z (глубина)
-
-        print(f"Преобразование: ({x:.1f}, {y:.1f}, {z:.1f}) -> ({new_x:.1f}, {new_y:.1f}, {new_z:.1f})")
-
-        return new_x, new_y, new_z
+    def event_energy_ranges(self, file_path):
+        """Настройки диапазонов энергии файла (пустой словарь, если их нет)"""
+        if not hasattr(self, 'properties_field'):
+            return {}
+        return self.properties_field.file_properties.get(file_path, {}).get('energy_ranges') or {}
+
+    def resolve_event_styles(self, file_path, catalog):
+        """Тип визуализации и RGBA цвет каждого события по настройкам диапазонов энергии файла.
+
+        Индексы диапазонов берутся из каталога (catalog.set_ranges уже вызван).
+        """
+        n = len(catalog)
+        energy_ranges = self.event_energy_ranges(file_path)
+        if not energy_ranges:
+            return np.full(n, "spheres", dtype='<U11'), default_energy_colors(catalog.energy)
+
+        glyph_types = np.full(n, "spheres", dtype='<U11')
+        colors = np.tile(np.array([1.0, 0.0, 0.0, 1.0], dtype=np.float32), (n, 1))
+        for i, thresh in enumerate(catalog.thresholds):
+            mask = catalog.range_index == i
+            range_props = energy_ranges[thresh]
+            glyph_types[mask] = range_props.get('visualization', 'spheres')
+            colors[mask, :3] = range_props.get('color', [1.0, 0.0, 0.0])[:3]
+            colors[mask, 3] = range_props.get('opacity', 1.0)
+
+        # неизвестные типы визуализации рисуем сферами
+        glyph_types[~np.isin(glyph_types, GLYPH_TYPES)] = "spheres"
+        return glyph_types, colors
+
+    def add_event_file(self, file_path, catalog):
+        """Размещает события файла в буферах экземпляров с учетом сохраненных свойств"""
+        # индексы диапазонов считаются один раз - правки свойств пишут прямо в буферы экземпляров
+        catalog.set_ranges(self.event_energy_ranges(file_path) or [t for t, _ in DEFAULT_ENERGY_COLORS])
+        glyph_types, colors = self.resolve_event_styles(file_path, catalog)
+        self.glWidget.add_events(file_path, catalog, glyph_types, colors)
+        # у файлов событий нет отдельных объектов сцены - только набор экземпляров
+        self.loaded_files[file_path] = []
+
+    def set_file_enabled(self, file_path, enabled):
+        """Включает/выключает все объекты и события загруженного файла"""
+        for obj_id in self.loaded_files.get(file_path, []):
+            self.glWidget.set_object_enabled(obj_id, enabled)
+
+        if file_path in self.glWidget.event_sets:
+            self.glWidget.event_sets[file_path].set_enabled(enabled)
+
+        self.glWidget.request_update()
+
+    def show_picked_item(self, item):
+        """Показывает в строке состояния объект или событие под курсором"""
+        if item is None:
+            self.statusBar().clearMessage()
+        elif item[0] == 'event' and item[1] in self.glWidget.event_sets:
+            event_set = self.glWidget.event_sets[item[1]]
+            self.statusBar().showMessage(f"{os.path.basename(item[1])}: {event_set.catalog.describe(item[2])}")
+        elif item[0] == 'object':
+            file_name = next((os.path.basename(path) for path, ids in self.loaded_files.items() if item[1] in ids), "")
+            self.statusBar().showMessage(f"Объект {item[1]} {file_name}".strip())
 
     def addToProject(self):
         """Добавляет файлы в выбранный проект (работает с любыми папками)"""
@@ -421,41 +435,71 @@ class MainWindow(QtWidgets.QMainWindow):
         if visible:
             # Если файл уже загружен, просто включаем его
             if file_path in self.loaded_files:
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = True
-                        self.glWidget.objects[obj_id].mesh.enabled = True
-                        print(f"DXF объект {obj_id} включен")
+                self.set_file_enabled(file_path, True)
+                # дерево могло быть перестроено - слои добавляются заново
+                self.show_dxf_layers(file_path)
             else:
-                # Загружаем новый DXF файл
-                try:
-                    print(f"Загрузка нового DXF файла: {file_path}")
-                    self.glWidget.add_object_dxf(file_path)
-
-                    # Проверяем что объект был создан
-                    if len(self.glWidget.objects) == 0:
-                        QtWidgets.QMessageBox.warning(self, "Предупреждение",
-                                                      f"DXF файл {os.path.basename(file_path)} не содержит 3D геометрии.\n"
-                                                      f"Был создан объект-заглушка.")
-                    else:
-                        # Находим последний добавленный объект
-                        new_obj_id = list(self.glWidget.objects.keys())[-1]
-                        self.loaded_files[file_path] = [new_obj_id]
-                        print(f"DXF файл загружен: {file_path}, объект ID: {new_obj_id}")
-
-                except Exception as e:
-                    print(f"Ошибка загрузки DXF файла {file_path}: {e}")
-                    QtWidgets.QMessageBox.warning(self, "Ошибка",
-                                                  f"Не удалось загрузить DXF файл: {str(e)}\n"
-                                                  f"Файл может быть пустым или использовать неподдерживаемые объекты.")
+                # Разбираем новый DXF файл в фоне, объект создается по готовности
+                print(f"Загрузка нового DXF файла: {file_path}")
+                self.loader.submit(file_path, prepare_dxf_geometry, file_path,
+                                   on_done=lambda geometry: self.on_dxf_loaded(file_path, geometry),
+                                   on_error=lambda message: self.on_dxf_failed(file_path, message))
         else:
-            # ВЫКЛЮЧАЕМ DXF
-            if file_path in self.loaded_files:
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = False
-                        self.glWidget.objects[obj_id].mesh.enabled = False
-                        print(f"DXF объект {obj_id} выключен")
+            # ВЫКЛЮЧАЕМ DXF (незавершенная загрузка отменяется)
+            self.loader.cancel(file_path)
+            self.set_file_enabled(file_path, False)
+
+    def on_dxf_loaded(self, file_path, geometry):
+        """Создает объект сцены из подготовленной в фоне геометрии"""
+        try:
+            obj = self.glWidget.add_object_dxf_geometry(geometry)
+        except Exception as e:
+            self.on_dxf_failed(file_path, str(e))
+            return
+
+        self.loaded_files[file_path] = [obj.id]
+        print(f"DXF файл загружен: {file_path}, объект ID: {obj.id}")
+        self.show_dxf_layers(file_path)
+
+        if sum(len(geometry[name]) for name in ('faces_t', 'faces_q', 'edges', 'polylines')) == 0:
+            QtWidgets.QMessageBox.warning(self, "Предупреждение",
+                                          f"DXF файл {os.path.basename(file_path)} не содержит 3D геометрии.\n"
+                                          f"Был создан объект-заглушка.")
+
+    def on_dxf_failed(self, file_path, message):
+        print(f"Ошибка загрузки DXF файла {file_path}: {message}")
+        QtWidgets.QMessageBox.warning(self, "Ошибка",
+                                      f"Не удалось загрузить DXF файл: {message}\n"
+                                      f"Файл может быть пустым или использовать неподдерживаемые объекты.")
+
+    def dxf_mesh(self, file_path):
+        """Сетка объекта загруженного DXF файла или None"""
+        for obj_id in self.loaded_files.get(file_path, []):
+            if obj_id in self.glWidget.objects:
+                return self.glWidget.objects[obj_id].mesh
+        return None
+
+    def show_dxf_layers(self, file_path):
+        """Слои DXF модели - дочерние элементы файла в дереве проектов"""
+        mesh = self.dxf_mesh(file_path)
+        if mesh is not None and mesh.layerNames:
+            self.treeView.set_file_layers(file_path, mesh.layerNames, mesh.layerVisible, mesh.layerColors)
+
+    def set_dxf_layer_visible(self, file_path, layer, visible):
+        """Показывает/скрывает слой DXF модели - меняются только диапазоны отрисовки, без перезагрузки"""
+        mesh = self.dxf_mesh(file_path)
+        if mesh is None:
+            return
+        mesh.set_layer_visible(layer, visible)
+        self.glWidget.request_update()
+
+    def set_dxf_layer_color(self, file_path, layer, color):
+        """Задает цвет слоя DXF модели (None - цвет модели)"""
+        mesh = self.dxf_mesh(file_path)
+        if mesh is None:
+            return
+        mesh.set_layer_color(layer, color)
+        self.glWidget.request_update(scene_changed=False)
 
     def toggle_evp_file(self, file_path, visible):
         """Включает/выключает EVP файл - С СОХРАНЕННОЙ ПРОЗРАЧНОСТЬЮ"""
@@ -464,71 +508,25 @@ class MainWindow(QtWidgets.QMainWindow):
         if visible:
             if file_path not in self.loaded_files:
                 print(f"🔄 Загрузка EVP файла: {file_path}")
-                events_data = self.parse_evp_file(file_path)
-
-                object_ids = []
-                for event in events_data:
-                    try:
-                        x, y, z = self.transform_event_coordinates(event['x'], event['y'], event['z'])
-                        energy = event['energy']
-
-                        # Получаем настройки визуализации И ПРОЗРАЧНОСТЬ
-                        visualization_type = "spheres"
-                        base_color = [1.0, 0.0, 0.0]
-                        opacity = 1.0  # по умолчанию
-
-                        if hasattr(self, 'properties_field') and file_path in self.properties_field.file_properties:
-                            props = self.properties_field.file_properties[file_path]
-
-                            # Проверяем energy_ranges
-                            if 'energy_ranges' in props:
-                                thresholds = sorted(props['energy_ranges'].keys(), reverse=True)
-                                for thresh in thresholds:
-                                    if energy >= thresh:
-                                        range_props = props['energy_ranges'][thresh]
-                                        visualization_type = range_props.get('visualization', 'spheres')
-                                        base_color = range_props.get('color', [1.0, 0.0, 0.0])
-                                        # Получаем сохраненную прозрачность для этого диапазона
-                                        opacity = range_props.get('opacity', 1.0)
-
-                                        # Формируем RGBA цвет с сохраненной прозрачностью
-                                        rgba_color = list(base_color[:3]) + [opacity]
-                                        break
-
-                        print(f"🎯 Создание: тип={visualization_type}, прозрачность={opacity}, цвет={rgba_color}")
-
-                        # Создаем объект с нужным типом И ПРОЗРАЧНОСТЬЮ
-                        if visualization_type == "spheres":
-                            new_obj = self.glWidget.add_object_event(x, y, z, event['event_type'], energy, rgba_color)
-                        elif visualization_type == "beach_balls":
-                            new_obj = self.glWidget.add_object_beach_ball(x, y, z, event['event_type'], energy, rgba_color)
-                        elif visualization_type == "points":
-                            new_obj = self.glWidget.add_object_point(x, y, z, event['event_type'], energy, rgba_color)
-                        else:
-                            new_obj = self.glWidget.add_object_event(x, y, z, event['event_type'], energy, rgba_color)
-
-                        new_obj_id = list(self.glWidget.objects.keys())[-1]
-                        object_ids.append(new_obj_id)
-
-                    except Exception as e:
-                        print(f"❌ Ошибка добавления события: {e}")
-                        continue
-
-                self.loaded_files[file_path] = object_ids
-                print(f"✅ Файл загружен с сохраненной прозрачностью, объектов: {len(object_ids)}")
+                self.loader.submit(file_path, load_evp_events, file_path,
+                                   on_done=lambda catalog: self.on_events_loaded(file_path, catalog),
+                                   on_error=lambda message: self.on_evp_failed(file_path, message))
             else:
                 # Включаем уже загруженные события
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = True
-                        self.glWidget.objects[obj_id].mesh.enabled = True
+                self.set_file_enabled(file_path, True)
         else:
-            # Выключаем события
-            if file_path in self.loaded_files:
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = False
-                        self.glWidget.objects[obj_id].mesh.enabled = False
+            # Выключаем события (незавершенная загрузка отменяется)
+            self.loader.cancel(file_path)
+            self.set_file_enabled(file_path, False)
+
+    def on_events_loaded(self, file_path, catalog):
+        """Размещает события, разобранные в фоне"""
+        self.add_event_file(file_path, catalog)
+        print(f"✅ Файл загружен с сохраненной прозрачностью, событий: {len(catalog)} "
+              f"({catalog.nbytes / max(1, len(catalog)):.0f} байт на событие в каталоге)")
+
+    def on_evp_failed(self, file_path, message):
+        QtWidgets.QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить .evp файл: {message}")
 
     def toggle_detectors_file(self, file_path, visible):
         """Включает/выключает detectors.csv"""
@@ -559,59 +557,26 @@ class MainWindow(QtWidgets.QMainWindow):
                     print(f"Ошибка загрузки detectors.csv: {e}")
             else:
                 # Включаем уже загруженные детекторы
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = True
-                        self.glWidget.objects[obj_id].mesh.enabled = True
+                self.set_file_enabled(file_path, True)
         else:
             # Выключаем детекторы
-            if file_path in self.loaded_files:
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = False
-                        self.glWidget.objects[obj_id].mesh.enabled = False
+            self.set_file_enabled(file_path, False)
 
     def toggle_events_csv_file(self, file_path, visible):
         """Включает/выключает events.csv"""
         if visible:
             # Загружаем events.csv если еще не загружен
             if file_path not in self.loaded_files:
-                fx = lambda x: float(x.replace(',', '.'))
-                object_ids = []
-                try:
-                    with open(file_path, newline='', encoding='utf-8') as f:
-                        reader = csv.reader(f, delimiter=';', quotechar='|')
-                        for row in reader:
-                            if len(row) >= 6:
-                                try:
-                                    x = fx(row[1])
-                                    y = fx(row[3])
-                                    z = fx(row[2])
-                                    event_type = row[-1] if row[-1] else "unknown"
-                                    energy = fx(row[5]) if len(row) > 5 else 1.0
-                                    self.glWidget.add_object_event(x, y, z, event_type, energy)
-                                    object_ids.append(list(self.glWidget.objects.keys())[-1])
-                                except (ValueError, IndexError) as e:
-                                    print(f"Ошибка загрузки события: {e}")
-                                    continue
-
-                    self.loaded_files[file_path] = object_ids
-                    print(f"Events CSV загружен: {file_path}")
-                except Exception as e:
-                    print(f"Ошибка загрузки events.csv: {e}")
+                self.loader.submit(file_path, load_events_csv, file_path,
+                                   on_done=lambda catalog: self.on_events_loaded(file_path, catalog),
+                                   on_error=lambda message: print(f"Ошибка загрузки events.csv: {message}"))
             else:
                 # Включаем уже загруженные события
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = True
-                        self.glWidget.objects[obj_id].mesh.enabled = True
+                self.set_file_enabled(file_path, True)
         else:
-            # Выключаем события
-            if file_path in self.loaded_files:
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        self.glWidget.objects[obj_id].enabled = False
-                        self.glWidget.objects[obj_id].mesh.enabled = False
+            # Выключаем события (незавершенная загрузка отменяется)
+            self.loader.cancel(file_path)
+            self.set_file_enabled(file_path, False)
 
     def toggle_generic_csv_file(self, file_path, visible):
         """Включает/выключает другие CSV файлы"""
@@ -628,125 +593,34 @@ class MainWindow(QtWidgets.QMainWindow):
             if file_path.startswith(project_path):
                 files_to_remove.append(file_path)
 
+        # Незавершенные загрузки проекта больше не нужны
+        for file_path in list(self.loader.jobs):
+            if file_path.startswith(project_path):
+                self.loader.cancel(file_path)
+
         # Удаляем объекты из сцены
         for file_path in files_to_remove:
             if file_path in self.loaded_files:
                 for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        del self.glWidget.objects[obj_id]
+                    if self.glWidget.remove_object(obj_id) is not None:
                         print(f"Удален объект {obj_id}")
+                self.glWidget.remove_events(file_path)
                 del self.loaded_files[file_path]
                 print(f"Удалена информация о файле: {file_path}")
 
-    def change_event_visualization(self, obj_id, visualization_type, base_color):
-        """Изменяет визуализацию конкретного события - С ПЕРЕДАЧЕЙ ЦВЕТА"""
-        try:
-            if obj_id not in self.glWidget.objects:
-                return
-
-            obj = self.glWidget.objects[obj_id]
-            if obj.obj_type != "event":
-                return
-
-            # Получаем параметры события
-            x, y, z = obj.location
-            event_type = obj.data.get("type", "unknown")
-            energy = obj.data.get("energy", 1.0)
-
-            if len(base_color) == 3:
-                color_to_use = base_color + [1.0]  # RGB -> RGBA
-            else:
-                color_to_use = base_color
-
-            print(f"🎨 Используемый цвет: {color_to_use}")
-
-            if hasattr(obj, 'mesh'):
-                self.cleanup_mesh_vbo(obj.mesh)
-
-            # Удаляем старый объект
-            del self.glWidget.objects[obj_id]
-
-            # Создаем новый объект с выбранной визуализацией И ПЕРЕДАЕМ ЦВЕТ
-            if visualization_type == "spheres":
-                new_obj = self.glWidget.add_object_event(x, y, z, event_type, energy, color_to_use)
-            elif visualization_type == "beach_balls":
-                new_obj = self.glWidget.add_object_beach_ball(x, y, z, event_type, energy, color_to_use)
-            elif visualization_type == "points":
-                new_obj = self.glWidget.add_object_point(x, y, z, event_type, energy, color_to_use)
-            else:
-                new_obj = self.glWidget.add_object_event(x, y, z, event_type, energy, color_to_use)
-
-            # Сохраняем тот же ID
-            self.glWidget.objects[obj_id] = new_obj
-            print(f"✅ Визуализация изменена для объекта {obj_id}")
-
-        except Exception as e:
-            print(f"❌ Ошибка в change_event_visualization: {e}")
-            import traceback
-            traceback.print_exc()
-
-    def cleanup_mesh_vbo(self, mesh):
-        """Очищает VBO меша из памяти OpenGL"""
-        try:
-            # Удаляем VBO если они существуют
-            if hasattr(mesh, 'verticesVBO') and mesh.verticesVBO:
-                mesh.verticesVBO.delete()
-            if hasattr(mesh, 'colorsFacesVBO') and mesh.colorsFacesVBO:
-                mesh.colorsFacesVBO.delete()
-            if hasattr(mesh, 'colorsEdgesVBO') and mesh.colorsEdgesVBO:
-                mesh.colorsEdgesVBO.delete()
-            if hasattr(mesh, 'colorsHoveredVBO') and mesh.colorsHoveredVBO:
-                mesh.colorsHoveredVBO.delete()
-            if hasattr(mesh, 'colorsSelectedVBO') and mesh.colorsSelectedVBO:
-                mesh.colorsSelectedVBO.delete()
-            if hasattr(mesh, 'colorsEdgesActiveVBO') and mesh.colorsEdgesActiveVBO:
-                mesh.colorsEdgesActiveVBO.delete()
-        except Exception as e:
-            print(f"⚠️ Ошибка при очистке VBO: {e}")
-
     # В класс MainWindow добавим метод для изменения стиля отображения EVP файлов
     def change_evp_visualization(self, file_path, visualization_type):
         """Изменяет способ визуализации для EVP файла"""
         print(f"Изменение визуализации для {file_path} на тип: {visualization_type}")
 
-        # Сначала скрываем текущие объекты
-        if file_path in self.loaded_files:
-            for obj_id in self.loaded_files[file_path]:
-                if obj_id in self.glWidget.objects:
-                    self.glWidget.objects[obj_id].enabled = False
-
-        # Перезагружаем файл с новым типом визуализации
-        events_data = self.parse_evp_file(file_path)
-
-        # Удаляем старые объекты
-        if file_path in self.loaded_files:
-            for obj_id in self.loaded_files[file_path]:
-                if obj_id in self.glWidget.objects:
-                    del self.glWidget.objects[obj_id]
-            self.loaded_files[file_path] = []
-
-        # Создаем новые объекты с выбранным типом визуализации
-        object_ids = []
-        for event in events_data:
-            try:
-                x, y, z = self.transform_event_coordinates(event['x'], event['y'], event['z'])
-
-                if visualization_type == "spheres":
-                    self.glWidget.add_object_event(x, y, z, event['event_type'], event['energy'])
-                elif visualization_type == "beach_balls":
-                    self.glWidget.add_object_beach_ball(x, y, z, event['event_type'], event['energy'])
-                elif visualization_type == "points":
-                    self.glWidget.add_object_point(x, y, z, event['event_type'], event['energy'])
-
-                new_obj_id = list(self.glWidget.objects.keys())[-1]
-                object_ids.append(new_obj_id)
-
-            except Exception as e:
-                print(f"Ошибка добавления события: {e}")
-                continue
+        event_set = self.glWidget.event_sets.get(file_path)
+        if event_set is None:
+            return
 
-        self.loaded_files[file_path] = object_ids
-        print(f"EVP файл перезагружен с типом визуализации: {visualization_type}, объектов: {len(object_ids)}")
+        # Меняется только тип глифа - экземпляры переносятся в другой буфер
+        event_set.restyle(np.full(len(event_set), visualization_type, dtype='<U11'), event_set.colors)
+        self.glWidget.request_update()
+        print(f"EVP файл перестроен с типом визуализации: {visualization_type}, событий: {len(event_set)}")
 
     def show_properties_field(self, file_path, visualization_type):
         """Показывает поле свойств для выбранного файла"""
@@ -780,6 +654,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         """Сохраняем настройки при закрытии приложения"""
+        self.loader.cancel_all()
         try:
             # Сохраняем настройки свойств
             if hasattr(self, 'properties_field'):
@@ -795,204 +670,3 @@ class MainWindow(QtWidgets.QMainWindow):
             print(f"Ошибка при сохранении настроек: {e}")
 
         event.accept()
-
-    def reload_file_with_settings(self, file_path):
-        """Перезагружает файл с применением сохраненных настроек"""
-        try:
-            print(f"🔄 Перезагрузка файла: {os.path.basename(file_path)}")
-
-            # Сохраняем текущее состояние видимости
-            was_visible = file_path in self.loaded_files
-
-            # Полностью удаляем файл из загруженных
-            if file_path in self.loaded_files:
-                # Удаляем все объекты этого файла из сцены
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        # Очищаем VBO перед удалением
-                        obj = self.glWidget.objects[obj_id]
-                        if hasattr(obj, 'mesh'):
-                            self.cleanup_mesh_vbo(obj.mesh)
-                        del self.glWidget.objects[obj_id]
-                # Удаляем запись о файле
-                del self.loaded_files[file_path]
-                print(f"🗑️ Удалены объекты файла {os.path.basename(file_path)}")
-
-            # Загружаем файл заново
-            if was_visible:
-                print(f"🔄 Загружаем файл заново...")
-                if file_path.lower().endswith('.evp'):
-                    self.toggle_evp_file(file_path, True)
-                elif file_path.lower().endswith('.dxf'):
-                    self.toggle_dxf_file(file_path, True)
-                elif file_path.lower().endswith('.csv'):
-                    if os.path.basename(file_path).lower() == "detectors.csv":
-                        self.toggle_detectors_file(file_path, True)
-                    elif os.path.basename(file_path).lower() == "events.csv":
-                        self.toggle_events_csv_file(file_path, True)
-                    else:
-                        self.toggle_generic_csv_file(file_path, True)
-
-                print(f"✅ Файл {os.path.basename(file_path)} перезагружен")
-
-        except Exception as e:
-            print(f"❌ Ошибка при перезагрузке файла: {e}")
-            import traceback
-            traceback.print_exc()
-
-    def reload_file_range(self, file_path, energy_threshold, visualization_type):
-        """Перезагружает только объекты указанного диапазона энергии"""
-        try:
-            print(f"🔄 Перезагрузка диапазона {energy_threshold} файла {os.path.basename(file_path)}")
-
-            if file_path not in self.loaded_files:
-                return
-
-            obj_ids = self.loaded_files[file_path].copy()
-
-            for obj_id in obj_ids:
-                if obj_id in self.glWidget.objects:
-                    obj = self.glWidget.objects[obj_id]
-                    if obj.obj_type == "event":
-                        energy = obj.data.get("energy", 0)
-
-                        try:
-                            energy_float = float(energy) if energy else 0.0
-                        except (ValueError, TypeError):
-                            energy_float = 0.0
-
-                        # Проверяем попадает ли объект в нужный диапазон
-                        if energy_float >= energy_threshold:
-                            # Получаем параметры объекта
-                            x, y, z = obj.location
-                            event_type = obj.data.get("type", "unknown")
-
-                            # Очищаем старый объект
-                            if hasattr(obj, 'mesh'):
-                                self.cleanup_mesh_vbo(obj.mesh)
-
-                            # Удаляем старый объект
-                            del self.glWidget.objects[obj_id]
-
-                            # Получаем сохраненные настройки для нового типа
-                            if hasattr(self, 'properties_field'):
-                                props = self.properties_field.file_properties.get(file_path, {})
-                                color = [1.0, 0.0, 0.0]
-                                opacity = 1.0
-
-                                if 'energy_ranges' in props:
-                                    range_props = props['energy_ranges'].get(energy_threshold, {})
-                                    color = range_props.get('color', color)
-                                    opacity = range_props.get('opacity', 1.0)
-
-                                rgba_color = list(color[:3]) + [opacity]
-
-                                # Создаем новый объект с нужным типом
-                                if visualization_type == "spheres":
-                                    new_obj = self.glWidget.add_object_event(x, y, z, event_type, energy_float,
-                                                                             rgba_color)
-                                elif visualization_type == "beach_balls":
-                                    new_obj = self.glWidget.add_object_beach_ball(x, y, z, event_type, energy_float,
-                                                                                  rgba_color)
-                                elif visualization_type == "points":
-                                    new_obj = self.glWidget.add_object_point(x, y, z, event_type, energy_float,
-                                                                             rgba_color)
-                                else:
-                                    new_obj = self.glWidget.add_object_event(x, y, z, event_type, energy_float,
-                                                                             rgba_color)
-
-                                # Сохраняем тот же ID
-                                self.glWidget.objects[obj_id] = new_obj
-
-            print(f"✅ Диапазон {energy_threshold} перезагружен")
-
-        except Exception as e:
-            print(f"❌ Ошибка перезагрузки диапазона: {e}")
-
-    def reload_file_with_updated_range(self, file_path, energy_threshold, visualization_type, rgba_color):
-        """Перезагружает файл с обновленным диапазоном"""
-        try:
-            print(f"🔄 Перезагрузка диапазона {energy_threshold} файла {os.path.basename(file_path)}")
-            print(f"📊 Тип: {visualization_type}, Цвет: {rgba_color}")
-
-            # Сохраняем видимость
-            was_visible = file_path in self.loaded_files
-
-            # Удаляем файл если загружен
-            if was_visible:
-                self.toggle_evp_file(file_path, False)
-
-            # Обновляем настройки в properties_field
-            if hasattr(self, 'properties_field'):
-                if file_path not in self.properties_field.file_properties:
-                    self.properties_field.initialize_file_properties(file_path, visualization_type)
-
-                # Устанавливаем правильный тип для ВСЕГО файла
-                self.properties_field.file_properties[file_path]['type'] = visualization_type
-
-                # Обновляем настройки для конкретного диапазона
-                if ('energy_ranges' in self.properties_field.file_properties[file_path] and
-                        energy_threshold in self.properties_field.file_properties[file_path]['energy_ranges']):
-                    range_props = self.properties_field.file_properties[file_path]['energy_ranges'][energy_threshold]
-                    range_props['visualization'] = visualization_type
-                    range_props['opacity'] = rgba_color[3]
-                    range_props['color'] = rgba_color[:3]
-
-                # Сохраняем настройки
-                self.properties_field.save_properties_settings()
-
-            # Загружаем файл заново
-            if was_visible:
-                self.toggle_evp_file(file_path, True)
-
-            print(f"✅ Файл перезагружен с обновленным диапазоном")
-
-        except Exception as e:
-            print(f"❌ Ошибка перезагрузки диапазона: {e}")
-            import traceback
-            traceback.print_exc()
-
-    # В MainWindow.py добавьте:
-    def reload_file_with_settings(self, file_path):
-        """Перезагружает файл с применением сохраненных настроек"""
-        try:
-            print(f"🔄 Перезагрузка файла с настройками: {os.path.basename(file_path)}")
-
-            # Сохраняем текущее состояние видимости
-            was_visible = file_path in self.loaded_files
-
-            # Полностью удаляем файл из загруженных
-            if file_path in self.loaded_files:
-                # Удаляем все объекты этого файла из сцены
-                for obj_id in self.loaded_files[file_path]:
-                    if obj_id in self.glWidget.objects:
-                        # Очищаем VBO перед удалением
-                        obj = self.glWidget.objects[obj_id]
-                        if hasattr(obj, 'mesh'):
-                            self.cleanup_mesh_vbo(obj.mesh)
-                        del self.glWidget.objects[obj_id]
-                # Удаляем запись о файле
-                del self.loaded_files[file_path]
-                print(f"🗑️ Удалены объекты файла {os.path.basename(file_path)}")
-
-            # Загружаем файл заново с новыми настройками
-            if was_visible:
-                print(f"🔄 Загружаем файл заново с новыми настройками...")
-                if file_path.lower().endswith('.evp'):
-                    self.toggle_evp_file(file_path, True)
-                elif file_path.lower().endswith('.dxf'):
-                    self.toggle_dxf_file(file_path, True)
-                elif file_path.lower().endswith('.csv'):
-                    if os.path.basename(file_path).lower() == "detectors.csv":
-                        self.toggle_detectors_file(file_path, True)
-                    elif os.path.basename(file_path).lower() == "events.csv":
-                        self.toggle_events_csv_file(file_path, True)
-                    else:
-                        self.toggle_generic_csv_file(file_path, True)
-
-                print(f"✅ Файл {os.path.basename(file_path)} перезагружен с новыми настройками")
-
-        except Exception as e:
-            print(f"❌ Ошибка при перезагрузке файла: {e}")
-            import traceback
-            traceback.print_exc()
\ No newline at end of file
@@ -3,6 +3,10 @@ import shutil
 import json
 from PyQt5 import QtCore, QtWidgets, QtGui
 
+# элементы слоев DXF: путь файла и номер слоя (UserRole у них пустой - это не файлы)
+LAYER_FILE_ROLE = QtCore.Qt.UserRole + 1
+LAYER_ROLE = QtCore.Qt.UserRole + 2
+
 class TreeProject(QtWidgets.QTreeView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -157,6 +161,13 @@ class TreeProject(QtWidgets.QTreeView):
         if item is None:
             return
 
+        # слой DXF модели - меняется только видимость слоя
+        if item.data(LAYER_ROLE) is not None:
+            if self.main_window:
+                self.main_window.set_dxf_layer_visible(item.data(LAYER_FILE_ROLE), item.data(LAYER_ROLE),
+                                                       item.checkState() == QtCore.Qt.Checked)
+            return
+
         # Обрабатываем ТОЛЬКО если элемент имеет чекбокс (файлы)
         if item.isCheckable():
             file_path = item.data(QtCore.Qt.UserRole)
@@ -182,6 +193,10 @@ class TreeProject(QtWidgets.QTreeView):
         if not item:
             return
 
+        if item.data(LAYER_ROLE) is not None:
+            self.show_layer_context_menu(item, position)
+            return
+
         item_path = item.data(QtCore.Qt.UserRole)
 
         # Если это файл EVP - показываем специальное меню
@@ -275,6 +290,33 @@ class TreeProject(QtWidgets.QTreeView):
             else:
                 print("main_window не найден!")
 
+    def show_layer_context_menu(self, item, position):
+        """Контекстное меню слоя DXF модели"""
+        context_menu = QtWidgets.QMenu(self.main_window)
+
+        is_visible = item.checkState() == QtCore.Qt.Checked
+        visibility_action = context_menu.addAction("Скрыть слой" if is_visible else "Показать слой")
+        color_action = context_menu.addAction("Цвет слоя...")
+        reset_action = context_menu.addAction("Цвет модели")
+
+        action = context_menu.exec_(self.viewport().mapToGlobal(position))
+        if action is None or not self.main_window:
+            return
+
+        file_path, layer = item.data(LAYER_FILE_ROLE), item.data(LAYER_ROLE)
+        if action == visibility_action:
+            item.setCheckState(QtCore.Qt.Unchecked if is_visible else QtCore.Qt.Checked)
+            self.main_window.set_dxf_layer_visible(file_path, layer, not is_visible)
+        elif action == color_action:
+            color = QtWidgets.QColorDialog.getColor(QtCore.Qt.white, self.main_window, f"Цвет слоя {item.text()}")
+            if color.isValid():
+                rgb = (color.redF(), color.greenF(), color.blueF())
+                item.setIcon(self.layer_icon(rgb))
+                self.main_window.set_dxf_layer_color(file_path, layer, rgb)
+        elif action == reset_action:
+            item.setIcon(QtGui.QIcon())
+            self.main_window.set_dxf_layer_color(file_path, layer, None)
+
     def close_project(self, item):
         """Закрывает проект (удаляет из дерева)"""
         if item:
@@ -582,13 +624,54 @@ class TreeProject(QtWidgets.QTreeView):
     def get_visualization_type_for_file(self, file_path):
         """Определяет тип визуализации для файла событий"""
         # Проверяем, какой тип визуализации сейчас используется для этого файла
-        if hasattr(self.main_window, 'loaded_files') and file_path in self.main_window.loaded_files:
-            # Берем первый объект из файла и смотрим его тип визуализации
-            obj_ids = self.main_window.loaded_files[file_path]
-            if obj_ids and obj_ids[0] in self.main_window.glWidget.objects:
-                obj = self.main_window.glWidget.objects[obj_ids[0]]
-                if hasattr(obj, 'data') and 'visualization' in obj.data:
-                    return obj.data['visualization']
+        if hasattr(self.main_window, 'glWidget') and file_path in self.main_window.glWidget.event_sets:
+            return self.main_window.glWidget.event_sets[file_path].dominant_glyph_type()
 
         # По умолчанию возвращаем сферы
-        return "spheres"
\ No newline at end of file
+        return "spheres"
+
+    def find_file_item(self, file_path):
+        """Ищет элемент файла в дереве проектов"""
+        for i in range(self.model.rowCount()):
+            project_item = self.model.item(i)
+            for j in range(project_item.rowCount()):
+                file_item = project_item.child(j)
+                if file_item is not None and file_item.data(QtCore.Qt.UserRole) == file_path:
+                    return file_item
+        return None
+
+    @staticmethod
+    def layer_icon(color):
+        """Квадрат цвета слоя (r, g, b от 0 до 1)"""
+        pixmap = QtGui.QPixmap(12, 12)
+        pixmap.fill(QtGui.QColor.fromRgbF(*color))
+        return QtGui.QIcon(pixmap)
+
+    def set_file_layers(self, file_path, names, visible, colors):
+        """Добавляет слои DXF модели дочерними элементами файла (если их еще нет)"""
+        file_item = self.find_file_item(file_path)
+        if file_item is None or file_item.rowCount():
+            return
+
+        for layer, name in enumerate(names):
+            layer_item = QtGui.QStandardItem(name)
+            layer_item.setCheckable(True)
+            layer_item.setCheckState(QtCore.Qt.Checked if visible[layer] else QtCore.Qt.Unchecked)
+            layer_item.setData(file_path, LAYER_FILE_ROLE)
+            layer_item.setData(layer, LAYER_ROLE)
+            layer_item.setToolTip(f"Слой {name}")
+            if colors[layer] is not None:
+                layer_item.setIcon(self.layer_icon(colors[layer]))
+            file_item.appendRow(layer_item)
+
+    def set_file_progress(self, file_path, fraction=None):
+        """Показывает прогресс фоновой загрузки в подписи файла (None - загрузка завершена)"""
+        file_item = self.find_file_item(file_path)
+        if file_item is None:
+            return
+
+        filename = os.path.basename(file_path)
+        if fraction is None:
+            file_item.setText(filename)
+        else:
+            file_item.setText(f"{filename} — загрузка {int(fraction * 100)}%")
@@ -0,0 +1,258 @@
+import os
+from array import array
+
+import numpy as np
+
+from mesh_processing import restart_index
+
+# Потоковое чтение ASCII DXF без построения документа ezdxf.
+# Файл читается парами строк (групповой код, значение), из секции ENTITIES сразу в типизированные
+# буферы array.array (float32 вершины, uint32 индексы), которые в конце отдаются в NumPy без копии.
+# Линии и полилинии - ломаные с индексом перезапуска после каждой (замкнутые повторяют первую точку).
+# Для каждой грани, ребра и ломаной запоминается номер слоя объекта (групповой код 8).
+# Вершины хранятся относительно начала координат файла (округленной первой точки): рудничные координаты
+# в миллионы единиц во float32 теряют сантиметры, смещения от начала - нет.
+# Поддерживаются 3DFACE, LINE, LWPOLYLINE и POLYLINE (2D/3D); вставки блоков, сетки POLYLINE
+# и двоичный DXF читаются полным разбором ezdxf (stream_dxf_vertices возвращает None).
+
+# шаг (в байтах файла), с которым сообщаем прогресс
+STREAM_PROGRESS_BYTES = 4 * 1024 * 1024
+
+# объекты, которые требуют полного разбора документа
+FALLBACK_ENTITIES = {'INSERT'}
+
+# флаги POLYLINE (код 70)
+POLYLINE_CLOSED = 1
+POLYLINE_MESH = 16 | 64
+
+BINARY_SENTINEL = b"AutoCAD Binary DXF"
+
+# слой объекта без кода 8
+DEFAULT_LAYER = '0'
+
+# индекс перезапуска после каждой ломаной (индексы ломаных - uint32)
+STRIP_RESTART = restart_index(np.uint32)
+
+
+class UnsupportedDXF(Exception):
+    """Содержимое, которое потоковое чтение не обрабатывает"""
+
+
+class _GeometryBuffers:
+    def __init__(self, scale):
+        self.scale = scale
+        # начало координат файла в координатах сцены (задается первой точкой)
+        self.origin = None
+        self.vertices = array('f')
+        self.faces = array('I')
+        self.edges = array('I')
+        self.strips = array('I')
+        self.count = 0
+
+        # номера слоев треугольников, ребер и ломаных, имена слоев в порядке появления
+        self.face_layers = array('H')
+        self.edge_layers = array('H')
+        self.strip_layers = array('H')
+        self.layers = {}
+
+    def layer_id(self, name):
+        return self.layers.setdefault(name, len(self.layers))
+
+    def add_points(self, points):
+        # DXF (x, y, z) -> сцена (x, z, y), относительно начала координат файла
+        scale = self.scale
+        if self.origin is None:
+            x, y, z = points[0]
+            self.origin = (float(round(x * scale)), float(round(z * scale)), float(round(y * scale)))
+        ox, oy, oz = self.origin
+        start = self.count
+        for x, y, z in points:
+            self.vertices.extend((x * scale - ox, z * scale - oy, y * scale - oz))
+        self.count += len(points)
+        return start
+
+    def add_face(self, points, layer):
+        start = self.add_points(points)
+        layer = self.layer_id(layer)
+        if len(points) == 3:
+            self.faces.extend((start, start + 1, start + 2))
+            self.edges.extend((start, start + 1, start + 1, start + 2, start + 2, start))
+            self.face_layers.append(layer)
+            self.edge_layers.extend((layer,) * 3)
+        else:
+            # четырехугольник - два треугольника
+            self.faces.extend((start, start + 1, start + 2, start, start + 2, start + 3))
+            self.edges.extend((start, start + 1, start + 1, start + 2, start + 2, start + 3, start + 3, start))
+            self.face_layers.extend((layer,) * 2)
+            self.edge_layers.extend((layer,) * 4)
+
+    def add_polyline(self, points, closed, layer):
+        n = len(points)
+        if n < 2:
+            return
+        start = self.add_points(points)
+        self.strips.extend(range(start, start + n))
+        if closed and n > 2:
+            self.strips.append(start)
+        self.strips.append(STRIP_RESTART)
+        self.strip_layers.append(self.layer_id(layer))
+
+    def arrays(self):
+        vertices = np.frombuffer(self.vertices, dtype=np.float32).reshape(-1, 3)
+        faces = np.frombuffer(self.faces, dtype=np.uint32)
+        edges = np.frombuffer(self.edges, dtype=np.uint32)
+        strips = np.frombuffer(self.strips, dtype=np.uint32)
+        return vertices, faces, edges, strips
+
+    def origin_array(self):
+        return np.array(self.origin if self.origin is not None else (0.0, 0.0, 0.0), dtype=np.float64)
+
+    def layer_arrays(self):
+        """{'names': имена слоев, 'faces', 'edges', 'polylines': слой каждого треугольника, ребра, ломаной}"""
+        return {'names': list(self.layers),
+                'faces': np.frombuffer(self.face_layers, dtype=np.uint16),
+                'edges': np.frombuffer(self.edge_layers, dtype=np.uint16),
+                'polylines': np.frombuffer(self.strip_layers, dtype=np.uint16)}
+
+
+def _point(values, index):
+    return (values.get(10 + index, 0.0), values.get(20 + index, 0.0), values.get(30 + index, 0.0))
+
+
+class _EntityReader:
+    """Собирает групповые коды текущего объекта и передает готовые объекты в буферы"""
+    def __init__(self, buffers):
+        self.buffers = buffers
+        self.entity_types = {}
+
+        self.kind = None
+        self.values = {}
+        self.xs = []
+        self.ys = []
+        self.paperspace = False
+        self.layer = DEFAULT_LAYER
+
+        # открытая POLYLINE: флаги и накопленные VERTEX
+        self.polyline = None
+
+    def start(self, kind):
+        self.finish()
+        self.kind = kind
+        self.values = {}
+        self.xs = []
+        self.ys = []
+        self.paperspace = False
+        self.layer = DEFAULT_LAYER
+        if kind not in ('VERTEX', 'SEQEND'):
+            self.entity_types[kind] = self.entity_types.get(kind, 0) + 1
+        if kind in FALLBACK_ENTITIES:
+            raise UnsupportedDXF(kind)
+
+    def group(self, code, value):
+        if code == 67:
+            self.paperspace = value.strip() == '1'
+            return
+        if code == 8:
+            self.layer = value.strip()
+            return
+        if self.kind == 'LWPOLYLINE' and code in (10, 20):
+            (self.xs if code == 10 else self.ys).append(float(value))
+            return
+        if 10 <= code <= 39 or code == 70:
+            self.values[code] = float(value)
+
+    def finish(self):
+        kind, values = self.kind, self.values
+        self.kind = None
+        if kind is None:
+            return
+
+        if kind == 'VERTEX':
+            if self.polyline is not None:
+                if int(values.get(70, 0)) & 128:
+                    raise UnsupportedDXF("POLYLINE с гранями")
+                self.polyline[1].append(_point(values, 0))
+            return
+        if kind == 'SEQEND':
+            if self.polyline is not None:
+                flags, points, paperspace, layer = self.polyline
+                self.polyline = None
+                if not paperspace:
+                    self.buffers.add_polyline(points, flags & POLYLINE_CLOSED, layer)
+            return
+        if kind == 'POLYLINE':
+            flags = int(values.get(70, 0))
+            if flags & POLYLINE_MESH:
+                raise UnsupportedDXF("POLYLINE-сетка")
+            # слой ломаной - слой заголовка POLYLINE, а не вершин
+            self.polyline = (flags, [], self.paperspace, self.layer)
+            return
+
+        if self.paperspace:
+            return
+
+        if kind == '3DFACE':
+            points = [_point(values, i) for i in range(4)]
+            if points[3] == points[2]:
+                points = points[:3]
+            self.buffers.add_face(points, self.layer)
+        elif kind == 'LINE':
+            self.buffers.add_polyline([_point(values, 0), _point(values, 1)], False, self.layer)
+        elif kind == 'LWPOLYLINE':
+            elevation = values.get(38, 0.0)
+            points = [(x, y, elevation) for x, y in zip(self.xs, self.ys)]
+            self.buffers.add_polyline(points, int(values.get(70, 0)) & POLYLINE_CLOSED, self.layer)
+
+
+def stream_dxf_vertices(file_path, scale=1.0, progress=None):
+    """Потоковое чтение DXF -> (вершины, треугольники, ребра, ломаные, слои, начало координат, статистика типов)
+    или None, если файл нужно разбирать через ezdxf. Слои - словарь _GeometryBuffers.layer_arrays,
+    вершины - относительно начала координат (оно в координатах сцены, float64)."""
+    with open(file_path, 'rb') as f:
+        if f.read(len(BINARY_SENTINEL)) == BINARY_SENTINEL:
+            return None
+
+    total = max(1, os.path.getsize(file_path))
+    buffers = _GeometryBuffers(scale)
+    reader = _EntityReader(buffers)
+
+    section = None
+    expect_section_name = False
+    next_progress = STREAM_PROGRESS_BYTES
+
+    try:
+        # числовые значения - ASCII, кодировка текстов не важна
+        with open(file_path, 'r', encoding='latin-1', newline=None) as f:
+            for code_line, value in zip(f, f):
+                code = int(code_line)
+
+                if code == 0:
+                    value = value.strip()
+                    if value == 'SECTION':
+                        expect_section_name = True
+                    elif value == 'ENDSEC':
+                        if section == 'ENTITIES':
+                            reader.finish()
+                        section = None
+                    elif section == 'ENTITIES':
+                        reader.start(value)
+
+                    if progress is not None and f.buffer.tell() >= next_progress:
+                        next_progress = f.buffer.tell() + STREAM_PROGRESS_BYTES
+                        progress(0.9 * f.buffer.tell() / total)
+                    continue
+
+                if expect_section_name and code == 2:
+                    section = value.strip()
+                    expect_section_name = False
+                elif section == 'ENTITIES':
+                    reader.group(code, value)
+    except UnsupportedDXF as e:
+        print(f"Потоковое чтение DXF невозможно ({e}), используется ezdxf")
+        return None
+    except (ValueError, UnicodeDecodeError) as e:
+        print(f"Потоковое чтение DXF прервано: {e}, используется ezdxf")
+        return None
+
+    vertices, faces, edges, strips = buffers.arrays()
+    return vertices, faces, edges, strips, buffers.layer_arrays(), buffers.origin_array(), reader.entity_types
@@ -0,0 +1,228 @@
+import json
+import struct
+
+import numpy as np
+
+from evp_parser import EVENT_TYPES, EVENT_UNKNOWN
+
+# Каталог событий одного файла - структура массивов: по одному непрерывному столбцу на поле.
+# Отрисовка (EventGlyphSet), фильтры, выбор под курсором и панель свойств читают эти столбцы,
+# поэтому событие занимает десятки байт, а не отдельный объект сцены.
+# Положения хранятся во float32 относительно начала координат каталога (origin, double): рудничные
+# координаты в миллионы единиц во float32 теряют сантиметры, смещения от начала - нет.
+
+# биты видимости события (0 - событие видно)
+HIDDEN_BY_FILTER = 1
+
+# коды типов хранятся в int8
+MAX_TYPE_CODES = 127
+
+# Двоичный формат каталога (.evc): сигнатура, длина заголовка (uint32), заголовок JSON,
+# затем столбцы, каждый с границы CATALOG_ALIGNMENT байт - их можно открыть np.memmap как есть
+CATALOG_MAGIC = b"EVCAT\x00\x00\x01"
+CATALOG_ALIGNMENT = 64
+# столбцы, которые хранятся на диске (диапазоны и видимость - состояние сеанса)
+CATALOG_COLUMNS = ('positions', 'energy', 'magnitude', 'type_code', 'date', 'time')
+
+
+def assign_energy_ranges(energies, thresholds):
+    """Для каждого события возвращает индекс порога из thresholds (по убыванию), -1 если ниже всех"""
+    thresholds = np.asarray(sorted(thresholds, reverse=True), dtype=np.float64)
+    energies = np.asarray(energies, dtype=np.float64)
+    if len(thresholds) == 0:
+        return np.full(len(energies), -1, dtype=np.int32)
+
+    # число порогов, строго больших энергии = индекс первого подходящего порога
+    index = np.searchsorted(-thresholds, -energies, side='left')
+    return np.where(index < len(thresholds), index, -1).astype(np.int32)
+
+
+class EventCatalog:
+    def __init__(self, positions, energy, magnitude=None, type_code=None, date=None, time=None,
+                 type_names=EVENT_TYPES, origin=None):
+        # положения в координатах сцены (Y - высота); если origin задан - уже относительно него
+        positions = np.asarray(positions).reshape(-1, 3)
+        if origin is None:
+            positions = positions.astype(np.float64)
+            origin = np.floor(positions.min(axis=0)) if len(positions) else np.zeros(3)
+            positions = positions - origin
+        self.origin = np.array(origin, dtype=np.float64).reshape(3)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        n = len(self.positions)
+
+        # энергия сравнивается с порогами диапазонов (до 1e11 и выше) - храним в double
+        self.energy = np.ascontiguousarray(energy, dtype=np.float64).reshape(n)
+        self.magnitude = self._column(magnitude, n, np.float32, np.nan)
+        self.type_code = self._column(type_code, n, np.int8, EVENT_UNKNOWN)
+        # дата ГГГГММДД и время ЧЧММСС, как в .evp
+        self.date = self._column(date, n, np.int32, 0)
+        self.time = self._column(time, n, np.int32, 0)
+
+        # имена типов по кодам (у каталогов из .csv словарь может быть шире EVENT_TYPES)
+        self.type_names = tuple(type_names)
+
+        # диапазоны энергии: пороги по убыванию, индекс диапазона события (-1 - ниже всех порогов)
+        # и заранее собранные индексы событий каждого диапазона
+        self.thresholds = []
+        self.range_index = np.full(n, -1, dtype=np.int8)
+        self.range_members = []
+
+        self.visibility = np.zeros(n, dtype=np.uint8)
+
+    @staticmethod
+    def _column(values, n, dtype, default):
+        if values is None:
+            return np.full(n, default, dtype=dtype)
+        return np.ascontiguousarray(values, dtype=dtype).reshape(n)
+
+    @classmethod
+    def from_type_names(cls, positions, energy, names, **columns):
+        """Каталог с типами, заданными строками (известные типы получают коды EVENT_TYPES)"""
+        vocabulary = list(EVENT_TYPES)
+        unique, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+        for name in unique:
+            if name not in vocabulary and len(vocabulary) < MAX_TYPE_CODES:
+                vocabulary.append(str(name))
+        codes = np.array([vocabulary.index(name) if name in vocabulary else EVENT_UNKNOWN for name in unique],
+                         dtype=np.int8)
+        return cls(positions, energy, type_code=codes[inverse] if len(unique) else None,
+                   type_names=vocabulary, **columns)
+
+    def __len__(self):
+        return len(self.energy)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in (self.positions, self.energy, self.magnitude, self.type_code,
+                                                self.date, self.time, self.range_index, self.visibility))
+
+    # столбцы координат относительно origin
+    @property
+    def x(self):
+        return self.positions[:, 0]
+
+    @property
+    def y(self):
+        return self.positions[:, 1]
+
+    @property
+    def z(self):
+        return self.positions[:, 2]
+
+    def world_positions(self, indices=slice(None)):
+        """Положения событий в координатах сцены (double)"""
+        return self.positions[indices].astype(np.float64) + self.origin
+
+    def type_name(self, index):
+        return self.type_names[self.type_code[index]]
+
+    def type_multipliers(self, table, default):
+        """Множитель по типу каждого события из словаря {имя типа: значение}"""
+        lookup = np.array([table.get(name, default) for name in self.type_names], dtype=np.float64)
+        return lookup[self.type_code]
+
+    # диапазоны энергии
+    def set_ranges(self, thresholds):
+        """Разбивает события на диапазоны энергии (один раз на набор порогов)"""
+        self.thresholds = sorted(thresholds, reverse=True)
+        self.range_index = assign_energy_ranges(self.energy, self.thresholds).astype(np.int8)
+        order = np.argsort(self.range_index, kind='stable')
+        bounds = np.searchsorted(self.range_index[order], np.arange(len(self.thresholds) + 1))
+        self.range_members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.thresholds))]
+
+    def range_of(self, threshold):
+        """Номер диапазона по порогу энергии, -1 если такого порога нет"""
+        return self.thresholds.index(threshold) if threshold in self.thresholds else -1
+
+    # фильтры
+    def select(self, energy=None, magnitude=None, date=None, types=None):
+        """Маска событий, попадающих в интервалы (min, max) по столбцам и в список имен типов"""
+        mask = np.ones(len(self), dtype=bool)
+        for column, bounds in ((self.energy, energy), (self.magnitude, magnitude), (self.date, date)):
+            if bounds is None:
+                continue
+            low, high = bounds
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        if types is not None:
+            codes = [code for code, name in enumerate(self.type_names) if name in types]
+            mask &= np.isin(self.type_code, codes)
+        return mask
+
+    def set_hidden(self, mask, bit=HIDDEN_BY_FILTER):
+        """Скрывает события по маске (снимает бит у остальных)"""
+        mask = np.asarray(mask, dtype=bool)
+        self.visibility[mask] |= np.uint8(bit)
+        self.visibility[~mask] &= np.uint8(~bit & 0xFF)
+
+    def visible_mask(self):
+        return self.visibility == 0
+
+    def describe(self, index):
+        """Краткое описание события для строки состояния"""
+        x, y, z = self.world_positions(index)
+        return (f"событие #{index}: {self.type_name(index)}, энергия {self.energy[index]:.3g}, "
+                f"X={x:.1f} Y={z:.1f} Z={y:.1f}")
+
+
+def _aligned(offset):
+    return (offset + CATALOG_ALIGNMENT - 1) // CATALOG_ALIGNMENT * CATALOG_ALIGNMENT
+
+
+def write_catalog(path, catalog, **meta):
+    """Записывает каталог в файл .evc; meta попадает в заголовок"""
+    columns = {name: np.ascontiguousarray(getattr(catalog, name)) for name in CATALOG_COLUMNS}
+
+    # размер заголовка зависит от смещений, смещения - от размера заголовка: считаем до сходимости
+    header_size = 0
+    while True:
+        offset = _aligned(len(CATALOG_MAGIC) + 4 + header_size)
+        layout = {}
+        for name, column in columns.items():
+            layout[name] = {'dtype': column.dtype.str, 'shape': list(column.shape), 'offset': offset}
+            offset = _aligned(offset + column.nbytes)
+        header = dict(meta, count=len(catalog), type_names=list(catalog.type_names),
+                      origin=catalog.origin.tolist(), columns=layout, bytes=offset)
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(encoded) <= header_size:
+            break
+        header_size = len(encoded)
+
+    with open(path, 'wb') as f:
+        f.write(CATALOG_MAGIC)
+        f.write(struct.pack('<I', header_size))
+        f.write(encoded.ljust(header_size))
+        for name, column in columns.items():
+            f.seek(layout[name]['offset'])
+            f.write(column.tobytes())
+        f.truncate(offset)
+
+
+def read_catalog_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+            raise ValueError("не файл каталога событий")
+        (header_size,) = struct.unpack('<I', f.read(4))
+        return json.loads(f.read(header_size).decode('utf-8'))
+
+
+def open_catalog(path):
+    """Открывает файл .evc: столбцы отображаются в память (только чтение), без копирования"""
+    header = read_catalog_header(path)
+    columns = {}
+    for name in CATALOG_COLUMNS:
+        layout = header['columns'][name]
+        shape = tuple(layout['shape'])
+        if np.prod(shape) == 0:
+            # у пустых столбцов нет данных для mmap
+            columns[name] = np.zeros(shape, dtype=layout['dtype'])
+        else:
+            columns[name] = np.memmap(path, dtype=np.dtype(layout['dtype']), mode='r',
+                                      offset=layout['offset'], shape=shape)
+
+    positions = columns.pop('positions')
+    energy = columns.pop('energy')
+    return EventCatalog(positions, energy, type_names=header['type_names'],
+                        origin=header.get('origin', (0.0, 0.0, 0.0)), **columns)
@@ -0,0 +1,209 @@
+import os
+
+import numpy as np
+
+# Колоночный разбор каталогов событий .evp/.evg
+# Формат строки: дата, время, магнитуда, X, Y, Z, далее параметры (энергия в одной из колонок 6-19)
+
+ENCODINGS = ['windows-1251', 'cp1251', 'iso-8859-1', 'utf-8']
+SNIFF_BYTES = 64 * 1024
+
+# строк в одном пакете np.loadtxt (между пакетами сообщаем прогресс)
+CHUNK_LINES = 250000
+
+REQUIRED_COLUMNS = 6
+ENERGY_COLUMNS = (6, 20)
+
+# Коды типов событий (индекс в этом кортеже)
+EVENT_TYPES = ("explosion", "earthquake", "microseismic", "unknown")
+EVENT_EXPLOSION, EVENT_EARTHQUAKE, EVENT_MICROSEISMIC, EVENT_UNKNOWN = range(4)
+
+EVENT_DTYPE = np.dtype([
+    ('date', np.int64),
+    ('time', np.int64),
+    ('magnitude', np.float64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('z', np.float64),
+    ('energy', np.float64),
+    ('event_type', np.int8),
+])
+
+
+def sniff_encoding(sample):
+    """Подбирает кодировку по началу файла (файл читается один раз)"""
+    for encoding in ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            # последний символ мог обрезаться на границе выборки
+            try:
+                sample[:-4].decode(encoding)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+    return None
+
+
+def column_counts(lines):
+    """Число колонок каждой строки"""
+    return np.fromiter((len(line.split()) for line in lines), dtype=np.int32, count=len(lines))
+
+
+def _parse_rows(lines, width):
+    """Построчный разбор: нечисловые и отсутствующие значения становятся NaN"""
+    block = np.full((len(lines), width), np.nan, dtype=np.float64)
+    for row, line in enumerate(lines):
+        for col, part in enumerate(line.split()[:width]):
+            try:
+                block[row, col] = float(part)
+            except ValueError:
+                continue
+    return block
+
+
+def _numeric_head(line):
+    """Дата, время, магнитуда и координаты строки - числа"""
+    try:
+        for part in line.split()[:REQUIRED_COLUMNS]:
+            float(part)
+    except ValueError:
+        return False
+    return True
+
+
+def _load_rows(lines, width):
+    """Строки не короче width колонок. Быстрый путь - np.loadtxt по всем строкам.
+
+    Строки с нечисловыми первыми колонками (заголовки) пропускаются - остаются NaN.
+    """
+    try:
+        return np.loadtxt(lines, dtype=np.float64, usecols=range(width), ndmin=2)
+    except ValueError:
+        pass
+
+    block = np.full((len(lines), width), np.nan, dtype=np.float64)
+    rows = np.flatnonzero(np.fromiter((_numeric_head(line) for line in lines), dtype=bool, count=len(lines)))
+    if len(rows):
+        numeric_lines = [lines[i] for i in rows]
+        try:
+            block[rows] = np.loadtxt(numeric_lines, dtype=np.float64, usecols=range(width), ndmin=2)
+        except ValueError:
+            # нечисловые значения в колонках параметров
+            block[rows] = _parse_rows(numeric_lines, width)
+    return block
+
+
+def _load_chunk(lines, counts, width):
+    """Числовой блок width колонок: строки разной длины грузятся пакетами по числу колонок"""
+    counts = np.minimum(counts, width)
+    block = np.full((len(lines), width), np.nan, dtype=np.float64)
+    for count in np.unique(counts[counts >= REQUIRED_COLUMNS]):
+        rows = np.flatnonzero(counts == count)
+        group = lines if len(rows) == len(lines) else [lines[i] for i in rows]
+        block[rows, :count] = _load_rows(group, int(count))
+    return block
+
+
+def _load_block(lines, counts, width, progress=None):
+    """Разбирает строки пакетами по CHUNK_LINES"""
+    block = np.empty((len(lines), width), dtype=np.float64)
+    for start in range(0, len(lines), CHUNK_LINES):
+        stop = min(start + CHUNK_LINES, len(lines))
+        block[start:stop] = _load_chunk(lines[start:stop], counts[start:stop], width)
+        if progress is not None:
+            progress(0.2 + 0.7 * stop / len(lines))
+    return block
+
+
+def classify_events(magnitude):
+    """Тип события по магнитуде"""
+    return np.select([magnitude > 2.0, magnitude > 0.5],
+                     [EVENT_EXPLOSION, EVENT_EARTHQUAKE],
+                     EVENT_MICROSEISMIC).astype(np.int8)
+
+
+def events_energy(block, magnitude):
+    """Энергия: первое положительное значение в колонках 6-19, иначе оценка по магнитуде"""
+    begin, end = ENERGY_COLUMNS
+    candidates = block[:, begin:min(end, block.shape[1])]
+
+    energy = np.ones(len(block), dtype=np.float64)
+    if candidates.shape[1] > 0:
+        valid = candidates > 0  # NaN и нули не подходят
+        found = valid.any(axis=1)
+        first = valid.argmax(axis=1)
+        energy = np.where(found, candidates[np.arange(len(block)), first], energy)
+    else:
+        found = np.zeros(len(block), dtype=bool)
+
+    # Если не нашли энергию, используем магнитуду как приближение (примерная формула)
+    by_magnitude = ~found & (magnitude > 0)
+    energy[by_magnitude] = 10 ** (1.5 * magnitude[by_magnitude] + 4.8)
+    return energy
+
+
+def parse_evp_file(file_path, progress=None):
+    """Разбирает .evp/.evg файл в структурированный массив EVENT_DTYPE.
+
+    progress(доля) - необязательный колбэк фоновой загрузки.
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if progress is not None:
+        progress(0.1)
+
+    encoding = sniff_encoding(raw[:SNIFF_BYTES])
+    if encoding is None:
+        raise UnicodeError("Не удалось определить кодировку файла")
+
+    lines = [line for line in raw.decode(encoding, errors='replace').splitlines()
+             if line.strip() and not line.lstrip().startswith('#')]
+    del raw
+    if progress is not None:
+        progress(0.2)
+
+    # ширина блока - самая длинная строка: энергия может стоять в любой из колонок 6-19
+    counts = column_counts(lines)
+    columns = int(counts.max()) if len(counts) else 0
+    if columns < REQUIRED_COLUMNS:
+        print(f"Схема файла {os.path.basename(file_path)}: {columns} колонок, нужно минимум {REQUIRED_COLUMNS}")
+        return np.zeros(0, dtype=EVENT_DTYPE)
+
+    block = _load_block(lines, counts, min(columns, ENERGY_COLUMNS[1]), progress)
+
+    # строки без координат пропускаем
+    valid = np.isfinite(block[:, 3:6]).all(axis=1)
+    skipped = len(block) - int(valid.sum())
+    block = block[valid]
+
+    magnitude = np.nan_to_num(block[:, 2], nan=0.0)
+
+    events = np.zeros(len(block), dtype=EVENT_DTYPE)
+    events['date'] = np.nan_to_num(block[:, 0], nan=0.0)
+    events['time'] = np.nan_to_num(block[:, 1], nan=0.0)
+    events['magnitude'] = magnitude
+    events['x'] = block[:, 3]
+    events['y'] = block[:, 4]
+    events['z'] = block[:, 5]
+    events['energy'] = events_energy(block, magnitude)
+    events['event_type'] = classify_events(magnitude)
+
+    print(f"Загружено {len(events)} событий из {file_path} (кодировка {encoding}, колонок {columns})")
+    if skipped:
+        print(f"Пропущено строк без координат: {skipped}")
+    if len(events):
+        print(f"=== EVP ФАЙЛ: {os.path.basename(file_path)} ===")
+        print(f"Количество событий: {len(events)}")
+        for axis in ('x', 'y', 'z'):
+            values = events[axis]
+            print(f"Координата {axis.upper()}: min={values.min():.1f}, max={values.max():.1f}, avg={values.mean():.1f}")
+        print("=" * 50)
+
+    return events
+
+
+def event_type_names(codes):
+    """Коды типов событий -> имена"""
+    return np.asarray(EVENT_TYPES)[np.asarray(codes, dtype=np.intp)]
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import event_catalog
+
+# Дисковый кэш готовой геометрии (массивы вершин и индексов) в ~/.seismic_visualiser.
+# Ключ - путь, размер и время изменения исходного файла плюс параметры загрузки.
+# Массивы хранятся как .npy и открываются через mmap без копирования.
+# Каталоги событий хранятся отдельно - одним файлом .evc на запись (CatalogCache).
+
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".seismic_visualiser")
+
+# увеличивать при изменении формата или алгоритма построения геометрии
+# 2 - четырехугольники DXF хранятся как треугольники
+# 3 - вставки блоков с поворотом и базовой точкой, LWPOLYLINE через get_points
+# 4 - POLYLINE (2D/3D) в модели, потоковое чтение DXF
+# 5 - сварка вершин, без вырожденных и повторных граней и ребер, индексы uint16/uint32
+# 6 - упрощенные уровни детализации сеток DXF
+# 7 - тайлы больших сеток DXF
+# 8 - характерные ребра (границы, изломы, полилинии)
+# 9 - нормали вершин
+# 10 - слои DXF: индексы отсортированы по слоям, границы слоев
+# 11 - вершины DXF относительно начала координат файла
+# 12 - линии и полилинии DXF - ломаные с перезапуском примитива
+CACHE_VERSION = 12
+
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+
+META_FILE = "meta.json"
+
+
+class GeometryCache:
+    def __init__(self, name, max_bytes=DEFAULT_MAX_BYTES, version=CACHE_VERSION):
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self.version = version
+
+    def _source_stat(self, source_path):
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            return None
+        return os.path.abspath(source_path), st.st_size, st.st_mtime_ns
+
+    def key(self, source_path, **params):
+        """Ключ записи или None, если исходный файл недоступен"""
+        stat = self._source_stat(source_path)
+        if stat is None:
+            return None
+        path, size, mtime_ns = stat
+        description = json.dumps([self.version, path, size, mtime_ns, params], sort_keys=True, default=str)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(".tmp-"):
+                # запись еще пишется
+                continue
+            meta_path = os.path.join(self.directory, name, META_FILE)
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                entries.append((name, meta, os.path.getmtime(meta_path)))
+            except (OSError, ValueError):
+                # недописанная или поврежденная запись
+                self._remove(name)
+        return entries
+
+    def _remove(self, name):
+        shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def load(self, source_path, **params):
+        """Возвращает словарь массивов (mmap) или None при промахе"""
+        key = self.key(source_path, **params)
+        if key is None:
+            return None
+
+        entry = os.path.join(self.directory, key)
+        meta_path = os.path.join(entry, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            arrays = {}
+            for name in meta['arrays']:
+                array_path = os.path.join(entry, name + ".npy")
+                # у пустых массивов нет данных для mmap
+                arrays[name] = np.load(array_path, mmap_mode=None if meta['arrays'][name] == 0 else 'r')
+
+            # отмечаем использование для LRU
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Поврежденная запись кэша {key}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        print(f"Геометрия из кэша: {os.path.basename(source_path)}")
+        return arrays
+
+    def store(self, source_path, arrays, **params):
+        """Сохраняет массивы для исходного файла, вытесняя старые записи"""
+        key = self.key(source_path, **params)
+        if key is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # устаревшие версии этого же файла больше не понадобятся
+        self.invalidate(source_path)
+
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            total = 0
+            sizes = {}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                np.save(os.path.join(staging, name + ".npy"), array)
+                sizes[name] = int(array.size)
+                total += array.nbytes
+
+            meta = {
+                'source': os.path.abspath(source_path),
+                'params': params,
+                'arrays': sizes,
+                'bytes': total,
+                'created': time.time(),
+            }
+            with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+
+            # атомарная публикация записи
+            os.replace(staging, os.path.join(self.directory, key))
+        except OSError as e:
+            print(f"Не удалось записать кэш геометрии: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def invalidate(self, source_path):
+        """Удаляет все записи исходного файла"""
+        source = os.path.abspath(source_path)
+        for name, meta, _ in self._entries():
+            if meta.get('source') == source:
+                self._remove(name)
+
+    def evict(self):
+        """Вытесняет давно не использованные записи, пока кэш больше лимита"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(meta.get('bytes', 0) for _, meta, _ in entries)
+
+        for name, meta, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(name)
+            total -= meta.get('bytes', 0)
+            print(f"Кэш: вытеснена запись {meta.get('source')}")
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class CatalogCache(GeometryCache):
+    """Кэш каталогов событий: одна запись - один файл .evc (заголовок и выровненные столбцы),
+    столбцы открываются через np.memmap без копирования"""
+    SUFFIX = ".evc"
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                meta = event_catalog.read_catalog_header(path)
+                entries.append((name, meta, os.path.getmtime(path)))
+            except (OSError, ValueError):
+                self._remove(name)
+        return entries
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            # файл может быть еще открыт через mmap
+            pass
+
+    def load(self, source_path, **params):
+        """Возвращает EventCatalog со столбцами в mmap или None при промахе"""
+        key = self.key(source_path, **params)
+        if key is None:
+            return None
+
+        path = os.path.join(self.directory, key + self.SUFFIX)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            catalog = event_catalog.open_catalog(path)
+            # отмечаем использование для LRU
+            os.utime(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Поврежденная запись кэша {key}: {e}")
+            self._remove(key + self.SUFFIX)
+            return None
+
+        print(f"Каталог событий из кэша: {os.path.basename(source_path)}")
+        return catalog
+
+    def store(self, source_path, catalog, **params):
+        """Сохраняет каталог исходного файла, вытесняя старые записи"""
+        key = self.key(source_path, **params)
+        if key is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.invalidate(source_path)
+
+        handle, staging = tempfile.mkstemp(prefix=".tmp-", suffix=".part", dir=self.directory)
+        os.close(handle)
+        try:
+            event_catalog.write_catalog(staging, catalog, source=os.path.abspath(source_path), params=params)
+            os.replace(staging, os.path.join(self.directory, key + self.SUFFIX))
+        except OSError as e:
+            print(f"Не удалось записать кэш каталога: {e}")
+            try:
+                os.remove(staging)
+            except OSError:
+                pass
+            return
+
+        self.evict()
+
+
+dxf_cache = GeometryCache("dxf")
+
+# увеличивать при изменении формата .evc или разбора файлов событий
+# 2 - положения событий относительно начала координат каталога
+CATALOG_CACHE_VERSION = 2
+
+catalog_cache = CatalogCache("events", version=CATALOG_CACHE_VERSION)
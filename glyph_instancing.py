@@ -0,0 +1,1007 @@
+import ctypes
+
+import numpy as np
+import OpenGL.GL as gl
+
+from event_catalog import assign_energy_ranges
+from picking import PICK_TAG_GLYPH
+from shaders import compile_program, uniform_location
+from spatial_index import MIN_GLYPH_PIXELS, EventOctree, frustum_planes
+from transparency import OIT_FRAGMENT_OUTPUT
+
+# Инстансинг глифов событий: одна общая сетка на тип визуализации и уровень детализации
+# и один массив экземпляров (позиция, масштаб, RGBA, флаги) на тип.
+# Переключение, смена цвета и размера меняют только массив экземпляров.
+# На GPU уходят только экземпляры, прошедшие отсечение по октодереву событий.
+# Позиции экземпляров - float32 относительно начала координат рендерера (первого каталога),
+# само начало добавляется к матрице вида в double. Масштаб - float16, цвет - uint8, флаги - uint16.
+# Точки рисуются спрайтами GL_POINTS прямо из массива экземпляров (одна вершина на событие).
+
+GLYPH_TYPES = ("spheres", "beach_balls", "points")
+
+# число сегментов сферы для каждого типа (как было в create_event) - верхний уровень детализации
+GLYPH_SEGMENTS = {"spheres": 32, "beach_balls": 32}
+
+# уровни детализации (сегментов сферы) и размеры на экране (пиксели), с которых они включаются
+GLYPH_LOD_SEGMENTS = (8, 16, 32)
+GLYPH_LOD_PIXELS = (16.0, 64.0)
+
+# 0 - двустороннее освещение сферы, 1 - освещение пляжного мячика
+GLYPH_SHADING = {"spheres": 0, "beach_balls": 1, "points": 0}
+
+# типы глифов, которые рисуются импостерами (квадрат на экземпляр, сфера трассируется во фрагментном шейдере):
+# цена экземпляра не зависит от детализации, уровни по размеру на экране не нужны
+GLYPH_IMPOSTOR_TYPES = ("spheres", "beach_balls")
+GLYPH_IMPOSTORS = True
+# ключ уровня импостеров в GlyphBatch.levels (вместо числа сегментов)
+IMPOSTOR_SEGMENTS = 0
+
+# типы глифов, которые рисуются спрайтами GL_POINTS (без сетки), и ключ их уровня
+GLYPH_SPRITE_TYPES = ("points",)
+SPRITE_SEGMENTS = -1
+# пределы размера спрайта на экране (пиксели)
+SPRITE_PIXELS = (2.0, 64.0)
+
+# флаги экземпляра (битовая маска; uint16 приходит в шейдер как float)
+FLAG_VISIBLE = 1
+FLAG_HOVERED = 2
+
+INSTANCE_DTYPE = np.dtype([
+    ('position', np.float32, 3),
+    ('scale', np.float16),
+    ('flags', np.uint16),
+    ('color', np.uint8, 4),
+])
+
+# поле экземпляра -> (атрибут, число компонент, тип GL, нормализация)
+INSTANCE_ATTRIBUTES = {
+    'position': ('i_position', 3, gl.GL_FLOAT, gl.GL_FALSE),
+    'scale': ('i_scale', 1, gl.GL_HALF_FLOAT, gl.GL_FALSE),
+    'flags': ('i_flags', 1, gl.GL_UNSIGNED_SHORT, gl.GL_FALSE),
+    'color': ('i_color', 4, gl.GL_UNSIGNED_BYTE, gl.GL_TRUE),
+}
+
+# Базовые множители размера для разных типов событий
+TYPE_SIZE_MULTIPLIERS = {
+    "explosion": 3.0,  # Взрывы - самые большие
+    "earthquake": 1.5,  # Землетрясения - средние
+    "microseismic": 0.8,  # Микросейсмика - маленькие
+    "unknown": 0.5  # По умолчанию
+}
+
+MAX_GLYPH_SIZE = 100.0
+POINT_GLYPH_SIZE = 5.0
+
+# Цвет по энергии, если для файла нет сохраненных свойств
+DEFAULT_ENERGY_COLORS = [
+    (100000000000, [1.0, 0.0, 0.0]),
+    (1000000000, [1.0, 0.5, 0.0]),
+    (100000000, [1.0, 1.0, 0.0]),
+    (1000000, [0.0, 1.0, 0.0]),
+    (1000, [0.0, 0.0, 1.0]),
+    (0, [0.5, 0.5, 0.5]),
+]
+
+# общие функции шейдеров глифов: флаги экземпляра, цвет прохода идентификаторов и освещение
+GLYPH_SHADER_FUNCTIONS = """
+const vec3 LIGHT_DIR = vec3(0.7, 0.7, 0.3);
+const vec3 HOVER_COLOR = vec3(1.0, 0.5, 0.0);
+
+bool has_flag(float flags, float bit) {
+    return mod(floor(flags / bit), 2.0) > 0.5;
+}
+
+vec4 pick_color(float id, float tag) {
+    float r = mod(id, 256.0);
+    float g = mod(floor(id / 256.0), 256.0);
+    float b = floor(id / 65536.0);
+    return vec4(r, g, b, tag) / 255.0;
+}
+
+vec3 shade(vec3 n, vec3 color, float pattern, int shading, bool hovered) {
+    vec3 light = normalize(LIGHT_DIR);
+    vec3 rgb;
+
+    if (shading == 1) {
+        // пляжный мячик: белые и цветные доли, один источник
+        vec3 face = mix(color, vec3(1.0), pattern);
+        float intensity = max(0.2, dot(n, light));
+        rgb = min(face * (0.4 + 0.6 * intensity) + pow(intensity, 4.0) * 0.3, 1.0);
+    } else {
+        // сфера: два противоположных источника
+        float i1 = max(0.0, dot(n, light));
+        float i2 = max(0.0, dot(n, -light));
+        rgb = min(color * (0.3 + 0.7 * (i1 + i2)) + (pow(i1, 4.0) + pow(i2, 4.0)) * 0.15, 1.0);
+    }
+
+    if (hovered) {
+        rgb = mix(rgb, HOVER_COLOR, 0.6);
+    }
+    return rgb;
+}
+"""
+
+GLYPH_VERTEX_SHADER = """
+#version 330 core
+
+in vec3 a_position;
+in float a_pattern;
+
+in vec3 i_position;
+in float i_scale;
+in vec4 i_color;
+in float i_flags;
+in float i_pick;
+
+uniform mat4 u_view_projection;
+uniform int u_shading;
+uniform int u_transparent_pass;
+// проход идентификаторов: цвет = номер экземпляра в буфере, альфа = метка типа глифа
+uniform int u_pick;
+uniform float u_pick_tag;
+
+out vec4 v_color;
+""" + GLYPH_SHADER_FUNCTIONS + """
+void main() {
+    bool transparent = i_color.a < 0.99;
+    bool skipped = (u_pick == 1) ? false : transparent != (u_transparent_pass == 1);
+    if (!has_flag(i_flags, 1.0) || skipped) {
+        // экземпляр не рисуется в этом проходе - уводим за дальнюю плоскость
+        gl_Position = vec4(0.0, 0.0, 2.0, 1.0);
+        v_color = vec4(0.0);
+        return;
+    }
+
+    gl_Position = u_view_projection * vec4(i_position + a_position * i_scale, 1.0);
+    if (u_pick == 1) {
+        v_color = pick_color(i_pick, u_pick_tag);
+        return;
+    }
+
+    vec3 rgb = shade(normalize(a_position), i_color.rgb, a_pattern, u_shading, has_flag(i_flags, 2.0));
+    v_color = vec4(rgb, i_color.a);
+}
+"""
+
+GLYPH_FRAGMENT_SHADER = """
+#version 330 core
+
+in vec4 v_color;
+""" + OIT_FRAGMENT_OUTPUT + """
+void main() {
+    write_color(v_color);
+}
+"""
+
+# Импостер сферы: квадрат, повернутый к камере и охватывающий видимый контур сферы.
+# Фрагментный шейдер пересекает луч из камеры со сферой, пишет глубину точки пересечения
+# и освещает ее по нормали; доли пляжного мячика вычисляются по долготе нормали.
+GLYPH_IMPOSTOR_VERTEX_SHADER = """
+#version 330 core
+
+in vec3 a_position;
+
+in vec3 i_position;
+in float i_scale;
+in vec4 i_color;
+in float i_flags;
+in float i_pick;
+
+uniform mat4 u_view_projection;
+// положение камеры относительно начала координат экземпляров
+uniform vec3 u_camera;
+uniform int u_transparent_pass;
+uniform int u_pick;
+uniform float u_pick_tag;
+
+out vec3 v_world;
+flat out vec3 v_center;
+flat out float v_radius;
+flat out vec4 v_color;
+flat out int v_hovered;
+""" + GLYPH_SHADER_FUNCTIONS + """
+void main() {
+    bool transparent = i_color.a < 0.99;
+    bool skipped = (u_pick == 1) ? false : transparent != (u_transparent_pass == 1);
+    vec3 to_camera = u_camera - i_position;
+    float distance = length(to_camera);
+
+    v_center = i_position;
+    v_radius = i_scale;
+    v_hovered = has_flag(i_flags, 2.0) ? 1 : 0;
+    v_color = (u_pick == 1) ? pick_color(i_pick, u_pick_tag) : i_color;
+
+    // камера внутри сферы - контура нет, экземпляр не рисуется
+    if (!has_flag(i_flags, 1.0) || skipped || distance <= i_scale) {
+        gl_Position = vec4(0.0, 0.0, 2.0, 1.0);
+        v_world = vec3(0.0);
+        return;
+    }
+
+    vec3 w = to_camera / distance;
+    vec3 up = abs(w.y) > 0.99 ? vec3(1.0, 0.0, 0.0) : vec3(0.0, 1.0, 0.0);
+    vec3 u = normalize(cross(up, w));
+    vec3 v = cross(w, u);
+    // полуширина квадрата в плоскости центра, при которой касательный конус из камеры помещается в квадрат
+    float extent = i_scale * distance / sqrt(distance * distance - i_scale * i_scale);
+
+    v_world = i_position + (u * a_position.x + v * a_position.y) * extent;
+    gl_Position = u_view_projection * vec4(v_world, 1.0);
+}
+"""
+
+GLYPH_IMPOSTOR_FRAGMENT_SHADER = """
+#version 330 core
+
+in vec3 v_world;
+flat in vec3 v_center;
+flat in float v_radius;
+flat in vec4 v_color;
+flat in int v_hovered;
+
+uniform mat4 u_view_projection;
+uniform vec3 u_camera;
+uniform int u_shading;
+uniform int u_pick;
+""" + OIT_FRAGMENT_OUTPUT + GLYPH_SHADER_FUNCTIONS + """
+void main() {
+    vec3 direction = normalize(v_world - u_camera);
+    vec3 oc = u_camera - v_center;
+    float b = dot(oc, direction);
+    // квадрат расстояния от центра до луча через перпендикуляр (без вычитания больших чисел)
+    vec3 perpendicular = oc - b * direction;
+    float h = v_radius * v_radius - dot(perpendicular, perpendicular);
+    if (h < 0.0) {
+        discard;
+    }
+
+    vec3 n = (oc + direction * (-b - sqrt(h))) / v_radius;
+    vec4 clip = u_view_projection * vec4(v_center + n * v_radius, 1.0);
+    gl_FragDepth = 0.5 * clip.z / clip.w + 0.5;
+
+    if (u_pick == 1) {
+        write_color(v_color);
+        return;
+    }
+
+    // доли пляжного мячика - четверти по долготе вокруг оси z, как в build_glyph_geometry
+    float longitude = mod(atan(n.y, n.x), 6.28318530718);
+    float pattern = mod(floor(longitude / 1.57079632679), 2.0) < 0.5 ? 1.0 : 0.0;
+    vec3 rgb = shade(n, v_color.rgb, pattern, u_shading, v_hovered == 1);
+    write_color(vec4(rgb, v_color.a));
+}
+"""
+
+# Спрайт точки: размер в пикселях - диаметр глифа, деленный на глубину, кружок вырезается по gl_PointCoord
+GLYPH_SPRITE_VERTEX_SHADER = """
+#version 330 core
+
+in vec3 i_position;
+in float i_scale;
+in vec4 i_color;
+in float i_flags;
+in float i_pick;
+
+uniform mat4 u_view_projection;
+// высота окна / (2 tg(fov/2)) и пределы размера спрайта
+uniform float u_projection_scale;
+uniform vec2 u_sprite_pixels;
+uniform int u_transparent_pass;
+uniform int u_pick;
+uniform float u_pick_tag;
+
+flat out vec4 v_color;
+flat out int v_hovered;
+""" + GLYPH_SHADER_FUNCTIONS + """
+void main() {
+    bool transparent = i_color.a < 0.99;
+    bool skipped = (u_pick == 1) ? false : transparent != (u_transparent_pass == 1);
+
+    v_hovered = has_flag(i_flags, 2.0) ? 1 : 0;
+    v_color = (u_pick == 1) ? pick_color(i_pick, u_pick_tag) : i_color;
+
+    if (!has_flag(i_flags, 1.0) || skipped) {
+        gl_Position = vec4(0.0, 0.0, 2.0, 1.0);
+        gl_PointSize = 1.0;
+        return;
+    }
+
+    gl_Position = u_view_projection * vec4(i_position, 1.0);
+    float pixels = 2.0 * i_scale * u_projection_scale / max(gl_Position.w, 1e-6);
+    gl_PointSize = clamp(pixels, u_sprite_pixels.x, u_sprite_pixels.y);
+}
+"""
+
+GLYPH_SPRITE_FRAGMENT_SHADER = """
+#version 330 core
+
+flat in vec4 v_color;
+flat in int v_hovered;
+
+uniform int u_pick;
+""" + OIT_FRAGMENT_OUTPUT + GLYPH_SHADER_FUNCTIONS + """
+void main() {
+    vec2 c = gl_PointCoord * 2.0 - 1.0;
+    float r2 = dot(c, c);
+    if (r2 > 1.0) {
+        discard;
+    }
+
+    if (u_pick == 1) {
+        write_color(v_color);
+        return;
+    }
+
+    // нормаль полусферы, обращенной к камере
+    vec3 n = vec3(c.x, -c.y, sqrt(1.0 - r2));
+    write_color(vec4(shade(n, v_color.rgb, 0.0, 0, v_hovered == 1), v_color.a));
+}
+"""
+
+# вид уровня -> (вершинный, фрагментный шейдер)
+GLYPH_PROGRAMS = {
+    'mesh': (GLYPH_VERTEX_SHADER, GLYPH_FRAGMENT_SHADER),
+    'impostor': (GLYPH_IMPOSTOR_VERTEX_SHADER, GLYPH_IMPOSTOR_FRAGMENT_SHADER),
+    'sprite': (GLYPH_SPRITE_VERTEX_SHADER, GLYPH_SPRITE_FRAGMENT_SHADER),
+}
+
+GLYPH_ATTRIBUTES = {
+    'a_position': 0,
+    'a_pattern': 1,
+    'i_position': 2,
+    'i_scale': 3,
+    'i_color': 4,
+    'i_flags': 5,
+    'i_pick': 6,
+}
+
+
+def build_glyph_geometry(glyph_type, segments=None):
+    """Строит единичную сферу глифа: вершины, признак белой доли и треугольники"""
+    if segments is None:
+        segments = GLYPH_SEGMENTS[glyph_type]
+
+    theta = np.arange(segments + 1) * np.pi / segments
+    phi = np.arange(segments) * 2 * np.pi / segments
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+
+    vertices = np.stack([np.sin(t) * np.cos(p),
+                         np.sin(t) * np.sin(p),
+                         np.cos(t)], axis=-1).reshape(-1, 3).astype(np.float32)
+
+    if glyph_type == "beach_balls":
+        # Четные доли по долготе - белые, нечетные - цвет события
+        sector = (p / (np.pi / 2)).astype(np.int32) % 4
+        pattern = (sector % 2 == 0).astype(np.float32).reshape(-1)
+    else:
+        pattern = np.zeros(len(vertices), dtype=np.float32)
+
+    i, j = np.meshgrid(np.arange(segments), np.arange(segments), indexing='ij')
+    a = i * segments + j
+    b = i * segments + (j + 1) % segments
+    c = (i + 1) * segments + j
+    d = (i + 1) * segments + (j + 1) % segments
+    triangles = np.stack([a, b, c, b, d, c], axis=-1).reshape(-1).astype(np.uint32)
+
+    return vertices, pattern, triangles
+
+
+def build_impostor_geometry():
+    """Квадрат импостера: углы (+-1, +-1) в плоскости, повернутой к камере, два треугольника"""
+    vertices = np.array([(-1, -1, 0), (1, -1, 0), (1, 1, 0), (-1, 1, 0)], dtype=np.float32)
+    pattern = np.zeros(len(vertices), dtype=np.float32)
+    triangles = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+    return vertices, pattern, triangles
+
+
+def camera_position(view_projection):
+    """Положение камеры из матрицы проекция * вид: точка, которая переходит в (0, 0, z, 0)"""
+    h = np.linalg.solve(np.asarray(view_projection, dtype=np.float64), np.array([0.0, 0.0, 1.0, 0.0]))
+    return h[:3] / h[3]
+
+
+def glyph_scales(energies, multipliers, glyph_type):
+    """Размер глифа: логарифм энергии * множитель типа события, точки - фиксированного размера"""
+    energies = np.asarray(energies, dtype=np.float64)
+    if glyph_type == "points":
+        return np.full(len(energies), POINT_GLYPH_SIZE, dtype=np.float32)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sizes = np.where(energies > 0, np.abs(np.log(np.where(energies > 0, energies, 1.0))) * multipliers, 1.0)
+    return np.minimum(sizes, MAX_GLYPH_SIZE).astype(np.float32)
+
+
+def glyph_lod_segments(pixels, glyph_type):
+    """Число сегментов сферы по размеру глифа на экране (SPRITE_SEGMENTS для спрайтов)"""
+    if glyph_type in GLYPH_SPRITE_TYPES:
+        return np.full(len(pixels), SPRITE_SEGMENTS)
+    levels = np.asarray(GLYPH_LOD_SEGMENTS)[np.searchsorted(GLYPH_LOD_PIXELS, pixels, side='right')]
+    return np.minimum(levels, GLYPH_SEGMENTS[glyph_type])
+
+
+def color_bytes(colors):
+    """RGBA 0..1 -> uint8 для записей экземпляров"""
+    return np.clip(np.rint(np.asarray(colors, dtype=np.float32) * 255.0), 0, 255).astype(np.uint8)
+
+
+def default_energy_colors(energies, opacity=1.0):
+    """Цвета RGBA по энергии для файлов без сохраненных свойств"""
+    thresholds = [t for t, _ in DEFAULT_ENERGY_COLORS]
+    palette = np.array([rgb + [opacity] for _, rgb in DEFAULT_ENERGY_COLORS], dtype=np.float32)
+    ranges = assign_energy_ranges(energies, thresholds)
+    return palette[np.where(ranges >= 0, ranges, len(palette) - 1)]
+
+
+class GlyphMesh:
+    """Общая для всех экземпляров сетка глифа (segments = IMPOSTOR_SEGMENTS - квадрат импостера)"""
+    def __init__(self, glyph_type, segments):
+        self.impostor = segments == IMPOSTOR_SEGMENTS
+        if self.impostor:
+            vertices, pattern, triangles = build_impostor_geometry()
+        else:
+            vertices, pattern, triangles = build_glyph_geometry(glyph_type, segments)
+
+        self.vertexData = np.empty(len(vertices), dtype=[('position', np.float32, 3), ('pattern', np.float32)])
+        self.vertexData['position'] = vertices
+        self.vertexData['pattern'] = pattern
+        self.indices = triangles
+
+        self.vertexBuffer = None
+        self.indexBuffer = None
+
+    def upload(self):
+        if self.vertexBuffer is not None:
+            return
+        self.vertexBuffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.vertexData.nbytes, self.vertexData, gl.GL_STATIC_DRAW)
+
+        self.indexBuffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, gl.GL_STATIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+
+class GlyphLevel:
+    """Видимые экземпляры одного уровня детализации: копия записей и номера их слотов.
+
+    Без сетки (mesh=None) уровень рисует спрайты GL_POINTS: записи экземпляров - повершинные атрибуты.
+    """
+    def __init__(self, mesh=None):
+        self.mesh = mesh
+        # программа уровня (ключ GLYPH_PROGRAMS)
+        if mesh is None:
+            self.kind = 'sprite'
+        else:
+            self.kind = 'impostor' if mesh.impostor else 'mesh'
+        self.slots = np.zeros(0, dtype=np.int64)
+        self.instanceBuffer = None
+        self.slotBuffer = None
+        self.vao = None
+        # число экземпляров, под которое выделена память буферов
+        self.capacity = 0
+
+    def _create_vao(self):
+        """VAO уровня: сетка глифа + буферы экземпляров (указатели задаются один раз)"""
+        self.instanceBuffer, self.slotBuffer = gl.glGenBuffers(2)
+
+        self.vao = gl.glGenVertexArrays(1)
+        gl.glBindVertexArray(self.vao)
+
+        if self.mesh is not None:
+            # повершинные атрибуты общей сетки
+            self.mesh.upload()
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.mesh.vertexBuffer)
+            stride = self.mesh.vertexData.itemsize
+            gl.glEnableVertexAttribArray(GLYPH_ATTRIBUTES['a_position'])
+            gl.glVertexAttribPointer(GLYPH_ATTRIBUTES['a_position'], 3, gl.GL_FLOAT, gl.GL_FALSE, stride,
+                                     ctypes.c_void_p(0))
+            gl.glEnableVertexAttribArray(GLYPH_ATTRIBUTES['a_pattern'])
+            gl.glVertexAttribPointer(GLYPH_ATTRIBUTES['a_pattern'], 1, gl.GL_FLOAT, gl.GL_FALSE, stride,
+                                     ctypes.c_void_p(12))
+
+        # атрибуты экземпляров (делитель 1 - одно значение на экземпляр, у спрайтов 0 - на вершину)
+        divisor = 0 if self.mesh is None else 1
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        stride = INSTANCE_DTYPE.itemsize
+        for field, (name, size, kind, normalized) in INSTANCE_ATTRIBUTES.items():
+            location = GLYPH_ATTRIBUTES[name]
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, size, kind, normalized, stride,
+                                     ctypes.c_void_p(INSTANCE_DTYPE.fields[field][1]))
+            gl.glVertexAttribDivisor(location, divisor)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.slotBuffer)
+        gl.glEnableVertexAttribArray(GLYPH_ATTRIBUTES['i_pick'])
+        gl.glVertexAttribPointer(GLYPH_ATTRIBUTES['i_pick'], 1, gl.GL_FLOAT, gl.GL_FALSE, 4, ctypes.c_void_p(0))
+        gl.glVertexAttribDivisor(GLYPH_ATTRIBUTES['i_pick'], divisor)
+
+        if self.mesh is not None:
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.mesh.indexBuffer)
+        gl.glBindVertexArray(0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def upload(self, instances):
+        """Перезаливает записи и номера слотов (после отсечения или перераспределения слотов)"""
+        if self.vao is None:
+            self._create_vao()
+
+        records = instances[self.slots]
+        # номер слота нужен проходу идентификаторов
+        slots = self.slots.astype(np.float32)
+
+        if len(records) > self.capacity:
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, records.nbytes, records, gl.GL_DYNAMIC_DRAW)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.slotBuffer)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, slots.nbytes, slots, gl.GL_DYNAMIC_DRAW)
+            self.capacity = len(records)
+        elif len(records):
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, records.nbytes, records)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.slotBuffer)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, slots.nbytes, slots)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def update(self, instances):
+        """Записывает в буфер изменившиеся атрибуты (цвет, флаги) без смены состава слотов"""
+        if self.vao is None or len(self.slots) == 0:
+            return
+        records = instances[self.slots]
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, records.nbytes, records)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        gl.glBindVertexArray(self.vao)
+        if self.mesh is None:
+            gl.glDrawArrays(gl.GL_POINTS, 0, len(self.slots))
+            return
+        gl.glDrawElementsInstanced(gl.GL_TRIANGLES, len(self.mesh.indices), gl.GL_UNSIGNED_INT, None, len(self.slots))
+
+
+class GlyphBatch:
+    """Экземпляры одного типа глифа.
+
+    Владельцы (наборы событий файлов) получают непрерывные диапазоны слотов,
+    при освобождении диапазона хвост массива сдвигается.
+    """
+    def __init__(self, glyph_type, impostor=False):
+        self.glyph_type = glyph_type
+        self.shading = GLYPH_SHADING[glyph_type]
+
+        if glyph_type in GLYPH_SPRITE_TYPES:
+            # спрайты - один уровень без сетки
+            self.segments = [SPRITE_SEGMENTS]
+            self.meshes = {SPRITE_SEGMENTS: None}
+        else:
+            self.segments = [n for n in GLYPH_LOD_SEGMENTS if n <= GLYPH_SEGMENTS[glyph_type]]
+            self.meshes = {n: GlyphMesh(glyph_type, n) for n in self.segments}
+        if glyph_type in GLYPH_IMPOSTOR_TYPES:
+            self.meshes[IMPOSTOR_SEGMENTS] = GlyphMesh(glyph_type, IMPOSTOR_SEGMENTS)
+        self.levels = {n: GlyphLevel(mesh) for n, mesh in self.meshes.items()}
+
+        # рисовать ли экземпляры импостерами (только для типов из GLYPH_IMPOSTOR_TYPES)
+        self.impostor = False
+        self.set_impostor(impostor)
+
+        self.instances = np.zeros(0, dtype=INSTANCE_DTYPE)
+        self.count = 0
+        self.ranges = {}
+
+        # пока отсечение не выполнено, рисуются все экземпляры с максимальной детализацией
+        self.culled = False
+        # dirty - изменился состав слотов, stale - только атрибуты экземпляров
+        self.dirty = True
+        self.stale = False
+
+    def _reserve(self, needed):
+        if needed <= len(self.instances):
+            return
+        grown = np.zeros(max(needed, 2 * len(self.instances), 64), dtype=INSTANCE_DTYPE)
+        grown[:self.count] = self.instances[:self.count]
+        self.instances = grown
+
+    def mark_dirty(self):
+        """Записи изменились - видимые копии нужно перезалить"""
+        self.dirty = True
+
+    def set_impostor(self, enabled):
+        self.impostor = bool(enabled) and self.glyph_type in GLYPH_IMPOSTOR_TYPES
+        self.culled = False
+        self.mark_dirty()
+
+    def level_segments(self, pixels):
+        """Ключ уровня для экземпляров с данным размером на экране"""
+        if self.impostor:
+            return np.full(len(pixels), IMPOSTOR_SEGMENTS)
+        return glyph_lod_segments(pixels, self.glyph_type)
+
+    def allocate(self, owner, records):
+        self.release(owner)
+        n = len(records)
+        self._reserve(self.count + n)
+
+        start = self.count
+        self.instances[start:start + n] = records
+        self.count += n
+        self.ranges[owner] = (start, start + n)
+        self.culled = False
+        self.mark_dirty()
+
+    def release(self, owner):
+        if owner not in self.ranges:
+            return
+        start, stop = self.ranges.pop(owner)
+        n = stop - start
+
+        self.instances[start:self.count - n] = self.instances[stop:self.count]
+        self.count -= n
+
+        for key, (s, e) in self.ranges.items():
+            if s >= stop:
+                self.ranges[key] = (s - n, e - n)
+        # номера слотов сдвинулись - прежний результат отсечения недействителен
+        self.culled = False
+        self.mark_dirty()
+
+    def view(self, owner):
+        """Срез массива экземпляров владельца (запись в него требует touch)"""
+        start, stop = self.ranges[owner]
+        return self.instances[start:stop]
+
+    def touch(self, owner=None):
+        """Атрибуты экземпляров изменились на месте - буферы обновятся без перераспределения"""
+        self.stale = True
+
+    def owner_at(self, slot):
+        """Владелец экземпляра в слоте и номер экземпляра внутри его диапазона"""
+        for owner, (start, stop) in self.ranges.items():
+            if start <= slot < stop:
+                return owner, slot - start
+        return None, -1
+
+    def set_visible(self, slots_by_segments):
+        """Результат отсечения: {число сегментов: номера слотов}"""
+        for n, level in self.levels.items():
+            level.slots = slots_by_segments.get(n, np.zeros(0, dtype=np.int64))
+        self.culled = True
+        self.mark_dirty()
+
+    def _sync(self):
+        if self.dirty:
+            if not self.culled:
+                for level in self.levels.values():
+                    level.slots = np.zeros(0, dtype=np.int64)
+                top = IMPOSTOR_SEGMENTS if self.impostor else self.segments[-1]
+                self.levels[top].slots = np.arange(self.count)
+
+            for level in self.levels.values():
+                level.upload(self.instances)
+        elif self.stale:
+            for level in self.levels.values():
+                level.update(self.instances)
+        self.dirty = False
+        self.stale = False
+
+    def draw(self, use_program, transparent, pick_tag=None):
+        """use_program(kind) включает программу вида уровня (сетка, импостер, спрайт) и возвращает ее"""
+        if self.count == 0:
+            return
+
+        self._sync()
+
+        for level in self.levels.values():
+            if len(level.slots) == 0:
+                continue
+            program = use_program(level.kind)
+            gl.glUniform1i(uniform_location(program, "u_shading"), self.shading)
+            gl.glUniform1i(uniform_location(program, "u_transparent_pass"), 1 if transparent else 0)
+            gl.glUniform1i(uniform_location(program, "u_pick"), 0 if pick_tag is None else 1)
+            gl.glUniform1f(uniform_location(program, "u_pick_tag"), 0.0 if pick_tag is None else float(pick_tag))
+            level.draw()
+        gl.glBindVertexArray(0)
+
+
+class GlyphRenderer:
+    """Все экземпляры глифов сцены, по одному вызову отрисовки на тип глифа и уровень детализации"""
+    def __init__(self, impostors=GLYPH_IMPOSTORS):
+        self.impostors = impostors
+        self.batches = {glyph_type: GlyphBatch(glyph_type, impostors) for glyph_type in GLYPH_TYPES}
+        # программы по виду уровня: {kind: program}
+        self.programs = {}
+
+        # начало координат экземпляров (double, задается первым каталогом)
+        self.origin = None
+
+        # последний вид, для которого выполнено отсечение, и масштаб проекции для размера спрайтов
+        self.cullView = None
+        self.projectionScale = 1.0
+
+    def owners(self):
+        owners = []
+        for batch in self.batches.values():
+            for owner in batch.ranges:
+                if owner not in owners:
+                    owners.append(owner)
+        return owners
+
+    def invalidate_culling(self):
+        self.cullView = None
+
+    def set_impostors(self, enabled):
+        """Сферы и пляжные мячики - импостерами или сетками с уровнями детализации"""
+        self.impostors = enabled
+        for batch in self.batches.values():
+            batch.set_impostor(enabled)
+        self.invalidate_culling()
+
+    def cull(self, view_projection, camera, projection_scale):
+        """Отсекает экземпляры по пирамиде видимости и выбирает детализацию по размеру на экране.
+
+        view_projection - матрица проекция * вид (4x4, clip = M @ p), camera - положение камеры,
+        projection_scale - высота окна / (2 tg(fov/2)).
+        """
+        view_projection = np.asarray(view_projection, dtype=np.float64)
+        self.projectionScale = float(projection_scale)
+        view = (view_projection.tobytes(), float(projection_scale))
+        if view == self.cullView and all(batch.culled for batch in self.batches.values() if batch.count):
+            return
+        self.cullView = view
+
+        planes = frustum_planes(view_projection)
+        visible = {glyph_type: {} for glyph_type in GLYPH_TYPES}
+
+        for owner in self.owners():
+            if not owner.enabled:
+                continue
+            # октодерево - в координатах каталога: сдвигаем плоскости и камеру к его началу
+            origin = owner.catalog.origin
+            local_planes = planes.copy()
+            local_planes[:, 3] += planes[:, :3] @ origin
+            indices, pixels = owner.octree.query(local_planes, np.asarray(camera, dtype=np.float64) - origin,
+                                                 projection_scale)
+            shown = owner.catalog.visibility[indices] == 0
+            if not shown.all():
+                indices, pixels = indices[shown], pixels[shown]
+            types = owner.type_index[indices]
+
+            for type_index, glyph_type in enumerate(GLYPH_TYPES):
+                if glyph_type not in owner.members:
+                    continue
+                selected = types == type_index
+                batch = self.batches[glyph_type]
+                start, _ = batch.ranges[owner]
+                slots = start + owner.member_local[indices[selected]]
+                segments = batch.level_segments(pixels[selected])
+                for n in np.unique(segments):
+                    visible[glyph_type].setdefault(int(n), []).append(slots[segments == n])
+
+        for glyph_type, batch in self.batches.items():
+            batch.set_visible({n: np.concatenate(parts) for n, parts in visible[glyph_type].items()})
+
+    def visible_count(self):
+        return sum(len(level.slots) for batch in self.batches.values() for level in batch.levels.values())
+
+    def _program(self, kind):
+        if kind not in self.programs:
+            self.programs[kind] = compile_program(*GLYPH_PROGRAMS[kind], GLYPH_ATTRIBUTES)
+        return self.programs[kind]
+
+    def _begin(self, view_projection, oit=False):
+        """Функция включения программы прохода: общие uniform задаются при первом включении программы"""
+        # перенос к началу координат экземпляров умножается в double, во float32 - только результат
+        origin = self.origin if self.origin is not None else np.zeros(3)
+        view_projection = np.asarray(view_projection, dtype=np.float64)
+        translation = np.eye(4)
+        translation[:3, 3] = origin
+        matrix = np.ascontiguousarray(view_projection @ translation, dtype=np.float32)
+        prepared = set()
+
+        def use_program(kind):
+            program = self._program(kind)
+            gl.glUseProgram(program)
+            if program not in prepared:
+                prepared.add(program)
+                gl.glUniformMatrix4fv(uniform_location(program, "u_view_projection"), 1, gl.GL_TRUE, matrix)
+                gl.glUniform1i(uniform_location(program, "u_oit"), 1 if oit else 0)
+                if kind == 'impostor':
+                    camera = camera_position(view_projection) - origin
+                    gl.glUniform3f(uniform_location(program, "u_camera"), *camera.astype(np.float32))
+                elif kind == 'sprite':
+                    gl.glUniform1f(uniform_location(program, "u_projection_scale"), self.projectionScale)
+                    gl.glUniform2f(uniform_location(program, "u_sprite_pixels"), *SPRITE_PIXELS)
+            return program
+        return use_program
+
+    def draw(self, view_projection, transparent=False, oit=False):
+        """transparent - проход полупрозрачных экземпляров, oit - в буферы TransparencyBuffer"""
+        if not any(batch.count for batch in self.batches.values()):
+            return
+
+        use_program = self._begin(view_projection, oit)
+        for batch in self.batches.values():
+            batch.draw(use_program, transparent)
+        gl.glUseProgram(0)
+
+    def draw_ids(self, view_projection):
+        """Проход идентификаторов: все видимые экземпляры, цвет = номер слота"""
+        if not any(batch.count for batch in self.batches.values()):
+            return
+
+        use_program = self._begin(view_projection)
+        for index, glyph_type in enumerate(GLYPH_TYPES):
+            self.batches[glyph_type].draw(use_program, False, PICK_TAG_GLYPH + index)
+        gl.glUseProgram(0)
+
+    def resolve(self, tag, slot):
+        """Метка и номер из буфера идентификаторов -> (набор событий, индекс события) или (None, -1)"""
+        index = tag - PICK_TAG_GLYPH
+        if not 0 <= index < len(GLYPH_TYPES):
+            return None, -1
+
+        glyph_type = GLYPH_TYPES[index]
+        owner, local = self.batches[glyph_type].owner_at(slot)
+        if owner is None:
+            return None, -1
+        return owner, int(owner.members[glyph_type][local])
+
+
+class EventGlyphSet:
+    """События одного файла (EventCatalog), размещенные в общих массивах экземпляров"""
+    def __init__(self, renderer, catalog):
+        self.renderer = renderer
+        self.catalog = catalog
+
+        n = len(catalog)
+        self.colors = np.zeros((n, 4), dtype=np.float32)
+        self.enabled = True
+
+        # тип глифа -> индексы событий в порядке экземпляров в буфере
+        self.members = {}
+        # для каждого события: индекс типа глифа в GLYPH_TYPES и номер внутри members[тип]
+        self.type_index = np.zeros(n, dtype=np.int8)
+        self.member_local = np.zeros(n, dtype=np.int32)
+
+        # пространственный индекс для отсечения и выбора детализации
+        self.octree = EventOctree(catalog.positions)
+
+        if renderer.origin is None:
+            renderer.origin = catalog.origin.copy()
+        # сдвиг от начала каталога к началу экземпляров рендерера
+        self.offset = catalog.origin - renderer.origin
+
+    def __len__(self):
+        return len(self.catalog)
+
+    @property
+    def glyph_types(self):
+        return np.asarray(GLYPH_TYPES)[self.type_index]
+
+    def _instance_flags(self, events):
+        # видимость экземпляра: файл включен и событие не скрыто фильтром каталога
+        if not self.enabled:
+            return np.zeros(len(events), dtype=np.uint16)
+        return np.where(self.catalog.visibility[events] == 0, FLAG_VISIBLE, 0).astype(np.uint16)
+
+    def restyle(self, glyph_types, colors):
+        """Назначает тип глифа и цвет каждому событию и перестраивает экземпляры"""
+        glyph_types = np.asarray(glyph_types)
+        type_index = np.zeros(len(self), dtype=np.int8)
+        for index, glyph_type in enumerate(GLYPH_TYPES):
+            type_index[glyph_types == glyph_type] = index
+        self._place(type_index, colors)
+
+    def _place(self, type_index, colors):
+        self.type_index = np.asarray(type_index, dtype=np.int8)
+        self.colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4).copy()
+
+        self.release()
+        catalog = self.catalog
+        multipliers = catalog.type_multipliers(TYPE_SIZE_MULTIPLIERS, 1.5)
+        scales = np.zeros(len(self), dtype=np.float32)
+        for type_index, glyph_type in enumerate(GLYPH_TYPES):
+            members = np.flatnonzero(self.type_index == type_index)
+            if len(members) == 0:
+                continue
+
+            records = np.zeros(len(members), dtype=INSTANCE_DTYPE)
+            records['position'] = catalog.positions[members] + self.offset
+            records['scale'] = glyph_scales(catalog.energy[members], multipliers[members], glyph_type)
+            records['color'] = color_bytes(self.colors[members])
+            records['flags'] = self._instance_flags(members)
+
+            self.renderer.batches[glyph_type].allocate(self, records)
+            self.members[glyph_type] = members
+            self.member_local[members] = np.arange(len(members))
+            scales[members] = records['scale']
+
+        # радиус единичной сферы глифа = масштаб экземпляра; спрайты не отсекаются по размеру -
+        # шейдер рисует их не меньше SPRITE_PIXELS[0], иначе удаленные облака точек пропадали бы
+        sprites = np.isin(self.type_index, [GLYPH_TYPES.index(glyph_type) for glyph_type in GLYPH_SPRITE_TYPES])
+        self.octree.set_radii(scales, np.where(sprites, 0.0, MIN_GLYPH_PIXELS))
+        self.renderer.invalidate_culling()
+
+    def release(self):
+        for glyph_type in self.members:
+            self.renderer.batches[glyph_type].release(self)
+        self.members = {}
+        self.renderer.invalidate_culling()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.apply_visibility()
+
+    def apply_visibility(self):
+        """Переносит биты видимости каталога (и включенность файла) во флаги экземпляров"""
+        for glyph_type, members in self.members.items():
+            batch = self.renderer.batches[glyph_type]
+            view = batch.view(self)
+            hovered = view['flags'].astype(np.int32) & FLAG_HOVERED
+            view['flags'] = self._instance_flags(members) | hovered
+            batch.touch(self)
+        # скрытые наборы и события не проходят отсечение вовсе
+        self.renderer.invalidate_culling()
+
+    def _write_colors(self, events):
+        # запись цветов событий прямо в их слоты общего массива экземпляров
+        types = self.type_index[events]
+        for type_index, glyph_type in enumerate(GLYPH_TYPES):
+            if glyph_type not in self.members:
+                continue
+            selected = events[types == type_index]
+            if len(selected) == 0:
+                continue
+            batch = self.renderer.batches[glyph_type]
+            batch.view(self)['color'][self.member_local[selected]] = color_bytes(self.colors[selected])
+            batch.touch(self)
+
+    def set_colors(self, mask, rgb=None, alpha=None):
+        """Меняет цвет и/или прозрачность событий по маске"""
+        events = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if rgb is not None:
+            self.colors[events, :3] = rgb
+        if alpha is not None:
+            self.colors[events, 3] = alpha
+        self._write_colors(events)
+
+    def set_range_colors(self, range_index, rgb=None, alpha=None):
+        """Меняет цвет и/или прозрачность диапазона энергии (без перестройки экземпляров)"""
+        if not 0 <= range_index < len(self.catalog.range_members):
+            return
+        events = self.catalog.range_members[range_index]
+        if rgb is not None:
+            self.colors[events, :3] = rgb
+        if alpha is not None:
+            self.colors[events, 3] = alpha
+        self._write_colors(events)
+
+    def set_range_glyph(self, range_index, glyph_type):
+        """Меняет тип глифа диапазона: экземпляры переносятся между буферами, файл не перечитывается"""
+        if not 0 <= range_index < len(self.catalog.range_members):
+            return
+        events = self.catalog.range_members[range_index]
+        new_index = GLYPH_TYPES.index(glyph_type)
+        if len(events) == 0 or np.all(self.type_index[events] == new_index):
+            return
+        type_index = self.type_index.copy()
+        type_index[events] = new_index
+        self._place(type_index, self.colors)
+
+    def set_hovered(self, index, hovered):
+        """Подсвечивает одно событие (индекс в наборе файла)"""
+        glyph_type = GLYPH_TYPES[self.type_index[index]]
+        if glyph_type not in self.members:
+            return
+        batch = self.renderer.batches[glyph_type]
+        slot = batch.ranges[self][0] + self.member_local[index]
+        bits = int(batch.instances['flags'][slot])
+        batch.instances['flags'][slot] = (bits | FLAG_HOVERED) if hovered else (bits & ~FLAG_HOVERED)
+        batch.touch(self)
+
+    def dominant_glyph_type(self):
+        if len(self) == 0:
+            return "spheres"
+        return GLYPH_TYPES[int(np.argmax(np.bincount(self.type_index, minlength=len(GLYPH_TYPES))))]
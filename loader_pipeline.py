@@ -0,0 +1,131 @@
+import traceback
+
+from PyQt5 import QtCore
+
+# Фоновая загрузка файлов: разбор и подготовка массивов идут в пуле потоков,
+# готовый результат передается в GUI-поток, где создаются VBO и объекты сцены.
+
+
+class LoadCancelled(Exception):
+    """Задача отменена - бросается из progress() внутри загрузчика"""
+
+
+class LoadJob(QtCore.QRunnable):
+    # минимальный шаг прогресса, о котором сообщаем в GUI
+    PROGRESS_STEP = 0.01
+
+    def __init__(self, pipeline, key, function, args, kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.pipeline = pipeline
+        self.key = key
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+        self.cancelled = False
+        self.last_progress = -1.0
+
+    def progress(self, fraction):
+        """Колбэк для загрузчиков: сообщает прогресс и прерывает отмененную задачу"""
+        if self.cancelled:
+            raise LoadCancelled(self.key)
+        if fraction - self.last_progress >= self.PROGRESS_STEP or fraction >= 1.0:
+            self.last_progress = fraction
+            self.pipeline.progressChanged.emit(self.key, float(fraction))
+
+    def run(self):
+        try:
+            self.progress(0.0)
+            result = self.function(*self.args, progress=self.progress, **self.kwargs)
+        except LoadCancelled:
+            self.pipeline.jobCancelled.emit(self, self.key)
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.pipeline.jobFailed.emit(self, self.key, str(e))
+            return
+
+        self.pipeline.jobFinished.emit(self, self.key, result)
+
+
+class LoaderPipeline(QtCore.QObject):
+    """Очередь фоновых загрузок, по одной активной задаче на ключ (путь к файлу)"""
+    progressChanged = QtCore.pyqtSignal(str, float)
+    loadStarted = QtCore.pyqtSignal(str)
+    loadEnded = QtCore.pyqtSignal(str)
+
+    # внутренние сигналы из рабочих потоков (доставляются в GUI-поток очередью)
+    jobFinished = QtCore.pyqtSignal(object, str, object)
+    jobFailed = QtCore.pyqtSignal(object, str, str)
+    jobCancelled = QtCore.pyqtSignal(object, str)
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+
+        # ключ -> (задача, on_done, on_error)
+        self.jobs = {}
+
+        self.jobFinished.connect(self._on_job_finished)
+        self.jobFailed.connect(self._on_job_failed)
+        self.jobCancelled.connect(self._on_job_cancelled)
+
+    def is_loading(self, key):
+        return key in self.jobs
+
+    def submit(self, key, function, *args, on_done=None, on_error=None, **kwargs):
+        """Запускает function(*args, progress=..., **kwargs) в пуле; on_done(result) вызывается в GUI-потоке"""
+        if key in self.jobs:
+            return self.jobs[key][0]
+
+        job = LoadJob(self, key, function, args, kwargs)
+        self.jobs[key] = (job, on_done, on_error)
+        self.loadStarted.emit(key)
+        self.pool.start(job)
+        return job
+
+    def cancel(self, key):
+        """Отменяет загрузку; результат уже работающей задачи будет отброшен"""
+        if key not in self.jobs:
+            return False
+
+        job, _, _ = self.jobs.pop(key)
+        job.cancelled = True
+        if self.pool.tryTake(job):
+            print(f"Загрузка отменена до старта: {key}")
+        else:
+            print(f"Загрузка отменяется: {key}")
+        self.loadEnded.emit(key)
+        return True
+
+    def cancel_all(self):
+        for key in list(self.jobs):
+            self.cancel(key)
+
+    def _take(self, job, key):
+        # задача могла быть отменена и заменена новой с тем же ключом
+        current = self.jobs.get(key)
+        if current is None or current[0] is not job:
+            return None
+        del self.jobs[key]
+        self.loadEnded.emit(key)
+        return current
+
+    def _on_job_finished(self, job, key, result):
+        entry = self._take(job, key)
+        if entry is not None and entry[1] is not None:
+            entry[1](result)
+
+    def _on_job_failed(self, job, key, message):
+        entry = self._take(job, key)
+        if entry is not None:
+            print(f"Ошибка фоновой загрузки {key}: {message}")
+            if entry[2] is not None:
+                entry[2](message)
+
+    def _on_job_cancelled(self, job, key):
+        self._take(job, key)
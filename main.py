@@ -1,10 +1,8 @@
 from OpenGL.arrays import vbo
 from PyQt5 import QtCore, QtWidgets  # core Qt functionality
 from PyQt5 import QtGui  # extends QtCore with GUI functionality
-from PyQt5 import QtOpenGL  # provides QGLWidget, a special OpenGL QWidget
 
 import OpenGL.GL as gl  # python wrapping of OpenGL
-from OpenGL import GLU  # OpenGL Utility Library, extends OpenGL functionality
 
 # from OpenGL.arrays import vbo
 # from ezdxf.entities import Face3d
@@ -17,14 +15,23 @@ from AppWindow import MainWindow
 import math
 import sys  # we'll need this later to run our Qt application
 
-from object_constructors import create_dxf_object, create_sphere, create_pyramid, create_detector, \
-    create_event, create_point, create_beach_ball_hosohedron, create_enhanced_sphere
-from utilities import screen_pos_to_vector
+from object_constructors import create_dxf_object, prepare_dxf_geometry, create_dxf_object_from_geometry, create_sphere, create_pyramid, create_detector
+from glyph_instancing import GlyphRenderer, EventGlyphSet
+from mesh_renderer import MeshRenderer
+from mesh_tiles import TilePager
+from picking import PickBuffer, PICK_TAG_OBJECT, encode_pick_color
+from render_lists import RenderLists, world_corners
+from spatial_index import frustum_planes
+from transparency import TransparencyBuffer
 
 # Камера работает как орбитальная - вращается вокруг целевого объекта (viewTarget)
 
-# основной виджет для 3D отображения
-class GLWidget(QtOpenGL.QGLWidget):
+# основной виджет для 3D отображения (OpenGL 3.3 core profile)
+class GLWidget(QtWidgets.QOpenGLWidget):
+    # наведенный/выбранный элемент: None, ('object', id) или ('event', ключ файла, индекс события)
+    hoverChanged = QtCore.pyqtSignal(object)
+    selectionChanged = QtCore.pyqtSignal(object)
+
     ROT_Y_MIN = math.pi * (0.1 / 360)
     ROT_Y_MAX = math.pi * (359.9 / 360)
 
@@ -42,7 +49,11 @@ class GLWidget(QtOpenGL.QGLWidget):
 
     ENABLE_EDGES = True
     ENABLE_FACES = True
-    ENABLE_HOVER = False
+    ENABLE_HOVER = True
+
+    # интервал между кадрами (мс): при перетаскивании камеры и при разовых изменениях сцены
+    FRAME_INTERVAL_INTERACTIVE = 8
+    FRAME_INTERVAL_IDLE = 30
 
     def __init__(self, parent=None):
         self.parent = parent
@@ -57,8 +68,13 @@ class GLWidget(QtOpenGL.QGLWidget):
         self.camZ = 0.0
 
         self.objects = {}
+        # события хранятся не объектами, а экземплярами общих глифов
+        self.glyphs = GlyphRenderer()
+        self.event_sets = {}
         self.pickedObjects = []
         self.hoveredObject = -1
+        self.hovered = None
+        self.selected = None
         self.viewTarget = None
 
         self.mousePos = (0, 0)
@@ -66,31 +82,80 @@ class GLWidget(QtOpenGL.QGLWidget):
         self.mouseCapturedEvent = None
         self.mousePrevEvent = None
 
-        QtOpenGL.QGLWidget.__init__(self, parent)
+        QtWidgets.QOpenGLWidget.__init__(self, parent)
+
+        surface_format = QtGui.QSurfaceFormat()
+        surface_format.setVersion(3, 3)
+        surface_format.setProfile(QtGui.QSurfaceFormat.CoreProfile)
+        surface_format.setDepthBufferSize(24)
+        self.setFormat(surface_format)
+
+        # сетки объектов рисуются шейдерами через VAO, события - инстансингом
+        self.meshes = MeshRenderer()
+        # тайлы больших сеток подкачиваются в GPU по видимости
+        self.tilePager = TilePager(self.meshes)
+        # False - только характерные ребра сеток (границы, изломы, полилинии), True - вся сетка ребер
+        self.allEdges = False
+        # параметры SurfaceStyle, общие для всех моделей DXF (раскраска по высоте, уклоны)
+        self.surfaceStyle = {}
+        self.lineWidth = 1.0
+        # пикселей на единицу тангенса угла обзора (для выбора уровня детализации), None - без камеры
+        self.projectionScale = None
+
+        # Отрисовка по требованию: кадр рисуется, только когда сцена помечена измененной.
+        # Несколько изменений подряд собираются в один кадр таймером.
+        self.dirty = True
+        self.interactive = False
+        self.frameTimer = QtCore.QTimer(self)
+        self.frameTimer.setSingleShot(True)
+        self.frameTimer.timeout.connect(self._render_frame)
+
+        # буфер идентификаторов перерисовывается лениво - при первом чтении после изменения сцены
+        self.pickBuffer = PickBuffer()
+        self.pickDirty = True
+
+        # буферы прозрачности без сортировки (weighted blended OIT)
+        self.transparency = TransparencyBuffer()
+        # списки отрисовки объектов - перестраиваются только при изменении сцены
+        self.renderLists = RenderLists()
 
     # инициализация OpenGL, настройка фона и глубины
     def initializeGL(self):
-        self.qglClearColor(QtGui.QColor(152, 221, 250))
+        gl.glClearColor(152 / 255, 221 / 255, 250 / 255, 1.0)
         gl.glEnable(gl.GL_DEPTH_TEST)
         gl.glEnable(gl.GL_BLEND)
         gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        # размер спрайтов точек задает вершинный шейдер
+        gl.glEnable(gl.GL_PROGRAM_POINT_SIZE)
+
+        # толстые линии в core profile поддерживаются не везде
+        self.lineWidth = min(2.0, float(gl.glGetFloatv(gl.GL_ALIASED_LINE_WIDTH_RANGE)[1]))
 
         # self._init_geometry("../korkino_model.dxf")
-        gl.glPushMatrix()
 
     # обработка изменения размера окна, настройка перспективы
+    # (область вывода задает сам QOpenGLWidget, проекция строится в view_projection)
     def resizeGL(self, width, height):
-        gl.glViewport(0, 0, width, height)
-        gl.glMatrixMode(gl.GL_PROJECTION)
-        gl.glLoadIdentity()
-        self.ASPECT_RATIO = width / float(height)
+        self.ASPECT_RATIO = width / float(max(1, height))
+        self.pickDirty = True
 
-        GLU.gluPerspective(self.FIELD_OF_VIEW, self.ASPECT_RATIO, self.RENDER_DISTANCE_NEAR, self.RENDER_DISTANCE_FAR)
-        gl.glMatrixMode(gl.GL_MODELVIEW)
 
+    # помечает сцену измененной и планирует кадр
+    # scene_changed=False - меняется только вид (подсветка), буфер идентификаторов остается верным
+    def request_update(self, scene_changed=True):
+        self.dirty = True
+        if scene_changed:
+            self.pickDirty = True
+        if not self.frameTimer.isActive():
+            self.frameTimer.start(self.FRAME_INTERVAL_INTERACTIVE if self.interactive else self.FRAME_INTERVAL_IDLE)
+
+    def _render_frame(self):
+        if self.dirty:
+            self.update()
 
     def mousePressEvent(self, a0):
         self.mouseCaptured = True
+        self.interactive = True
 
         self.mouseCapturedEvent = (a0.x(), a0.y())
         self.mousePrevEvent = (a0.x(), a0.y())
@@ -106,11 +171,15 @@ class GLWidget(QtOpenGL.QGLWidget):
                 self.addRotX(dx)
                 self.addRotY(dy)
                 self.mousePrevEvent = (a0.x(), a0.y())
+        elif self.ENABLE_HOVER:
+            # наведение проверяется только при движении мыши - чтение одного пикселя
+            self.set_hovered(self.pick(a0.x(), a0.y()))
 
     def mouseReleaseEvent(self, a0):
         clicked = self.mousePrevEvent == self.mouseCapturedEvent
 
         self.mouseCaptured = False
+        self.interactive = False
 
         self.mouseCapturedEvent = None
         self.mousePrevEvent = None
@@ -120,108 +189,142 @@ class GLWidget(QtOpenGL.QGLWidget):
         # print("Released", a0.x(), a0.y())
 
     def mouseClickEvent(self, a0):
-        pass
+        self.selected = self.pick(a0.x(), a0.y())
+        self.selectionChanged.emit(self.selected)
 
     def wheelEvent(self, a0):
         da = a0.angleDelta().y() / 15 / 8 * self.SENSITIVITY_ARM
         self.armLength = max(self.ARM_MIN, min(self.ARM_MAX, int(self.armLength - max(da * 0.02 * self.armLength, da / 5, key=math.fabs))))
+        self.request_update()
+
+    # проход идентификаторов: объекты и экземпляры событий цветом своего номера
+    def _render_ids(self):
+        self.pickBuffer.bind(self.width(), self.height())
 
-    def check_collision_object(self, direction, obj):
-        tMin = self.RENDER_DISTANCE_NEAR
-        tMax = self.RENDER_DISTANCE_FAR
-        obj_pos = glm.vec3([obj.matrix[3].x, obj.matrix[3].y, obj.matrix[3].z])
-        loc = glm.vec3([self.camX, self.camY, self.camZ])
-        delta = obj_pos - loc
-
-        pts_beg = obj.collision.pointBegin
-        pts_end = obj.collision.pointEnd
-        for i in range(3):
-            axis = glm.vec3([obj.matrix[i].x, obj.matrix[i].y, obj.matrix[i].z])
-            e = glm.dot(axis, delta)
-            f = glm.dot(direction, axis)
-
-            if math.fabs(f) > 0:
-                t1 = (e + pts_beg[i]) / f
-                t2 = (e + pts_end[i] * obj.scale[i]) / f
-
-                if t1 > t2:
-                    t1, t2 = t2, t1
-                if t2 < tMax:
-                    tMax = t2
-                if t1 > tMin:
-                    tMin = t1
-                if tMax < tMin:
-                    return -1.0
-            else:
-                if -e + pts_beg[i] > 0.0 or -e + pts_end[i] < 0.0:
-                    return -1.0
-        return tMin
-
-    # проверка столкновений луча мыши с объектами
-    def check_collision(self):
-        cam = glm.vec3([self.camX, self.camY, self.camZ])
-        direction = screen_pos_to_vector(self.mousePos[0], self.mousePos[1], self.width(), self.height(), cam,
-                                         glm.vec3(self.viewTarget.location))
-
-        obj_id = -1
-        dist = self.RENDER_DISTANCE_FAR * 2
-
-        for obj in self.objects:
-            if self.objects[obj].enabled and self.objects[obj].collision.enabled:
-                cur = self.check_collision_object(direction, self.objects[obj])
-                if 0.0 < cur < dist:
-                    obj_id = obj
-                    dist = cur
-
-
-        if obj_id == -1 and self.hoveredObject != -1:
-            self.objects[self.hoveredObject].on_unhover()
-            self.hoveredObject = -1
-        elif obj_id != self.hoveredObject and self.hoveredObject != -1:
-            self.objects[self.hoveredObject].on_unhover()
-            self.hoveredObject = obj_id
-            self.objects[obj_id].on_hover()
-        elif obj_id != self.hoveredObject and self.hoveredObject == -1:
-            self.hoveredObject = obj_id
-            self.objects[obj_id].on_hover()
-
-    # отрисовка отдельного 3D объекта
-    def draw_object(self, obj):
-        gl.glPushMatrix()
-
-        gl.glTranslate(*obj.location)
-        gl.glRotatef(obj.rotation[0], 1.0, 0.0, 0.0)
-        gl.glRotatef(obj.rotation[1], 0.0, 1.0, 0.0)
-        gl.glRotatef(obj.rotation[2], 0.0, 0.0, 1.0)
-        gl.glScale(*obj.scale)
-
-        obj.mesh.verticesVBO.bind()
-        gl.glVertexPointer(3, gl.GL_FLOAT, 0, obj.mesh.verticesVBO)
-
-        # Сначала грани (если включено)
-        if self.ENABLE_FACES and obj.mesh.enableFaces:
-            obj.mesh.colorsFacesVBO.bind()
-            gl.glColorPointer(4, gl.GL_FLOAT, 0, obj.mesh.colorsFacesVBO)
-
-            if obj.mesh.facesTriangles is not None:
-                gl.glDrawElements(gl.GL_TRIANGLES, len(obj.mesh.facesTriangles), gl.GL_UNSIGNED_INT,
-                                  obj.mesh.facesTriangles)
-
-            if obj.mesh.facesQuads is not None:
-                gl.glDrawElements(gl.GL_QUADS, len(obj.mesh.facesQuads), gl.GL_UNSIGNED_INT,
-                                  obj.mesh.facesQuads)
-
-            obj.mesh.colorsFacesVBO.unbind()
-
-        # Затем ребра (если включено) - ТОЛЬКО ДЛЯ DXF, НЕ ДЛЯ СОБЫТИЙ
-        if self.ENABLE_EDGES and obj.mesh.enableEdges and obj.mesh.edges is not None and obj.obj_type != "event":
-            obj.mesh.colorsEdgesActiveVBO.bind()
-            gl.glColorPointer(3, gl.GL_FLOAT, 0, obj.mesh.colorsEdgesActiveVBO)
-            gl.glDrawElements(gl.GL_LINES, len(obj.mesh.edges), gl.GL_UNSIGNED_INT, obj.mesh.edges)
-            obj.mesh.colorsEdgesActiveVBO.unbind()
-
-        obj.mesh.verticesVBO.unbind()
-        gl.glPopMatrix()
+        self._compute_camera()
+        view_projection = self.view_projection()
+        planes = self._cull_events(view_projection)
+
+        self.renderLists.update(self.objects)
+        self.tilePager.begin_frame()
+        self.meshes.begin(view_projection, pick=True)
+        for render_pass in (self.renderLists.opaque, self.renderLists.transparent):
+            for obj, pixels in self._visible_objects(render_pass, planes):
+                if obj.collision.enabled:
+                    self.draw_object(obj, pixels, pick_color=encode_pick_color(obj.id, PICK_TAG_OBJECT),
+                                     planes=planes)
+        self.meshes.end()
+        self.tilePager.end_frame()
+
+        self.glyphs.draw_ids(view_projection)
+
+        self.pickBuffer.unbind(self.defaultFramebufferObject())
+        self.pickDirty = False
+
+    # элемент сцены под курсором
+    def pick(self, x, y):
+        self.makeCurrent()
+        if self.pickDirty:
+            self._render_ids()
+
+        tag, pick_id = self.pickBuffer.read(x, y)
+        self.doneCurrent()
+        if tag == PICK_TAG_OBJECT:
+            return ('object', pick_id) if pick_id in self.objects else None
+
+        event_set, index = self.glyphs.resolve(tag, pick_id)
+        if event_set is None:
+            return None
+        for key, candidate in self.event_sets.items():
+            if candidate is event_set:
+                return 'event', key, index
+        return None
+
+    def _apply_hover(self, item, hovered):
+        if item is None:
+            return
+        if item[0] == 'object' and item[1] in self.objects:
+            obj = self.objects[item[1]]
+            obj.on_hover() if hovered else obj.on_unhover()
+        elif item[0] == 'event' and item[1] in self.event_sets:
+            self.event_sets[item[1]].set_hovered(item[2], hovered)
+
+    def set_hovered(self, item):
+        if item == self.hovered:
+            return
+        self._apply_hover(self.hovered, False)
+        self._apply_hover(item, True)
+
+        self.hovered = item
+        self.hoveredObject = item[1] if item is not None and item[0] == 'object' else -1
+        self.hoverChanged.emit(item)
+        self.request_update(scene_changed=False)
+
+    # отрисовка отдельного 3D объекта (между self.meshes.begin и end)
+    # pixels - пикселей экрана на единицу модели, pick_color - цвет номера объекта для прохода идентификаторов
+    def draw_object(self, obj, pixels, pick_color=None, planes=None):
+        # издалека рисуется упрощенный уровень детализации сетки
+        mesh = obj.mesh.level_for(pixels) if obj.mesh.lods else obj.mesh
+        # Ребра - ТОЛЬКО ДЛЯ DXF, НЕ ДЛЯ СОБЫТИЙ
+        faces = self.ENABLE_FACES and obj.mesh.enableFaces
+        edges = self.ENABLE_EDGES and obj.mesh.enableEdges and obj.obj_type != "event"
+
+        if mesh is not obj.mesh or not mesh.tiles:
+            self.meshes.draw(mesh, obj.matrix, faces=faces, edges=edges, pick_color=pick_color,
+                             all_edges=self.allEdges, owner=obj.mesh)
+            return
+
+        # вблизи большая сетка рисуется видимыми тайлами
+        for tile in mesh.tiles:
+            if self._box_outside(tile.pointBegin, tile.pointEnd, obj.matrix, planes):
+                continue
+            tile_mesh = self.tilePager.acquire(tile)
+            if tile_mesh is None:
+                continue
+            self.meshes.draw(tile_mesh, obj.matrix, faces=faces, edges=edges, pick_color=pick_color,
+                             all_edges=self.allEdges, owner=mesh)
+
+    def set_all_edges(self, enabled):
+        """Переключает отрисовку всех ребер сеток / только характерных"""
+        self.allEdges = enabled
+        self.request_update(scene_changed=False)
+
+    def set_glyph_impostors(self, enabled):
+        """Сферы событий - импостерами (трассировка во фрагментном шейдере) или сетками"""
+        self.glyphs.set_impostors(enabled)
+        self.request_update()
+
+    def set_surface_style(self, **values):
+        """Меняет раскраску поверхностей всех моделей DXF - только uniform шейдера, без перестроения буферов"""
+        self.surfaceStyle.update(values)
+        for obj in self.objects.values():
+            if obj.mesh.surfaceStyle is not None:
+                obj.mesh.surfaceStyle.update(**values)
+        if 'base_color' in values:
+            # альфа стиля решает, в каком проходе рисуется модель
+            self.renderLists.invalidate()
+        self.request_update(scene_changed=False)
+
+    def set_object_enabled(self, obj_id, enabled):
+        """Включает/выключает объект сцены"""
+        obj = self.objects.get(obj_id)
+        if obj is None:
+            return
+        obj.enabled = enabled
+        obj.mesh.enabled = enabled
+        self.renderLists.invalidate()
+        self.request_update()
+
+    def release_mesh(self, mesh):
+        """Удаляет VAO и буферы сетки, ее уровней детализации и тайлов (контекст делается текущим)"""
+        self.makeCurrent()
+        for level in [mesh] + [level for _, level in mesh.lods]:
+            self.meshes.release(level)
+            for buffer in (level.verticesVBO, level.colorsFacesVBO, level.normalsVBO):
+                if buffer is not None:
+                    buffer.delete()
+        self.tilePager.release(mesh.tiles)
+        self.doneCurrent()
 
     # вычисление позиции камеры вокруг целевого объекта
     def _compute_camera(self):
@@ -231,105 +334,102 @@ class GLWidget(QtOpenGL.QGLWidget):
             self.camY = y + self.armLength * math.cos(self.rotY)
             self.camZ = z + self.armLength * math.sin(self.rotY) * math.sin(self.rotX)
 
-    # позиционирование камеры в сцене
-    def _position_camera(self):
-        if self.viewTarget is not None:
-            x, y, z = self.viewTarget.location + self.viewTarget.origin
-            GLU.gluLookAt(self.camX, self.camY, self.camZ, x, y, z, 0.0, 1.0, 0.0)
-
-    # основной цикл отрисовки всех объектов
+    # матрица проекция * вид (строчная запись, clip = M @ p) для шейдеров и отсечения.
+    # Считается в double: камера в мировых (рудничных) координатах, во float32 ее положение дрожит;
+    # во float32 переводится только произведение с матрицей модели (см. MeshRenderer.draw)
+    def view_projection(self):
+        projection = glm.dmat4(glm.perspective(glm.radians(self.FIELD_OF_VIEW), self.ASPECT_RATIO,
+                                               self.RENDER_DISTANCE_NEAR, self.RENDER_DISTANCE_FAR))
+        if self.viewTarget is None:
+            return np.array(projection)
+        x, y, z = self.viewTarget.location + self.viewTarget.origin
+        view = glm.lookAt(glm.dvec3(self.camX, self.camY, self.camZ), glm.dvec3(x, y, z), glm.dvec3(0.0, 1.0, 0.0))
+        return np.array(projection * view)
+
+    # отсечение событий и выбор детализации глифов для текущей камеры
+    def _cull_events(self, view_projection):
+        if self.viewTarget is None:
+            self.projectionScale = None
+            return None
+        self.projectionScale = self.height() / (2 * math.tan(math.radians(self.FIELD_OF_VIEW) / 2))
+        self.glyphs.cull(view_projection, (self.camX, self.camY, self.camZ), self.projectionScale)
+        return frustum_planes(view_projection)
+
+    # прямоугольник целиком вне пирамиды видимости (проверка его углов)
+    def _box_outside(self, begin, end, matrix, planes):
+        if planes is None:
+            return False
+        world = world_corners(begin, end, matrix)
+        return bool(((world @ planes[:, :3].T + planes[:, 3]) < 0).all(axis=0).any())
+
+    # видимые объекты прохода и пикселей экрана на единицу модели в ближайшей к камере точке каждого
+    # (inf - камера внутри); отсечение и размеры считаются для всего прохода сразу
+    def _visible_objects(self, render_pass, planes):
+        indices = render_pass.visible(planes)
+        pixels = render_pass.pixels_per_unit(indices, (self.camX, self.camY, self.camZ), self.projectionScale)
+        return [(render_pass.objects[i], p) for i, p in zip(indices, pixels)]
+
+    # отрисовка всех объектов (вызывается только для измененной сцены)
     def paintGL(self):
+        self.dirty = False
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
+        # камера ставится в начале кадра, чтобы кадр сразу отражал последнее изменение
         self._compute_camera()
-        if self.ENABLE_HOVER:
-            self.check_collision()
-
-        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
-        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        view_projection = self.view_projection()
+        planes = self._cull_events(view_projection)
 
         # УВЕЛИЧИВАЕМ ТОЛЩИНУ ЛИНИЙ ДЛЯ ЛУЧШЕЙ ВИДИМОСТИ
-        gl.glLineWidth(2.0)
-
-        # РАЗДЕЛЯЕМ ОБЪЕКТЫ НА НЕПРОЗРАЧНЫЕ И ПРОЗРАЧНЫЕ
-        opaque_objects = []
-        transparent_objects = []
+        gl.glLineWidth(self.lineWidth)
 
-        camera_pos = np.array([self.camX, self.camY, self.camZ])
+        # НЕПРОЗРАЧНЫЕ И ПРОЗРАЧНЫЕ ОБЪЕКТЫ - из кэша списков (перестраивается только после изменения сцены)
+        self.renderLists.update(self.objects)
 
-        for obj in self.objects.values():
-            if obj.enabled and obj.mesh.enabled:
-                # Определяем прозрачность объекта
-                is_transparent = False
-                if hasattr(obj, 'current_opacity'):
-                    is_transparent = obj.current_opacity < 0.99
-
-                if is_transparent:
-                    # Вычисляем расстояние до камеры для сортировки
-                    obj_pos = np.array([obj.matrix[3].x, obj.matrix[3].y, obj.matrix[3].z])
-                    distance = np.linalg.norm(camera_pos - obj_pos)
-                    transparent_objects.append((distance, obj))
-                else:
-                    opaque_objects.append(obj)
+        self.tilePager.begin_frame()
 
         # Сначала рисуем все непрозрачные объекты
-        for obj in opaque_objects:
-            if obj.obj_type == "event" and hasattr(obj, 'draw_outline'):
-                gl.glPushMatrix()
-                gl.glTranslate(*obj.location)
-                gl.glRotatef(obj.rotation[0], 1.0, 0.0, 0.0)
-                gl.glRotatef(obj.rotation[1], 0.0, 1.0, 0.0)
-                gl.glRotatef(obj.rotation[2], 0.0, 0.0, 1.0)
-                obj.draw_outline()
-                gl.glPopMatrix()
-
-            self.draw_object(obj)
-
-        # Включаем смешивание для прозрачных объектов
-        gl.glEnable(gl.GL_BLEND)
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-
-        # Отключаем запись глубины для прозрачных объектов
-        gl.glDepthMask(gl.GL_FALSE)
-
-        # Сортируем прозрачные объекты по расстоянию (от дальних к ближним)
-        transparent_objects.sort(key=lambda x: x[0], reverse=True)
-
-        # Рисуем прозрачные объекты
-        for distance, obj in transparent_objects:
-            if obj.obj_type == "event" and hasattr(obj, 'draw_outline'):
-                gl.glPushMatrix()
-                gl.glTranslate(*obj.location)
-                gl.glRotatef(obj.rotation[0], 1.0, 0.0, 0.0)
-                gl.glRotatef(obj.rotation[1], 0.0, 1.0, 0.0)
-                gl.glRotatef(obj.rotation[2], 0.0, 0.0, 1.0)
-                obj.draw_outline()
-                gl.glPopMatrix()
-
-            self.draw_object(obj)
-
-        # Восстанавливаем запись глубины
-        gl.glDepthMask(gl.GL_TRUE)
+        self.meshes.begin(view_projection)
+        for obj, pixels in self._visible_objects(self.renderLists.opaque, planes):
+            self.draw_object(obj, pixels, planes=planes)
+        self.meshes.end()
+
+        # Непрозрачные события - один инстансный вызов на тип глифа
+        self.glyphs.draw(view_projection, transparent=False)
+
+        # Прозрачные объекты и события - во взвешенную сумму буферов OIT, затем наложение на кадр
+        self.transparency.begin(self.defaultFramebufferObject())
+        self.meshes.begin(view_projection, oit=True)
+        for obj, pixels in self._visible_objects(self.renderLists.transparent, planes):
+            self.draw_object(obj, pixels, planes=planes)
+        self.meshes.end()
+
+        # не все видимые тайлы успели загрузиться - догружаем в следующем кадре
+        self.tilePager.end_frame()
+        if self.tilePager.pending:
+            self.request_update()
+
+        self.glyphs.draw(view_projection, transparent=True, oit=True)
+        self.transparency.end(self.defaultFramebufferObject())
         gl.glDisable(gl.GL_BLEND)
 
         # ВОССТАНАВЛИВАЕМ ТОЛЩИНУ ЛИНИЙ ПО УМОЛЧАНИЮ
         gl.glLineWidth(1.0)
 
-        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
-        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
-
-        gl.glPopMatrix()
-        gl.glPushMatrix()
-
-        self._position_camera()
-
     def add_object_dxf(self, filepath):
-        obj = create_dxf_object(filepath, False)
+        return self.add_object_dxf_geometry(prepare_dxf_geometry(filepath, False))
+
+    def add_object_dxf_geometry(self, geometry):
+        """Создает DXF объект из массивов, подготовленных фоновой загрузкой"""
+        obj = create_dxf_object_from_geometry(geometry)
+        obj.mesh.surfaceStyle.update(**self.surfaceStyle)
         obj.scale = np.array([1.0, 1.0, 1.0])
         obj.calculate_matrix()
 
         self.objects[obj.id] = obj
+        self.renderLists.invalidate()
         self.viewTarget = obj
+        self.request_update()
+        return obj
 
     def add_object_detector(self, det_id, x, y, z):
         obj = create_detector(det_id, x, y, z)
@@ -337,183 +437,43 @@ class GLWidget(QtOpenGL.QGLWidget):
         obj.calculate_matrix()
 
         self.objects[obj.id] = obj
+        self.renderLists.invalidate()
+        self.request_update()
+        return obj
 
-    def add_object_event(self, x, y, z, event_type, energy, custom_color=None):
-        print(f"Добавление события: X={x}, Y={y}, Z={z}, тип={event_type}, энергия={energy}")
-
-        # Передаем кастомный цвет если указан
-        if custom_color is not None:
-            # custom_color должен быть в формате RGBA [r, g, b, a]
-            if len(custom_color) == 3:
-                # Если только RGB, добавляем альфа=1.0
-                rgba_color = custom_color + [1.0]
-            else:
-                rgba_color = custom_color
-            obj = create_event(x, y, z, event_type, energy, rgba_color)
-        else:
-            obj = create_event(x, y, z, event_type, energy)
-
-        # Базовые множители для разных типов событий
-        type_multipliers = {
-            "explosion": 3.0,  # Взрывы - самые большие
-            "earthquake": 1.5,  # Землетрясения - средние
-            "microseismic": 0.8,  # Микросейсмика - маленькие
-            "unknown": 0.5  # По умолчанию
-        }
-
-        # Получаем множитель для типа события
-        multiplier = type_multipliers.get(event_type, 1.5)
-
-        # Формула размера: логарифм энергии * множитель типа
-        s = math.fabs(math.log(energy)) * multiplier if energy > 0 else 1.0
-
-        # Ограничиваем максимальный размер (например, 30 единиц)
-        s = min(s, 100.0)
-
-        print(f"Размер шара: {s} (тип: {event_type}, множитель: {multiplier})")
-
-        obj.scale = np.array([s, s, s])
-        obj.calculate_matrix()
-
-        # СОХРАНЯЕМ БАЗОВЫЙ ЦВЕТ И ПРОЗРАЧНОСТЬ ДЛЯ ДИНАМИЧЕСКОГО ОСВЕЩЕНИЯ
-        obj.base_color = [1.0, 0.0, 0.0]  # будет переопределено свойствами
-        obj.current_opacity = 1.0
-
-        # Добавляем объект
-        self.objects[obj.id] = obj
-        print(f"Объект добавлен с ID: {obj.id}, всего объектов: {len(self.objects)}\n")
-
-    def add_object_beach_ball(self, x, y, z, event_type, energy, custom_color=None):
-        """Добавляет пляжный мячик с возможностью указать цвет и прозрачность"""
-        print(f"Добавление пляжного мячика: X={x}, Y={y}, Z={z}")
-
-        # Используем кастомный цвет или цвет по энергии
-        if custom_color is not None:
-            base_color = custom_color
-        else:
-            # Определяем цвет по энергии
-            if energy > 100000000000:
-                base_color = [1.0, 0.0, 0.0, 1.0]
-            elif energy > 1000000000:
-                base_color = [1.0, 0.5, 0.0, 1.0]
-            elif energy > 100000000:
-                base_color = [1.0, 1.0, 0.0, 1.0]
-            elif energy > 1000000:
-                base_color = [0.0, 1.0, 0.0, 1.0]
-            elif energy > 1000:
-                base_color = [0.0, 0.0, 1.0, 1.0]
-            else:
-                base_color = [0.5, 0.5, 0.5, 1.0]
-
-        # ⚠️ ГАРАНТИРУЕМ ЧТО ЦВЕТ В RGBA ФОРМАТЕ
-        if len(base_color) == 3:
-            base_color = base_color + [1.0]
-
-        obj = create_beach_ball_hosohedron(base_color)
-        obj.location = np.array([x, y, z])
-        obj.obj_type = "event"
-        obj.data["type"] = event_type
-        obj.data["energy"] = energy
-        obj.data["visualization"] = "beach_ball"
-
-        # Размер пляжного мячика
-        type_multipliers = {
-            "explosion": 3.0,
-            "earthquake": 1.5,
-            "microseismic": 0.8,
-            "unknown": 0.5
-        }
-
-        multiplier = type_multipliers.get(event_type, 1.5)
-        s = math.fabs(math.log(energy)) * multiplier if energy > 0 else 1.0
-        s = min(s, 100.0)
-
-        obj.scale = np.array([s, s, s])
-        obj.calculate_matrix()
-
-        self.objects[obj.id] = obj
-        print(f"✅ Пляжный мячик с прозрачностью {base_color[3]} добавлен с ID: {obj.id}")
+    def remove_object(self, obj_id):
+        obj = self.objects.pop(obj_id, None)
+        if obj is None:
+            return None
+        self.renderLists.invalidate()
+        if self.hovered is not None and self.hovered[:2] == ('object', obj_id):
+            self.set_hovered(None)
+        if self.viewTarget is obj:
+            self.viewTarget = None
+        # сетка принадлежит только этому объекту - ее объекты GPU больше не нужны
+        self.release_mesh(obj.mesh)
+        self.request_update()
         return obj
 
-    def add_object_point(self, x, y, z, event_type, energy, custom_color=None):
-        """Добавляет точку с возможностью указать цвет и прозрачность"""
-        print(f"Добавление точки: X={x}, Y={y}, Z={z}")
-
-        # Используем кастомный цвет или цвет по энергии
-        if custom_color is not None:
-            base_color = custom_color
-        else:
-            # Определяем цвет по энергии
-            if energy > 100000000000:
-                base_color = [1.0, 0.0, 0.0, 1.0]
-            elif energy > 1000000000:
-                base_color = [1.0, 0.5, 0.0, 1.0]
-            elif energy > 100000000:
-                base_color = [1.0, 1.0, 0.0, 1.0]
-            elif energy > 1000000:
-                base_color = [0.0, 1.0, 0.0, 1.0]
-            elif energy > 1000:
-                base_color = [0.0, 0.0, 1.0, 1.0]
-            else:
-                base_color = [0.5, 0.5, 0.5, 1.0]
-
-        # ⚠️ ГАРАНТИРУЕМ ЧТО ЦВЕТ В RGBA ФОРМАТЕ
-        if len(base_color) == 3:
-            base_color = base_color + [1.0]
-
-        obj = create_point(base_color)
-        obj.location = np.array([x, y, z])
-        obj.obj_type = "event"
-        obj.data["type"] = event_type
-        obj.data["energy"] = energy
-        obj.data["visualization"] = "point"
-
-        # Фиксированный размер для точек
-        s = 5.0
-        obj.scale = np.array([s, s, s])
-        obj.calculate_matrix()
+    def add_events(self, key, catalog, glyph_types, colors):
+        """Добавляет каталог событий файла в общие буферы экземпляров глифов"""
+        self.remove_events(key)
 
-        self.objects[obj.id] = obj
-        print(f"✅ Точка с прозрачностью {base_color[3]} добавлена с ID: {obj.id}")
-        return obj
+        event_set = EventGlyphSet(self.glyphs, catalog)
+        event_set.restyle(glyph_types, colors)
+        self.event_sets[key] = event_set
+        self.request_update()
 
-    def add_object_point(self, x, y, z, event_type, energy, custom_color=None):
-        """Добавляет событие в виде точки"""
-        print(f"Добавление точки: X={x}, Y={y}, Z={z}")
-
-        if custom_color is not None:
-            base_color = custom_color
-        else:
-            # Определяем цвет по энергии
-            if energy > 100000000000:
-                base_color = [1.0, 0.0, 0.0, 1.0]
-            elif energy > 1000000000:
-                base_color = [1.0, 0.5, 0.0, 1.0]
-            elif energy > 100000000:
-                base_color = [1.0, 1.0, 0.0, 1.0]
-            elif energy > 1000000:
-                base_color = [0.0, 1.0, 0.0, 1.0]
-            elif energy > 1000:
-                base_color = [0.0, 0.0, 1.0, 1.0]
-            else:
-                base_color = [0.5, 0.5, 0.5, 1.0]
-
-        obj = create_point(base_color)
-        obj.location = np.array([x, y, z])
-        obj.obj_type = "event"
-        obj.data["type"] = event_type
-        obj.data["energy"] = energy
-        obj.data["visualization"] = "point"  # Сохраняем тип визуализации
-
-        # Фиксированный маленький размер для точек
-        s = 5.0  # Все точки одинакового маленького размера
-
-        obj.scale = np.array([s, s, s])
-        obj.calculate_matrix()
+        print(f"Добавлено событий: {len(event_set)} (наборов событий в сцене: {len(self.event_sets)})")
+        return event_set
 
-        self.objects[obj.id] = obj
-        print(f"Точка добавлена с ID: {obj.id}")
-        return obj
+    def remove_events(self, key):
+        if self.hovered is not None and self.hovered[:2] == ('event', key):
+            self.set_hovered(None)
+        event_set = self.event_sets.pop(key, None)
+        if event_set is not None:
+            event_set.release()
+            self.request_update()
 
     def _init_geometry(self, filepath):
         obj1 = create_dxf_object(filepath, False)
@@ -533,35 +493,44 @@ class GLWidget(QtOpenGL.QGLWidget):
 
         self.objects = {obj1.id : obj1,
                         obj2.id : obj2,}
+        self.renderLists.invalidate()
 
         self.viewTarget = obj1
 
     def set_perspective_top(self):
         self.rotX = 0.0
         self.rotY = self.ROT_Y_MIN
+        self.request_update()
 
     def set_perspective_side(self, side=0):
         self.rotX = math.pi * side / 2
         self.rotY = math.pi / 2
+        self.request_update()
 
     def set_perspective_bottom(self):
         self.rotX = 0.0
         self.rotY = self.ROT_Y_MAX
+        self.request_update()
 
     def setRotX(self, val):
         self.rotX = math.pi * (val / 180)
+        self.request_update()
 
     def setRotY(self, val):
         self.rotY = math.pi * (val / 360)
+        self.request_update()
 
     def addRotX(self, val):
         self.rotX += math.pi * (val / self.SENSITIVITY_X)
+        self.request_update()
 
     def addRotY(self, val):
         self.rotY = max(self.ROT_Y_MIN, min(self.ROT_Y_MAX, self.rotY - math.pi * (val / self.SENSITIVITY_Y)))
+        self.request_update()
 
     def setArm(self, val):
         self.armLength = 20 + val
+        self.request_update()
 
 if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
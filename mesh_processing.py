@@ -0,0 +1,482 @@
+import numpy as np
+
+# Обработка сеток DXF после загрузки: сварка совпадающих вершин, удаление вырожденных
+# и повторяющихся граней, удаление повторяющихся ребер, нормали вершин, характерные ребра, упрощенные
+# уровни детализации, деление на тайлы.
+# Слои: у каждого треугольника и ребра есть номер слоя DXF; в готовых буферах индексов примитивы
+# отсортированы по слоям, и каждому слою соответствует непрерывный диапазон индексов (layer_ranges).
+# Полилинии хранятся отдельно от ребер - ломаными (GL_LINE_STRIP) в одном буфере индексов, после каждой
+# ломаной стоит индекс перезапуска примитива (наибольшее значение типа индексов, restart_index).
+
+# шаг сетки квантования координат при сварке (в единицах модели)
+WELD_TOLERANCE = 1e-3
+
+# грани с площадью меньше этой считаются вырожденными
+MIN_FACE_AREA = 1e-12
+
+# индексы uint16 возможны, пока вершин меньше 0xFFFF (значение 0xFFFF оставляем под перезапуск примитива)
+MAX_UINT16_VERTICES = 0xFFFF
+
+# угол между нормалями соседних граней (в градусах), начиная с которого общее ребро считается изломом
+FEATURE_CREASE_ANGLE = 30.0
+
+# уровни детализации: число ячеек кластеризации вдоль наибольшей стороны модели (от подробного к грубому)
+LOD_GRID_CELLS = (512, 128, 32)
+# уровень сохраняется, только если треугольников в нем не больше этой доли от предыдущего
+LOD_MIN_REDUCTION = 0.6
+
+# примерное число треугольников в тайле; сетки меньше делятся на тайлы не будут
+TILE_TRIANGLES = 32768
+
+# квантование позиций в uint16 по рамке сетки: допустимая ошибка (в единицах модели),
+# при большей ошибке позиции остаются float32
+QUANTIZE_MAX_ERROR = 0.005
+QUANTIZE_LEVELS = 0xFFFF
+
+
+def index_dtype(vertex_count):
+    """Наименьший тип индексов для заданного числа вершин"""
+    return np.uint16 if vertex_count < MAX_UINT16_VERTICES else np.uint32
+
+
+def restart_index(dtype):
+    """Индекс перезапуска примитива для типа индексов uint16/uint32"""
+    return np.iinfo(dtype).max
+
+
+def _strip_elements(strips):
+    """Ломаные с перезапусками -> (вершины всех ломаных подряд, номер ломаной каждой вершины)"""
+    strips = np.asarray(strips).reshape(-1)
+    if strips.dtype not in (np.uint16, np.uint32):
+        strips = strips.astype(np.uint32)
+    restart = strips == restart_index(strips.dtype)
+    strip_id = np.cumsum(restart) - restart
+    return strips[~restart].astype(np.int64), strip_id[~restart]
+
+
+def pack_strips(elements, strip_id, dtype=np.uint32):
+    """Вершины ломаных и номера ломаных (сгруппированы) -> индексы с перезапуском после каждой ломаной"""
+    elements = np.asarray(elements, dtype=np.int64).reshape(-1)
+    if len(elements) == 0:
+        return np.zeros(0, dtype=dtype)
+    last = np.r_[strip_id[1:] != strip_id[:-1], True]
+    packed = np.full(len(elements) + int(last.sum()), restart_index(dtype), dtype=dtype)
+    # позиция вершины сдвигается на число перезапусков перед ней
+    packed[np.arange(len(elements)) + np.cumsum(last) - last] = elements
+    return packed
+
+
+def chain_strip(n, closed=False):
+    """Индексы ломаной из n точек с перезапуском в конце (замкнутая повторяет первую точку), uint32"""
+    if n < 2:
+        return np.zeros(0, dtype=np.uint32)
+    chain = np.arange(n + (1 if closed and n > 2 else 0)) % n
+    return np.append(chain, restart_index(np.uint32)).astype(np.uint32)
+
+
+def offset_strips(strips, offset):
+    """Сдвиг индексов ломаных на offset (перезапуски остаются), uint32; offset может быть массивом"""
+    strips = np.asarray(strips, dtype=np.uint32)
+    restart = restart_index(np.uint32)
+    return np.where(strips == restart, restart, strips + np.asarray(offset, dtype=np.uint32)).astype(np.uint32)
+
+
+def clean_strips(strips, remap=None, dtype=np.uint32, return_index=False):
+    """Ломаные после сварки: вершины через remap, без повторов подряд и без ломаных короче двух вершин.
+
+    return_index - вернуть также номера оставленных ломаных во входном массиве.
+    """
+    elements, strip_id = _strip_elements(strips)
+    if remap is not None and len(elements):
+        elements = remap[elements]
+    if len(elements):
+        keep = np.r_[True, (elements[1:] != elements[:-1]) | (strip_id[1:] != strip_id[:-1])]
+        elements, strip_id = elements[keep], strip_id[keep]
+    kept, counts = np.unique(strip_id, return_counts=True)
+    kept = kept[counts >= 2]
+    mask = np.isin(strip_id, kept)
+    packed = pack_strips(elements[mask], strip_id[mask], dtype)
+    return (packed, kept) if return_index else packed
+
+
+def strip_ranges(strips, layers, layer_count):
+    """Сортирует ломаные по слоям без смены порядка внутри слоя (как layer_ranges для примитивов).
+
+    Возвращает (индексы, границы слоев в индексах, с учетом перезапусков).
+    """
+    strips = np.asarray(strips).reshape(-1)
+    layers = np.asarray(layers, dtype=np.int64).reshape(-1)
+    elements, strip_id = _strip_elements(strips)
+    order = np.argsort(layers, kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    new_id = rank[strip_id]
+    gather = np.argsort(new_id, kind='stable')
+    dtype = strips.dtype if strips.dtype in (np.uint16, np.uint32) else np.uint32
+    sorted_strips = pack_strips(elements[gather], new_id[gather], dtype)
+
+    sizes = np.bincount(strip_id, minlength=len(layers))[order] + 1
+    offsets = np.r_[0, np.cumsum(sizes)]
+    bounds = offsets[np.searchsorted(layers[order], np.arange(layer_count + 1))]
+    return sorted_strips, bounds.astype(np.int64)
+
+
+def weld_vertices(vertices, tolerance=WELD_TOLERANCE, average=False):
+    """Объединяет вершины, попавшие в одну ячейку сетки квантования.
+
+    average - ставить вершину в среднее ячейки (кластеризация), иначе берется первая вершина ячейки.
+    Возвращает (новые вершины, отображение старый индекс -> новый).
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if len(vertices) == 0:
+        return vertices, np.zeros(0, dtype=np.int64)
+
+    origin = vertices.min(axis=0).astype(np.float64)
+    cells = np.round((vertices - origin) / tolerance).astype(np.int64)
+
+    # уникальность по сортировке строк; первая встреченная вершина ячейки - представитель
+    _, first, remap = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    remap = remap.reshape(-1)
+    if not average:
+        return vertices[first], remap
+
+    counts = np.bincount(remap, minlength=len(first)).astype(np.float64)
+    welded = np.column_stack([np.bincount(remap, weights=vertices[:, axis], minlength=len(first))
+                              for axis in range(3)]) / counts[:, None]
+    return welded.astype(np.float32), remap
+
+
+def clean_triangles(vertices, triangles, return_index=False):
+    """Удаляет треугольники с совпадающими вершинами, нулевой площадью и повторы (в любом обходе).
+
+    return_index - вернуть также номера оставленных треугольников во входном массиве.
+    """
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return (triangles, np.zeros(0, dtype=np.int64)) if return_index else triangles
+
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    keep = (a != b) & (b != c) & (a != c)
+
+    p = vertices.astype(np.float64)
+    area2 = np.linalg.norm(np.cross(p[b] - p[a], p[c] - p[a]), axis=1)
+    keep &= area2 > 2 * MIN_FACE_AREA
+    kept = np.flatnonzero(keep)
+
+    # одинаковые наборы вершин - одна и та же грань, оставляем первую
+    _, first = np.unique(np.sort(triangles[kept], axis=1), axis=0, return_index=True)
+    kept = kept[np.sort(first)]
+    return (triangles[kept], kept) if return_index else triangles[kept]
+
+
+def unique_edges(edges, return_index=False):
+    """Неориентированные ребра без повторов и петель.
+
+    return_index - вернуть также номер первого вхождения каждого ребра во входном массиве.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    kept = np.flatnonzero(edges[:, 0] != edges[:, 1])
+    if len(kept) == 0:
+        return (edges[kept], kept) if return_index else edges[kept]
+    unique, first = np.unique(np.sort(edges[kept], axis=1), axis=0, return_index=True)
+    return (unique, kept[first]) if return_index else unique
+
+
+def layer_ranges(indices, layers, width, layer_count):
+    """Сортирует примитивы (по width индексов) по слоям без смены порядка внутри слоя.
+
+    Возвращает (индексы, границы): примитивы слоя i занимают индексы с границы[i] по границы[i + 1].
+    """
+    primitives = np.asarray(indices).reshape(-1, width)
+    layers = np.asarray(layers, dtype=np.int64).reshape(-1)
+    order = np.argsort(layers, kind='stable')
+    bounds = np.searchsorted(layers[order], np.arange(layer_count + 1)) * width
+    return primitives[order].reshape(-1), bounds.astype(np.int64)
+
+
+def weld_mesh(vertices, triangles, edges, polylines=None, tolerance=WELD_TOLERANCE, average=False,
+              return_index=False):
+    """Сварка сетки: (вершины, треугольники, ребра) -> то же после очистки, индексы uint16/uint32.
+
+    polylines - ломаные с перезапусками; если заданы, после ребер возвращаются и они.
+    return_index - вернуть также номера оставленных треугольников, ребер (и ломаных) во входных массивах.
+    """
+    vertices, remap = weld_vertices(vertices, tolerance, average)
+
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1)
+    triangles, face_index = clean_triangles(vertices, remap[triangles] if len(triangles) else triangles,
+                                            return_index=True)
+    edges, edge_index = unique_edges(remap[edges] if len(edges) else edges, return_index=True)
+
+    dtype = index_dtype(len(vertices))
+    welded = (vertices, triangles.reshape(-1).astype(dtype), edges.reshape(-1).astype(dtype))
+    index = (face_index, edge_index)
+    if polylines is not None:
+        polylines, polyline_index = clean_strips(polylines, remap, dtype, return_index=True)
+        welded += (polylines,)
+        index += (polyline_index,)
+    return welded + index if return_index else welded
+
+
+def vertex_normals(vertices, triangles):
+    """Нормали вершин - сумма нормалей прилежащих граней с весом по площади.
+
+    Обход граней в DXF произвольный, поэтому нормаль каждой грани разворачивается вверх (+Y).
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    normals = np.zeros((len(vertices), 3))
+    if len(triangles):
+        faces = np.cross(vertices[triangles[:, 1]] - vertices[triangles[:, 0]],
+                         vertices[triangles[:, 2]] - vertices[triangles[:, 0]])
+        faces[faces[:, 1] < 0] *= -1
+        corners = triangles.reshape(-1)
+        normals = np.column_stack([np.bincount(corners, weights=np.repeat(faces[:, axis], 3),
+                                               minlength=len(vertices)) for axis in range(3)])
+
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.where(length > 0, normals / np.maximum(length, 1e-30), [0.0, 1.0, 0.0])
+    return normals.astype(np.float32)
+
+
+def quantize_positions(vertices, max_error=QUANTIZE_MAX_ERROR):
+    """Позиции -> (uint16 n x 3, смещение, шаг) по рамке вершин или None, если ошибка больше max_error.
+
+    Вершина восстанавливается как смещение + значение * шаг.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return None
+    low = vertices.min(axis=0)
+    step = (vertices.max(axis=0) - low) / QUANTIZE_LEVELS
+    # ошибка округления - половина шага
+    if step.max() / 2 > max_error:
+        return None
+    step = np.where(step > 0, step, 1.0)
+    return np.round((vertices - low) / step).astype(np.uint16), low, step
+
+
+def quantize_normals(normals):
+    """Нормали -> int8 (n x 4, четвертый байт - выравнивание вершины до 4 байт), читаются как нормализованные"""
+    normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+    packed = np.zeros((len(normals), 4), dtype=np.int8)
+    packed[:, :3] = np.round(np.clip(normals, -1.0, 1.0) * 127)
+    return packed
+
+
+def _triangle_edges(triangles):
+    """Ребра треугольников (по три на треугольник, вершины по возрастанию) и номер треугольника каждого ребра"""
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    return edges, np.repeat(np.arange(len(triangles)), 3)
+
+
+def polyline_mask(triangles, edges):
+    """Маска ребер, которые не являются сторонами треугольников (линии и полилинии модели)"""
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    if len(edges) == 0 or len(triangles) == 0:
+        return np.ones(len(edges), dtype=bool)
+    face_edges, _ = _triangle_edges(triangles)
+    # пара вершин -> одно число для сравнения наборов ребер
+    limit = max(int(edges.max()), int(face_edges.max())) + 1
+    return ~np.isin(edges[:, 0] * limit + edges[:, 1], face_edges[:, 0] * limit + face_edges[:, 1])
+
+
+def feature_edges(vertices, triangles, polylines, crease_angle=FEATURE_CREASE_ANGLE, face_layers=None,
+                  polyline_layers=None):
+    """Характерные ребра: границы поверхности, изломы с углом больше crease_angle и полилинии.
+
+    Возвращает индексы ребер (по 2 на ребро) в типе index_dtype. Если заданы слои треугольников и полилиний,
+    возвращает также слой каждого ребра (у границ и изломов - слой одного из прилежащих треугольников).
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    polylines = np.asarray(polylines, dtype=np.int64).reshape(-1, 2)
+    with_layers = face_layers is not None
+    if with_layers:
+        face_layers = np.asarray(face_layers, dtype=np.int64).reshape(-1)
+        polyline_layers = np.asarray(polyline_layers, dtype=np.int64).reshape(-1)
+
+    features = [polylines]
+    layers = [polyline_layers] if with_layers else []
+    if len(triangles):
+        edges, owner = _triangle_edges(triangles)
+        normals = np.cross(vertices[triangles[:, 1]] - vertices[triangles[:, 0]],
+                           vertices[triangles[:, 2]] - vertices[triangles[:, 0]])
+        normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-30)
+
+        # одинаковые ребра соседних треугольников оказываются рядом после сортировки
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        edges, owner = edges[order], owner[order]
+        starts = np.flatnonzero(np.r_[True, (edges[1:] != edges[:-1]).any(axis=1)])
+        counts = np.diff(np.r_[starts, len(edges)])
+
+        # граница - ребро одного треугольника, неманифолдное ребро (больше двух) тоже оставляем
+        keep = counts != 2
+        pairs = counts == 2
+        first, second = owner[starts[pairs]], owner[starts[pairs] + 1]
+        cosine = np.einsum('ij,ij->i', normals[first], normals[second])
+        keep[pairs] = cosine < np.cos(np.radians(crease_angle))
+        features.append(edges[starts[keep]])
+        if with_layers:
+            layers.append(face_layers[owner[starts[keep]]])
+
+    result, first = unique_edges(np.concatenate(features), return_index=True)
+    result = result.reshape(-1).astype(index_dtype(len(vertices)))
+    return (result, np.concatenate(layers)[first]) if with_layers else result
+
+
+def build_lods(vertices, triangles, edges, polylines=None, grid_cells=LOD_GRID_CELLS,
+               crease_angle=FEATURE_CREASE_ANGLE, face_layers=None, edge_layers=None, layer_count=1,
+               strips=None, strip_layers=None):
+    """Упрощенные уровни сетки кластеризацией вершин.
+
+    polylines - маска ребер-полилиний (polyline_mask); face_layers и edge_layers - слои треугольников и ребер
+    (по умолчанию все в слое 0); strips и strip_layers - ломаные с перезапусками и их слои.
+    Возвращает список словарей {'cell', 'vertices', 'normals', 'faces', 'edges', 'feature_edges', 'polylines',
+    'face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges'} от подробного к грубому; cell - размер
+    ячейки (ошибка уровня в единицах модели), *_ranges - границы слоев в индексах (layer_ranges).
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if len(vertices) == 0 or len(triangles) == 0:
+        return []
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1)
+    face_layers = (np.zeros(len(triangles) // 3, dtype=np.int64) if face_layers is None
+                   else np.asarray(face_layers, dtype=np.int64))
+    edge_layers = (np.zeros(len(edges) // 2, dtype=np.int64) if edge_layers is None
+                   else np.asarray(edge_layers, dtype=np.int64))
+    polylines = np.zeros(len(edges) // 2, dtype=bool) if polylines is None else np.asarray(polylines, dtype=bool)
+    strips = np.zeros(0, dtype=np.uint32) if strips is None else np.asarray(strips)
+    if strip_layers is None:
+        _, strip_id = _strip_elements(strips)
+        strip_layers = np.zeros(int(strip_id[-1]) + 1 if len(strip_id) else 0, dtype=np.int64)
+    strip_layers = np.asarray(strip_layers, dtype=np.int64)
+
+    extent = float((vertices.max(axis=0) - vertices.min(axis=0)).max())
+    if extent <= 0:
+        return []
+
+    lods = []
+    previous = len(triangles) // 3
+    for cells in grid_cells:
+        cell = extent / cells
+        lod_vertices, remap = weld_vertices(vertices, cell, average=True)
+        lod_faces, face_index = clean_triangles(lod_vertices, remap[np.asarray(triangles, dtype=np.int64).reshape(-1)],
+                                                return_index=True)
+        count = len(lod_faces)
+        if count == 0 or count > previous * LOD_MIN_REDUCTION:
+            continue
+
+        dtype = index_dtype(len(lod_vertices))
+        lod_edges, edge_index = unique_edges(remap[edges] if len(edges) else edges, return_index=True)
+        lod_face_layers = face_layers[face_index]
+        lod_edge_layers = edge_layers[edge_index]
+        lod_polylines = polylines[edge_index]
+        lod_features, feature_layers = feature_edges(lod_vertices, lod_faces, lod_edges[lod_polylines], crease_angle,
+                                                     lod_face_layers, lod_edge_layers[lod_polylines])
+
+        lod = {'cell': cell, 'vertices': lod_vertices, 'normals': vertex_normals(lod_vertices, lod_faces)}
+        lod['faces'], lod['face_ranges'] = layer_ranges(lod_faces.astype(dtype), lod_face_layers, 3, layer_count)
+        lod['edges'], lod['edge_ranges'] = layer_ranges(lod_edges.astype(dtype), lod_edge_layers, 2, layer_count)
+        lod['feature_edges'], lod['feature_ranges'] = layer_ranges(lod_features, feature_layers, 2, layer_count)
+        lod_strips, strip_index = clean_strips(strips, remap, dtype, return_index=True)
+        lod['polylines'], lod['polyline_ranges'] = strip_ranges(lod_strips, strip_layers[strip_index], layer_count)
+        lods.append(lod)
+        previous = count
+    return lods
+
+
+def split_tiles(vertices, triangles, edges, features=None, normals=None, tile_triangles=TILE_TRIANGLES,
+                face_layers=None, edge_layers=None, feature_layers=None, layer_count=1, polylines=None,
+                polyline_layers=None):
+    """Делит сетку на квадратные тайлы в плане (X, Z сцены) по центрам треугольников, ребер и ломаных.
+
+    Ломаная (polylines - с перезапусками) целиком попадает в тайл своего центра.
+    У каждого тайла свои вершины (и нормали) и локальные индексы uint32, отсортированные по слоям.
+    Возвращает список словарей {'min', 'max', 'vertices', 'normals', 'faces', 'edges', 'feature_edges',
+    'polylines', 'face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges'} или пустой список,
+    если сетка мала.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    features = np.asarray(features if features is not None else [], dtype=np.int64).reshape(-1, 2)
+    if len(triangles) <= tile_triangles:
+        return []
+
+    def layers_of(layers, count):
+        return np.zeros(count, dtype=np.int64) if layers is None else np.asarray(layers, dtype=np.int64)
+
+    face_layers = layers_of(face_layers, len(triangles))
+    edge_layers = layers_of(edge_layers, len(edges))
+    feature_layers = layers_of(feature_layers, len(features))
+    strip_elements, strip_id = _strip_elements(polylines if polylines is not None else np.zeros(0, np.uint32))
+    strip_count = int(strip_id[-1]) + 1 if len(strip_id) else 0
+    polyline_layers = layers_of(polyline_layers, strip_count)
+
+    side = int(np.ceil(np.sqrt(len(triangles) / tile_triangles)))
+    plan = vertices[:, [0, 2]].astype(np.float64)
+    low = plan.min(axis=0)
+    extent = max(float((plan.max(axis=0) - low).max()), 1e-9)
+
+    def cell_of(centers):
+        q = np.clip(((centers - low) / extent * side).astype(np.int64), 0, side - 1)
+        return q[:, 0] * side + q[:, 1]
+
+    def group(cells):
+        order = np.argsort(cells, kind='stable')
+        return order, np.searchsorted(cells[order], np.arange(side * side + 1))
+
+    def edge_groups(edges):
+        return group(cell_of(plan[edges].mean(axis=1)) if len(edges) else np.zeros(0, np.int64))
+
+    face_order, face_bounds = group(cell_of(plan[triangles].mean(axis=1)))
+    edge_order, edge_bounds = edge_groups(edges)
+    feature_order, feature_bounds = edge_groups(features)
+    strip_lengths = np.bincount(strip_id, minlength=strip_count)
+    strip_centers = np.column_stack([np.bincount(strip_id, weights=plan[strip_elements, axis], minlength=strip_count)
+                                     for axis in range(2)]) / np.maximum(strip_lengths, 1)[:, None]
+    strip_cells = cell_of(strip_centers) if strip_count else np.zeros(0, np.int64)
+    strip_order, strip_bounds = group(strip_cells)
+    # элементы ломаных - по тайлу своей ломаной (стабильная сортировка сохраняет порядок точек и ломаных)
+    element_order, element_bounds = group(strip_cells[strip_id])
+
+    tiles = []
+    for cell in range(side * side):
+        face_members = face_order[face_bounds[cell]:face_bounds[cell + 1]]
+        edge_members = edge_order[edge_bounds[cell]:edge_bounds[cell + 1]]
+        feature_members = feature_order[feature_bounds[cell]:feature_bounds[cell + 1]]
+        strip_members = strip_order[strip_bounds[cell]:strip_bounds[cell + 1]]
+        faces, tile_edges, tile_features = triangles[face_members], edges[edge_members], features[feature_members]
+        element_members = element_order[element_bounds[cell]:element_bounds[cell + 1]]
+        tile_strips, tile_strip_id = strip_elements[element_members], strip_id[element_members]
+        if len(faces) == 0 and len(tile_edges) == 0 and len(tile_features) == 0 and len(tile_strips) == 0:
+            continue
+
+        # вершины на границе тайлов повторяются в соседних тайлах
+        used = np.unique(np.concatenate([faces.reshape(-1), tile_edges.reshape(-1), tile_features.reshape(-1),
+                                         tile_strips]))
+        tile_vertices = vertices[used]
+        tile = {
+            'min': tile_vertices.min(axis=0),
+            'max': tile_vertices.max(axis=0),
+            'vertices': tile_vertices,
+            # нормали общие с соседними тайлами - без швов освещения на границах
+            'normals': normals[used] if normals is not None else vertex_normals(tile_vertices, []),
+        }
+        tile['faces'], tile['face_ranges'] = layer_ranges(
+            np.searchsorted(used, faces.reshape(-1)).astype(np.uint32), face_layers[face_members], 3, layer_count)
+        tile['edges'], tile['edge_ranges'] = layer_ranges(
+            np.searchsorted(used, tile_edges.reshape(-1)).astype(np.uint32), edge_layers[edge_members], 2,
+            layer_count)
+        tile['feature_edges'], tile['feature_ranges'] = layer_ranges(
+            np.searchsorted(used, tile_features.reshape(-1)).astype(np.uint32), feature_layers[feature_members], 2,
+            layer_count)
+        # ломаные - в порядке номеров, их слои - в том же порядке
+        tile['polylines'], tile['polyline_ranges'] = strip_ranges(
+            pack_strips(np.searchsorted(used, tile_strips), tile_strip_id), polyline_layers[np.sort(strip_members)],
+            layer_count)
+        tiles.append(tile)
+    return tiles
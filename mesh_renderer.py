@@ -0,0 +1,352 @@
+import ctypes
+
+import numpy as np
+import OpenGL.GL as gl
+
+from mesh_processing import restart_index
+from shaders import compile_program, uniform_location
+from transparency import OIT_FRAGMENT_OUTPUT
+
+# Отрисовка сеток объектов сцены (DXF, детекторы) в core profile:
+# VAO на грани и на ребра, индексы в буферах элементов, матрица модели из SceneObject.matrix.
+# Вершины хранятся относительно начала координат набора данных (оно - в матрице модели), произведение
+# проекция * вид * модель считается в double и только потом переводится во float32 - без дрожания
+# при больших рудничных координатах. Позиции могут быть квантованы в uint16 (ObjectMesh.positionOffset/Step),
+# нормали - в int8; восстанавливаются в вершинном шейдере.
+# Поверхности DXF не хранят цветов вершин: освещение, раскраска по высоте и подсветка уступов и
+# откосов считаются в шейдере по нормалям и задаются uniform-переменными (SurfaceStyle).
+# Слои DXF - диапазоны общих буферов индексов: видимые слои рисуются glDrawElements со смещением,
+# соседние слои одного цвета - одним вызовом.
+# Линии и полилинии DXF - ломаные в одном буфере индексов, разделенные индексом перезапуска примитива:
+# все ломаные слоя рисуются одним вызовом GL_LINE_STRIP.
+
+MESH_VERTEX_SHADER = """
+#version 330 core
+
+layout(location = 0) in vec3 a_position;
+layout(location = 1) in vec4 a_color;
+layout(location = 2) in vec3 a_normal;
+
+uniform mat4 u_model_view_projection;
+uniform mat4 u_model;
+// квантованные позиции: вершина = u_position_offset + a_position * u_position_step
+uniform vec3 u_position_offset;
+uniform vec3 u_position_step;
+
+out vec4 v_color;
+out vec3 v_normal;
+out float v_height;
+
+void main() {
+    vec3 position = u_position_offset + a_position * u_position_step;
+    v_color = a_color;
+    v_normal = mat3(u_model) * a_normal;
+    v_height = position.y;
+    gl_Position = u_model_view_projection * vec4(position, 1.0);
+}
+"""
+
+MESH_FRAGMENT_SHADER = """
+#version 330 core
+
+in vec4 v_color;
+in vec3 v_normal;
+in float v_height;
+
+// проход идентификаторов: вместо цвета вершин - цвет номера объекта
+uniform int u_pick;
+uniform vec4 u_pick_color;
+
+// 0 - цвета вершин, 1 - один цвет u_color (ребра), 2 - освещенная поверхность
+uniform int u_color_mode;
+uniform vec4 u_color;
+
+uniform vec3 u_light_direction;
+uniform int u_elevation_ramp;
+uniform vec2 u_elevation_range;
+uniform vec3 u_ramp_low;
+uniform vec3 u_ramp_high;
+uniform int u_slope_highlight;
+uniform float u_slope_cos;
+uniform vec3 u_slope_color;
+uniform float u_bench_cos;
+uniform vec3 u_bench_color;
+""" + OIT_FRAGMENT_OUTPUT + """
+vec4 surface_color() {
+    vec3 n = normalize(v_normal);
+    vec3 color = u_color.rgb;
+
+    if (u_elevation_ramp == 1) {
+        float t = clamp((v_height - u_elevation_range.x) / max(u_elevation_range.y - u_elevation_range.x, 1e-6),
+                        0.0, 1.0);
+        color = mix(u_ramp_low, u_ramp_high, t);
+    }
+    if (u_slope_highlight == 1) {
+        // |n.y| - косинус угла наклона грани к горизонту
+        float up = abs(n.y);
+        if (up < u_slope_cos) {
+            color = mix(color, u_slope_color, 0.6);
+        } else if (up > u_bench_cos) {
+            color = mix(color, u_bench_color, 0.6);
+        }
+    }
+
+    // нормали ориентированы вверх, свет считаем с двух сторон
+    float diffuse = abs(dot(n, u_light_direction));
+    return vec4(color * (0.35 + 0.65 * diffuse), u_color.a);
+}
+
+void main() {
+    if (u_pick == 1) {
+        write_color(u_pick_color);
+    } else if (u_color_mode == 2) {
+        write_color(surface_color());
+    } else if (u_color_mode == 1) {
+        write_color(u_color);
+    } else {
+        write_color(v_color);
+    }
+}
+"""
+
+MESH_ATTRIBUTES = {
+    'a_position': 0,
+    'a_color': 1,
+    'a_normal': 2,
+}
+
+COLOR_MODE_VERTEX = 0
+COLOR_MODE_UNIFORM = 1
+COLOR_MODE_SURFACE = 2
+
+
+def gl_index_type(indices):
+    """Тип индексов для glDrawElements по dtype массива"""
+    return gl.GL_UNSIGNED_SHORT if indices.dtype == np.uint16 else gl.GL_UNSIGNED_INT
+
+
+def gl_matrix(matrix):
+    """Матрица glm или numpy -> float32 в строчной записи для glUniformMatrix4fv(transpose=GL_TRUE)"""
+    return np.ascontiguousarray(np.array(matrix, dtype=np.float32))
+
+
+# тип компонент вершинного атрибута по dtype массива: (тип GL, нормализация)
+ATTRIBUTE_TYPES = {
+    np.dtype(np.float32): (gl.GL_FLOAT, gl.GL_FALSE),
+    np.dtype(np.uint16): (gl.GL_UNSIGNED_SHORT, gl.GL_FALSE),
+    np.dtype(np.int8): (gl.GL_BYTE, gl.GL_TRUE),
+}
+
+
+def _vertex_attribute(location, buffer, stride):
+    """Указатель атрибута из 3 компонент на буфер VBO (тип компонент - по его данным)"""
+    data_type, normalized = ATTRIBUTE_TYPES[np.dtype(buffer.data.dtype)]
+    buffer.bind()
+    gl.glEnableVertexAttribArray(location)
+    gl.glVertexAttribPointer(location, 3, data_type, normalized, stride, ctypes.c_void_p(0))
+
+
+class SurfaceStyle:
+    """Освещение и раскраска поверхности. Смена стиля - только новые значения uniform, без буферов"""
+    def __init__(self, base_color=(0.3, 0.3, 0.3, 1.0), elevation_range=(0.0, 1.0)):
+        self.base_color = tuple(base_color)
+        self.light_direction = (0.3, 1.0, 0.5)
+
+        # раскраска по высоте (Y модели) от ramp_low до ramp_high
+        self.elevation_ramp = False
+        self.elevation_range = tuple(elevation_range)
+        self.ramp_low = (0.15, 0.35, 0.7)
+        self.ramp_high = (0.85, 0.55, 0.25)
+
+        # подсветка откосов (круче slope_angle градусов) и уступов (положе bench_angle)
+        self.slope_highlight = False
+        self.slope_angle = 45.0
+        self.slope_color = (0.85, 0.2, 0.15)
+        self.bench_angle = 10.0
+        self.bench_color = (0.2, 0.75, 0.3)
+
+    def update(self, **values):
+        for name, value in values.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"Неизвестный параметр стиля поверхности: {name}")
+            setattr(self, name, value)
+
+
+class MeshRenderer:
+    def __init__(self):
+        self.program = None
+        # стиль, чьи uniform уже заданы в текущем begin/end
+        self._style = None
+        # проекция * вид текущего прохода (double)
+        self._view_projection = None
+
+    def _ensure_program(self):
+        if self.program is None:
+            self.program = compile_program(MESH_VERTEX_SHADER, MESH_FRAGMENT_SHADER, MESH_ATTRIBUTES)
+
+    def _create_vao(self, mesh, indices):
+        vao = gl.glGenVertexArrays(1)
+        gl.glBindVertexArray(vao)
+
+        # позиции float32 или uint16 по 3 компоненты; квантованные нормали int8 выровнены до 4 байт
+        _vertex_attribute(MESH_ATTRIBUTES['a_position'], mesh.verticesVBO, 0)
+        if mesh.normalsVBO is not None:
+            stride = 4 if mesh.normalsVBO.data.dtype == np.int8 else 0
+            _vertex_attribute(MESH_ATTRIBUTES['a_normal'], mesh.normalsVBO, stride)
+
+        ebo = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ebo)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+
+        gl.glBindVertexArray(0)
+        mesh.verticesVBO.unbind()
+        return vao, ebo
+
+    def upload(self, mesh):
+        """Создает VAO и буферы индексов сетки (один раз)"""
+        if mesh.facesVAO is None and mesh.facesTriangles is not None and len(mesh.facesTriangles):
+            mesh.facesVAO, mesh.facesEBO = self._create_vao(mesh, mesh.facesTriangles)
+        if mesh.edgesVAO is None and mesh.edges is not None and len(mesh.edges):
+            mesh.edgesVAO, mesh.edgesEBO = self._create_vao(mesh, mesh.edges)
+        if mesh.featureEdgesVAO is None and mesh.featureEdges is not None and len(mesh.featureEdges):
+            mesh.featureEdgesVAO, mesh.featureEdgesEBO = self._create_vao(mesh, mesh.featureEdges)
+        if mesh.polylinesVAO is None and mesh.polylines is not None and len(mesh.polylines):
+            mesh.polylinesVAO, mesh.polylinesEBO = self._create_vao(mesh, mesh.polylines)
+
+    def _bind_colors(self, colorsVBO, size):
+        # указатель цвета задается при отрисовке: у одной сетки грани и ребра окрашиваются по-разному
+        colorsVBO.bind()
+        gl.glEnableVertexAttribArray(MESH_ATTRIBUTES['a_color'])
+        gl.glVertexAttribPointer(MESH_ATTRIBUTES['a_color'], size, gl.GL_FLOAT, gl.GL_FALSE, 0, ctypes.c_void_p(0))
+        colorsVBO.unbind()
+
+    @staticmethod
+    def layer_runs(ranges, appearance, count):
+        """Отрезки индексов для отрисовки: [(первый индекс, число индексов, цвет слоя или None)].
+
+        ranges - границы слоев в индексах (None - сетка без слоев, один отрезок на весь буфер).
+        """
+        if ranges is None or appearance.layerVisible is None:
+            return [(0, count, None)]
+        runs = []
+        for layer in np.flatnonzero(appearance.layerVisible):
+            start, stop = int(ranges[layer]), int(ranges[layer + 1])
+            if stop == start:
+                continue
+            color = appearance.layerColors[layer]
+            if runs and runs[-1][0] + runs[-1][1] == start and runs[-1][2] == color:
+                runs[-1] = (runs[-1][0], runs[-1][1] + stop - start, color)
+            else:
+                runs.append((start, stop - start, color))
+        return runs
+
+    def _draw_runs(self, mode, indices, runs, color_of=None):
+        """glDrawElements по отрезкам; color_of(цвет слоя) -> RGBA для u_color, None - не менять цвет"""
+        index_type = gl_index_type(indices)
+        size = indices.dtype.itemsize
+        for start, count, color in runs:
+            if color_of is not None:
+                gl.glUniform4f(uniform_location(self.program, "u_color"), *color_of(color))
+            gl.glDrawElements(mode, count, index_type, ctypes.c_void_p(start * size))
+
+    def begin(self, view_projection, pick=False, oit=False):
+        """oit - прозрачный проход в буферы TransparencyBuffer"""
+        self._ensure_program()
+        gl.glUseProgram(self.program)
+        self._view_projection = np.asarray(view_projection, dtype=np.float64)
+        gl.glUniform1i(uniform_location(self.program, "u_pick"), 1 if pick else 0)
+        gl.glUniform1i(uniform_location(self.program, "u_oit"), 1 if oit else 0)
+        self._style = None
+
+    def end(self):
+        gl.glBindVertexArray(0)
+        gl.glUseProgram(0)
+
+    def _apply_style(self, style):
+        if style is self._style:
+            return
+        program = self.program
+        light = np.asarray(style.light_direction, dtype=np.float64)
+        gl.glUniform3f(uniform_location(program, "u_light_direction"), *(light / np.linalg.norm(light)))
+        gl.glUniform1i(uniform_location(program, "u_elevation_ramp"), 1 if style.elevation_ramp else 0)
+        gl.glUniform2f(uniform_location(program, "u_elevation_range"), *style.elevation_range)
+        gl.glUniform3f(uniform_location(program, "u_ramp_low"), *style.ramp_low)
+        gl.glUniform3f(uniform_location(program, "u_ramp_high"), *style.ramp_high)
+        gl.glUniform1i(uniform_location(program, "u_slope_highlight"), 1 if style.slope_highlight else 0)
+        gl.glUniform1f(uniform_location(program, "u_slope_cos"), np.cos(np.radians(style.slope_angle)))
+        gl.glUniform3f(uniform_location(program, "u_slope_color"), *style.slope_color)
+        gl.glUniform1f(uniform_location(program, "u_bench_cos"), np.cos(np.radians(style.bench_angle)))
+        gl.glUniform3f(uniform_location(program, "u_bench_color"), *style.bench_color)
+        self._style = style
+
+    def draw(self, mesh, model, faces=True, edges=True, pick_color=None, all_edges=False, owner=None):
+        """Рисует сетку между begin/end. pick_color - RGBA байты для прохода идентификаторов.
+
+        all_edges - все ребра сетки; по умолчанию у сеток с характерными ребрами рисуются только они.
+        owner - сетка объекта, чьи стиль и подсветку берут уровень детализации или тайл.
+        """
+        appearance = owner if owner is not None else mesh
+        self.upload(mesh)
+        model = np.array(model, dtype=np.float64)
+        gl.glUniformMatrix4fv(uniform_location(self.program, "u_model_view_projection"), 1, gl.GL_TRUE,
+                              gl_matrix(self._view_projection @ model))
+        gl.glUniformMatrix4fv(uniform_location(self.program, "u_model"), 1, gl.GL_TRUE, gl_matrix(model))
+        gl.glUniform3f(uniform_location(self.program, "u_position_offset"), *mesh.positionOffset)
+        gl.glUniform3f(uniform_location(self.program, "u_position_step"), *mesh.positionStep)
+        if pick_color is not None:
+            gl.glUniform4f(uniform_location(self.program, "u_pick_color"), *(c / 255.0 for c in pick_color))
+
+        if faces and mesh.facesVAO is not None:
+            gl.glBindVertexArray(mesh.facesVAO)
+            color_of = None
+            if pick_color is None:
+                style = appearance.surfaceStyle
+                if style is not None and mesh.normalsVBO is not None:
+                    self._apply_style(style)
+                    gl.glUniform1i(uniform_location(self.program, "u_color_mode"), COLOR_MODE_SURFACE)
+                    base = style.base_color
+                    color_of = lambda color: base if color is None else (*color, base[3])
+                else:
+                    gl.glUniform1i(uniform_location(self.program, "u_color_mode"), COLOR_MODE_VERTEX)
+                    self._bind_colors(mesh.colorsFacesVBO, 4)
+            runs = self.layer_runs(mesh.faceRanges, appearance, len(mesh.facesTriangles))
+            self._draw_runs(gl.GL_TRIANGLES, mesh.facesTriangles, runs, color_of)
+
+        if all_edges or mesh.featureEdges is None:
+            edges_vao, edge_indices, edge_ranges = mesh.edgesVAO, mesh.edges, mesh.edgeRanges
+        else:
+            edges_vao, edge_indices, edge_ranges = mesh.featureEdgesVAO, mesh.featureEdges, mesh.featureRanges
+
+        if not edges or (edges_vao is None and mesh.polylinesVAO is None):
+            return
+        color_of = None
+        if pick_color is None:
+            gl.glUniform1i(uniform_location(self.program, "u_color_mode"), COLOR_MODE_UNIFORM)
+            if appearance.hovered:
+                color_of = lambda color: (*appearance.hoverColor, 1.0)
+            else:
+                color_of = lambda color: (*(appearance.edgeColor if color is None else color), 1.0)
+
+        if edges_vao is not None:
+            gl.glBindVertexArray(edges_vao)
+            runs = self.layer_runs(edge_ranges, appearance, len(edge_indices))
+            self._draw_runs(gl.GL_LINES, edge_indices, runs, color_of)
+
+        if mesh.polylinesVAO is not None:
+            gl.glBindVertexArray(mesh.polylinesVAO)
+            gl.glEnable(gl.GL_PRIMITIVE_RESTART)
+            gl.glPrimitiveRestartIndex(restart_index(mesh.polylines.dtype))
+            runs = self.layer_runs(mesh.polylineRanges, appearance, len(mesh.polylines))
+            self._draw_runs(gl.GL_LINE_STRIP, mesh.polylines, runs, color_of)
+            gl.glDisable(gl.GL_PRIMITIVE_RESTART)
+
+    def release(self, mesh):
+        """Удаляет VAO и буферы индексов сетки"""
+        for vao in (mesh.facesVAO, mesh.edgesVAO, mesh.featureEdgesVAO, mesh.polylinesVAO):
+            if vao is not None:
+                gl.glDeleteVertexArrays(1, [vao])
+        for ebo in (mesh.facesEBO, mesh.edgesEBO, mesh.featureEdgesEBO, mesh.polylinesEBO):
+            if ebo is not None:
+                gl.glDeleteBuffers(1, [ebo])
+        mesh.facesVAO = mesh.edgesVAO = mesh.featureEdgesVAO = mesh.polylinesVAO = None
+        mesh.facesEBO = mesh.edgesEBO = mesh.featureEdgesEBO = mesh.polylinesEBO = None
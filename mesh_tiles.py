@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from mesh_processing import index_dtype
+
+# Тайлы больших сеток DXF и их подкачка в память GPU.
+# Массивы тайлов лежат в дисковом кэше и открыты через mmap; VBO тайла создается, только когда тайл
+# попал в пирамиду видимости, и удаляется вытеснением давно не видимых тайлов при превышении бюджета.
+
+# бюджет памяти GPU под тайлы (байт)
+TILE_GPU_BUDGET = 512 * 1024 ** 2
+
+# сколько байт тайлов загружать в GPU за один кадр (остальные - в следующих кадрах)
+TILE_UPLOAD_PER_FRAME = 32 * 1024 ** 2
+
+# буферы ObjectMesh, которые создаются для тайла
+TILE_BUFFERS = ('verticesVBO', 'normalsVBO', 'colorsFacesVBO')
+
+
+class MeshTile:
+    def __init__(self, bounds_min, bounds_max, vertices, normals, faces, edges, feature_edges, polylines, factory,
+                 ranges=None):
+        self.pointBegin = np.asarray(bounds_min, dtype=np.float64)
+        self.pointEnd = np.asarray(bounds_max, dtype=np.float64)
+
+        # массивы (обычно mmap из кэша) - читаются с диска только при загрузке тайла
+        self.vertices = vertices
+        self.normals = normals
+        self.faces = faces
+        self.edges = edges
+        self.feature_edges = feature_edges
+        self.polylines = polylines
+        # границы слоев в индексах (граней, ребер, характерных ребер, ломаных) или None
+        self.ranges = ranges
+
+        # factory(tile) -> ObjectMesh; сетка существует, пока тайл загружен
+        self.factory = factory
+        self.mesh = None
+        self.nbytes = 0
+
+    def indices(self, name):
+        """Локальные индексы тайла в наименьшем подходящем типе (перезапуск uint32 переходит в перезапуск uint16)"""
+        indices = getattr(self, name)
+        return np.asarray(indices).astype(index_dtype(len(self.vertices)), copy=False)
+
+
+def _unique_buffers(mesh):
+    buffers = []
+    for name in TILE_BUFFERS:
+        buffer = getattr(mesh, name, None)
+        if buffer is not None and all(buffer is not other for other in buffers):
+            buffers.append(buffer)
+    return buffers
+
+
+class TilePager:
+    def __init__(self, renderer, budget=TILE_GPU_BUDGET, upload_per_frame=TILE_UPLOAD_PER_FRAME):
+        self.renderer = renderer
+        self.budget = budget
+        self.upload_per_frame = upload_per_frame
+
+        # загруженные тайлы в порядке последнего использования: тайл -> номер кадра
+        self.resident = OrderedDict()
+        self.bytes = 0
+
+        self.frame = 0
+        self.uploaded = 0
+        # в кадре не хватило лимита загрузки - нужен еще кадр
+        self.pending = False
+
+    def begin_frame(self):
+        self.frame += 1
+        self.uploaded = 0
+        self.pending = False
+
+    def acquire(self, tile):
+        """Сетка тайла для отрисовки или None, если тайл еще не загружен"""
+        if tile.mesh is None:
+            if self.uploaded >= self.upload_per_frame:
+                self.pending = True
+                return None
+            tile.mesh = tile.factory(tile)
+            tile.nbytes = sum(buffer.data.nbytes for buffer in _unique_buffers(tile.mesh))
+            tile.nbytes += tile.mesh.facesTriangles.nbytes if tile.mesh.facesTriangles is not None else 0
+            tile.nbytes += tile.mesh.edges.nbytes if tile.mesh.edges is not None else 0
+            tile.nbytes += tile.mesh.featureEdges.nbytes if tile.mesh.featureEdges is not None else 0
+            tile.nbytes += tile.mesh.polylines.nbytes if tile.mesh.polylines is not None else 0
+            self.uploaded += tile.nbytes
+            self.bytes += tile.nbytes
+
+        self.resident[tile] = self.frame
+        self.resident.move_to_end(tile)
+        return tile.mesh
+
+    def end_frame(self):
+        """Вытесняет давно не видимые тайлы, пока не уложимся в бюджет"""
+        while self.bytes > self.budget and self.resident:
+            tile, frame = next(iter(self.resident.items()))
+            if frame == self.frame:
+                # все оставшиеся тайлы нужны текущему кадру
+                break
+            self.evict(tile)
+
+    def evict(self, tile):
+        """Удаляет объекты GPU тайла (нужен текущий контекст OpenGL)"""
+        if tile.mesh is None:
+            return
+        self.renderer.release(tile.mesh)
+        for buffer in _unique_buffers(tile.mesh):
+            buffer.delete()
+        tile.mesh = None
+        self.bytes -= tile.nbytes
+        tile.nbytes = 0
+        self.resident.pop(tile, None)
+
+    def release(self, tiles):
+        for tile in tiles:
+            self.evict(tile)
@@ -8,27 +8,121 @@ from pyglm import glm
 import OpenGL.GL as gl
 
 from collisions import CollisionBox
-from object_meshes import ObjectMesh
+from dxf_stream import DEFAULT_LAYER, stream_dxf_vertices
+from geometry_cache import dxf_cache
+from mesh_processing import (FEATURE_CREASE_ANGLE, QUANTIZE_MAX_ERROR, build_lods, chain_strip, feature_edges,
+                             layer_ranges, offset_strips, polyline_mask, quantize_normals, quantize_positions,
+                             restart_index, split_tiles, strip_ranges, vertex_normals, weld_mesh)
+from mesh_renderer import SurfaceStyle
+from mesh_tiles import MeshTile
+from object_meshes import ObjectMesh, quads_to_triangles
 from scene_objects import SceneObject
 
-def load_dxf_vertices(file_path, scale=1.0, normalize=False):
+# шаг (в объектах DXF), с которым сообщаем прогресс загрузки
+DXF_PROGRESS_STEP = 1000
+
+def polyline_points(entity):
+    """Точки POLYLINE/LWPOLYLINE в координатах DXF (n x 3) и признак замкнутости"""
+    if entity.dxftype() == 'LWPOLYLINE':
+        xy = np.array(entity.get_points('xy'), dtype=np.float64).reshape(-1, 2)
+        elevation = entity.dxf.get('elevation', 0.0)
+        points = np.column_stack([xy, np.full(len(xy), elevation)])
+        return points, entity.closed
+
+    points = np.array([tuple(vertex.dxf.location) for vertex in entity.vertices], dtype=np.float64).reshape(-1, 3)
+    return points, entity.is_closed
+
+
+def flatten_block(block):
+    """Линии блока (POLYLINE, LWPOLYLINE, LINE) -> точки относительно базовой точки и ломаные (с перезапусками)"""
+    points = []
+    strips = []
+    count = 0
+    if block is not None:
+        base = np.array(tuple(block.block.dxf.get('base_point', (0, 0, 0))), dtype=np.float64)
+        for block_entity in block:
+            block_type = block_entity.dxftype()
+            try:
+                if block_type in ('POLYLINE', 'LWPOLYLINE'):
+                    pts, closed = polyline_points(block_entity)
+                elif block_type == 'LINE':
+                    pts = np.array([tuple(block_entity.dxf.start), tuple(block_entity.dxf.end)], dtype=np.float64)
+                    closed = False
+                else:
+                    continue
+            except Exception as e:
+                print(f"Ошибка обработки {block_type} в блоке {block.name}: {e}")
+                continue
+            if len(pts) < 2:
+                continue
+            points.append(pts - base)
+            strips.append(offset_strips(chain_strip(len(pts), closed), count))
+            count += len(pts)
+
+    if not points:
+        return np.zeros((0, 3), dtype=np.float64), np.zeros(0, dtype=np.uint32)
+    return np.concatenate(points), np.concatenate(strips)
+
+
+def insert_transform(entity):
+    """Матрица (поворот вокруг Z * масштаб) и смещение вставки блока в координатах DXF"""
+    sx = entity.dxf.get('xscale', 1.0)
+    sy = entity.dxf.get('yscale', 1.0)
+    sz = entity.dxf.get('zscale', 1.0)
+    angle = math.radians(entity.dxf.get('rotation', 0.0))
+    c, s = math.cos(angle), math.sin(angle)
+    rotation = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+    return rotation * np.array([sx, sy, sz]), np.array(tuple(entity.dxf.insert), dtype=np.float64)
+
+
+def load_dxf_vertices(file_path, scale=1.0, normalize=False, progress=None):
+    # быстрый путь: потоковое чтение без документа ezdxf в памяти
+    streamed = stream_dxf_vertices(file_path, scale, progress)
+    if streamed is not None:
+        vertices, indices_faces_t, indices_edges, indices_polylines, layers, origin, entity_types = streamed
+        print(f"=== ДИАГНОСТИКА DXF (потоковое чтение): {os.path.basename(file_path)} ===")
+        print(f"Найдены объекты: {entity_types}")
+        return finish_dxf_vertices(vertices, indices_faces_t, np.array([], dtype=np.uint32), indices_edges,
+                                   indices_polylines, layers, origin, scale, normalize)
+
     try:
         doc = ezdxf.readfile(file_path)
     except Exception as e:
         print(f"Ошибка чтения DXF файла {file_path}: {e}")
-        return (np.array([], dtype=np.float32),
+        return (np.empty((0, 3), dtype=np.float32),
+                np.array([], dtype=np.uint32),
+                np.array([], dtype=np.uint32),
                 np.array([], dtype=np.uint32),
                 np.array([], dtype=np.uint32),
-                np.array([], dtype=np.uint32))
+                {'names': [], 'faces': np.zeros(0, dtype=np.uint16), 'edges': np.zeros(0, dtype=np.uint16),
+                 'polylines': np.zeros(0, dtype=np.uint16)},
+                np.zeros(3))
 
     msp = doc.modelspace()
 
+    # вершины копятся блоками (массивами float64 в координатах сцены), индексы - списками и пакетами массивов
     vertices = []
     indices_faces_t = []
     indices_faces_q = []
     indices_edges = []
+    # линии и полилинии - ломаные с перезапусками, пакетами массивов
+    strip_chunks = []
     index_offset = 0
 
+    # номера слоев треугольников, ребер и ломаных (в порядке индексов), имя слоя -> номер
+    face_layers = []
+    edge_layers = []
+    strip_layer_chunks = []
+    layers = {}
+
+    def layer_id(name):
+        # слой заводится, только когда в него попадает геометрия (как в потоковом чтении)
+        return layers.setdefault(name, len(layers))
+
+    # имя блока -> (точки в координатах блока, ломаные); имя блока -> [(матрица, смещение, слой) вставок]
+    block_cache = {}
+    block_inserts = {}
+
     print(f"=== ДИАГНОСТИКА DXF: {os.path.basename(file_path)} ===")
 
     # Собираем статистику по типам объектов
@@ -39,17 +133,26 @@ def load_dxf_vertices(file_path, scale=1.0, normalize=False):
 
     print(f"Найдены объекты: {entity_types}")
 
+    total_entities = max(1, sum(entity_types.values()))
+    if progress is not None:
+        progress(0.3)
+
     # Обрабатываем ВСЕ типы объектов
-    for entity in msp:
+    for entity_index, entity in enumerate(msp):
+        if progress is not None and entity_index % DXF_PROGRESS_STEP == 0:
+            progress(0.3 + 0.6 * entity_index / total_entities)
+
         try:
             entity_type = entity.dxftype()
+            layer_name = entity.dxf.get('layer', DEFAULT_LAYER)
 
             # 1. ОБЫЧНЫЕ 3DFACE
             if entity_type == '3DFACE':
                 pts = [(vertex.x, vertex.z, vertex.y) for vertex in entity.wcs_vertices(False)]
                 if len(pts) > 0:
-                    pts = np.array(pts, dtype=np.float32) * scale
-                    vertices.extend(pts)
+                    pts = np.array(pts, dtype=np.float64) * scale
+                    vertices.append(pts)
+                    layer = layer_id(layer_name)
 
                     n = len(pts)
                     if n == 3:
@@ -57,136 +160,100 @@ def load_dxf_vertices(file_path, scale=1.0, normalize=False):
                         indices_edges.extend(
                             [index_offset, index_offset + 1, index_offset + 1, index_offset + 2, index_offset + 2,
                              index_offset])
+                        face_layers.append(layer)
+                        edge_layers.extend([layer] * 3)
                     elif n == 4:
-                        indices_faces_q.extend([index_offset, index_offset + 1, index_offset + 2, index_offset + 3])
+                        # четырехугольник сразу делим на два треугольника (GL_QUADS нет в core profile)
+                        indices_faces_t.extend([index_offset, index_offset + 1, index_offset + 2,
+                                                index_offset, index_offset + 2, index_offset + 3])
                         indices_edges.extend(
                             [index_offset, index_offset + 1, index_offset + 1, index_offset + 2, index_offset + 2,
                              index_offset + 3, index_offset + 3, index_offset])
+                        face_layers.extend([layer] * 2)
+                        edge_layers.extend([layer] * 4)
                     index_offset += n
 
-            # 2. INSERT + POLYLINE (ОСНОВНАЯ ПРОБЛЕМА - УЛУЧШАЕМ ОБРАБОТКУ)
+            # 2. INSERT - геометрия блока разбирается один раз, вставки копируются пакетно в конце
             elif entity_type == 'INSERT':
                 block_name = entity.dxf.name
-                insert_location = entity.dxf.insert
-
-                # УЧИТЫВАЕМ МАСШТАБ И ВРАЩЕНИЕ БЛОКА
-                xscale = entity.dxf.xscale if hasattr(entity.dxf, 'xscale') else 1.0
-                yscale = entity.dxf.yscale if hasattr(entity.dxf, 'yscale') else 1.0
-                zscale = entity.dxf.zscale if hasattr(entity.dxf, 'zscale') else 1.0
-
-                if block_name in doc.blocks:
-                    block = doc.blocks[block_name]
-                    block_vertices_count = 0
-
-                    for block_entity in block:
-                        block_type = block_entity.dxftype()
-                        points = []
-
-                        # ОБРАБАТЫВАЕМ РАЗНЫЕ ТИПЫ ОБЪЕКТОВ В БЛОКЕ
-                        if block_type == 'POLYLINE':
-                            if hasattr(block_entity, 'vertices'):
-                                for vertex in block_entity.vertices:
-                                    location = vertex.dxf.location
-                                    # УЧИТЫВАЕМ ПОЗИЦИЮ, МАСШТАБ И ПОВОРОТ БЛОКА
-                                    x = insert_location.x + location.x * xscale
-                                    y = insert_location.y + location.y * yscale
-                                    z = insert_location.z + (location.z if hasattr(location, 'z') else 0) * zscale
-                                    points.append((x, z, y))
-
-                        elif block_type == 'LWPOLYLINE':
-                            if hasattr(block_entity, 'points'):
-                                for point in block_entity.points():
-                                    x = insert_location.x + point[0] * xscale
-                                    y = insert_location.y + point[1] * yscale
-                                    z = insert_location.z + (point[2] if len(point) > 2 else 0) * zscale
-                                    points.append((x, z, y))
-
-                        elif block_type == 'LINE':
-                            start = block_entity.dxf.start
-                            end = block_entity.dxf.end
-                            points = [
-                                (insert_location.x + start.x * xscale, insert_location.z + start.z * zscale,
-                                 insert_location.y + start.y * yscale),
-                                (insert_location.x + end.x * xscale, insert_location.z + end.z * zscale,
-                                 insert_location.y + end.y * yscale)
-                            ]
-
-                        # ДОБАВЛЯЕМ ТОЧКИ В ОБЩИЙ МАССИВ
-                        if points:
-                            pts = np.array(points, dtype=np.float32) * scale
-                            vertices.extend(pts)
-
-                            # СОЗДАЕМ РЕБРА МЕЖДУ ТОЧКАМИ
-                            if block_type in ['POLYLINE', 'LWPOLYLINE']:
-                                for i in range(len(pts) - 1):
-                                    indices_edges.extend([index_offset + i, index_offset + i + 1])
-
-                                # ЗАМЫКАЕМ ЕСЛИ ПОЛИЛИНИЯ ЗАМКНУТА
-                                if ((block_type == 'POLYLINE' and hasattr(block_entity,
-                                                                          'is_closed') and block_entity.is_closed) or
-                                    (block_type == 'LWPOLYLINE' and block_entity.closed)) and len(pts) > 2:
-                                    indices_edges.extend([index_offset + len(pts) - 1, index_offset])
-
-                            elif block_type == 'LINE':
-                                indices_edges.extend([index_offset, index_offset + 1])
-
-                            block_vertices_count += len(pts)
-                            index_offset += len(pts)
-
-                    if block_vertices_count > 0:
-                        print(f"Обработан блок {block_name} с {block_vertices_count} вершинами")
-
-            # 3. ОБЫЧНЫЕ LWPOLYLINE
-            elif entity_type == 'LWPOLYLINE':
-                try:
-                    points = []
-                    if hasattr(entity, 'points'):
-                        for point in entity.points():
-                            x = point[0]
-                            y = point[1]
-                            z = point[2] if len(point) > 2 else 0
-                            points.append((x, z, y))
-
-                    if points:
-                        pts = np.array(points, dtype=np.float32) * scale
-                        vertices.extend(pts)
-
-                        # Создаем ребра между точками
-                        for i in range(len(pts) - 1):
-                            indices_edges.extend([index_offset + i, index_offset + i + 1])
-
-                        # Замыкаем если полилиния замкнута
-                        if entity.closed and len(pts) > 2:
-                            indices_edges.extend([index_offset + len(pts) - 1, index_offset])
-
-                        index_offset += len(pts)
-
-                except Exception as lw_e:
-                    print(f"Ошибка обработки LWPOLYLINE: {lw_e}")
-                    continue
+                if block_name not in block_cache:
+                    block_cache[block_name] = flatten_block(doc.blocks.get(block_name))
+                if len(block_cache[block_name][0]) > 0:
+                    # объекты блока рисуются в слое вставки
+                    block_inserts.setdefault(block_name, []).append(insert_transform(entity) + (layer_id(layer_name),))
+
+            # 3. ОБЫЧНЫЕ LWPOLYLINE и POLYLINE (2D/3D; сетки и многогранники не поддерживаются)
+            elif entity_type == 'LWPOLYLINE' or (entity_type == 'POLYLINE' and
+                                                 not (entity.is_poly_face_mesh or entity.is_polygon_mesh)):
+                points, closed = polyline_points(entity)
+                if len(points) > 1:
+                    vertices.append(points[:, [0, 2, 1]] * scale)
+                    strip_chunks.append(offset_strips(chain_strip(len(points), closed), index_offset))
+                    strip_layer_chunks.append([layer_id(layer_name)])
+                    index_offset += len(points)
 
             # 4. ОБЫЧНЫЕ LINE
             elif entity_type == 'LINE':
                 start = entity.dxf.start
                 end = entity.dxf.end
                 pts = [(start.x, start.z, start.y), (end.x, end.z, end.y)]
-                pts = np.array(pts, dtype=np.float32) * scale
-                vertices.extend(pts)
-                indices_edges.extend([index_offset, index_offset + 1])
+                pts = np.array(pts, dtype=np.float64) * scale
+                vertices.append(pts)
+                strip_chunks.append(offset_strips(chain_strip(2), index_offset))
+                strip_layer_chunks.append([layer_id(layer_name)])
                 index_offset += 2
 
         except Exception as e:
             print(f"Ошибка обработки объекта {entity_type}: {e}")
             continue
 
-    print(
-        f"Итог: вершин={len(vertices)}, граней={len(indices_faces_t) + len(indices_faces_q)}, ребер={len(indices_edges)}")
+    # вставки блоков: аффинное преобразование кэшированной геометрии сразу для всех вставок блока
+    for block_name, transforms in block_inserts.items():
+        points, strips = block_cache[block_name]
+        matrices = np.array([m for m, _, _ in transforms])
+        offsets = np.array([t for _, t, _ in transforms])
+
+        world = np.einsum('kij,nj->kni', matrices, points) + offsets[:, None, :]
+        vertices.append(world[:, :, [0, 2, 1]].reshape(-1, 3) * scale)
+
+        starts = index_offset + len(points) * np.arange(len(transforms), dtype=np.int64)
+        strip_chunks.append(offset_strips(strips[None, :], starts[:, None]).reshape(-1))
+        strip_layer_chunks.append(np.repeat([layer for _, _, layer in transforms],
+                                            int((strips == restart_index(np.uint32)).sum())))
+        index_offset += len(points) * len(transforms)
+        print(f"Блок {block_name}: {len(transforms)} вставок по {len(points)} вершин")
+
+    vertices = np.concatenate(vertices) if vertices else np.zeros((0, 3), dtype=np.float64)
+    # начало координат файла - округленный вниз минимум; во float32 хранятся только смещения от него
+    origin = np.floor(vertices.min(axis=0)) if len(vertices) else np.zeros(3)
+    vertices = (vertices - origin).astype(np.float32)
+    indices_edges = np.array(indices_edges, dtype=np.uint32)
+    indices_polylines = np.concatenate([np.zeros(0, dtype=np.uint32)] + strip_chunks)
+    indices_faces_t = np.array(indices_faces_t, dtype=np.uint32)
+    indices_faces_q = np.array(indices_faces_q, dtype=np.uint32)
+    layers = {'names': list(layers),
+              'faces': np.array(face_layers, dtype=np.uint16),
+              'edges': np.array(edge_layers, dtype=np.uint16),
+              'polylines': np.concatenate([np.zeros(0, dtype=np.int64)] + strip_layer_chunks).astype(np.uint16)}
+
+    return finish_dxf_vertices(vertices, indices_faces_t, indices_faces_q, indices_edges, indices_polylines, layers,
+                               origin, scale, normalize)
+
+
+def finish_dxf_vertices(vertices, indices_faces_t, indices_faces_q, indices_edges, indices_polylines, layers, origin,
+                        scale, normalize):
+    """Итоговая статистика, заглушка для пустой модели и нормализация.
+
+    indices_polylines - ломаные с перезапусками; layers - {'names': имена слоев, 'faces', 'edges', 'polylines':
+    слой каждого треугольника, ребра и ломаной}, origin - начало координат файла (вершины - относительно него).
+    """
+    # индексы плоские: треугольник - 3 индекса, четырехугольник - 4 (два треугольника)
+    print(f"Итог: вершин={len(vertices)}, граней={len(indices_faces_t) // 3 + len(indices_faces_q) // 4 * 2}, "
+          f"ребер={len(indices_edges)}, индексов ломаных={len(indices_polylines)}")
 
     if len(vertices) > 0:
-        vertices_array = np.array(vertices, dtype=np.float32)
-        min_coords = vertices_array.min(axis=0)
-        max_coords = vertices_array.max(axis=0)
-        center = (min_coords + max_coords) / 2.0
+        min_coords = vertices.min(axis=0) + origin
+        max_coords = vertices.max(axis=0) + origin
 
         print(f"Координаты: Min({min_coords[0]:.1f}, {min_coords[1]:.1f}, {min_coords[2]:.1f}) "
               f"Max({max_coords[0]:.1f}, {max_coords[1]:.1f}, {max_coords[2]:.1f})")
@@ -203,22 +270,22 @@ def load_dxf_vertices(file_path, scale=1.0, normalize=False):
             [0.0, 0.0, 1.0], [1.0, 0.0, 1.0], [1.0, 1.0, 1.0], [0.0, 1.0, 1.0]
         ], dtype=np.float32) * scale
 
-        indices_faces_q = np.array([
+        indices_faces_t = quads_to_triangles([
             0, 1, 2, 3, 3, 2, 6, 7, 1, 0, 4, 5,
             2, 1, 5, 6, 0, 3, 7, 4, 7, 6, 5, 4
-        ], dtype=np.uint32)
+        ])
+        indices_faces_q = np.array([], dtype=np.uint32)
 
         indices_edges = np.array([
             0, 1, 1, 2, 2, 3, 3, 0, 0, 4, 1, 5,
             2, 6, 3, 7, 4, 5, 5, 6, 6, 7, 7, 4
         ], dtype=np.uint32)
-    else:
-        vertices = np.array(vertices, dtype=np.float32)
-        indices_faces_t = np.array(indices_faces_t, dtype=np.uint32) if indices_faces_t else np.array([],
-                                                                                                      dtype=np.uint32)
-        indices_faces_q = np.array(indices_faces_q, dtype=np.uint32) if indices_faces_q else np.array([],
-                                                                                                      dtype=np.uint32)
-        indices_edges = np.array(indices_edges, dtype=np.uint32) if indices_edges else np.array([], dtype=np.uint32)
+        indices_polylines = np.array([], dtype=np.uint32)
+        layers = {'names': [DEFAULT_LAYER],
+                  'faces': np.zeros(len(indices_faces_t) // 3, dtype=np.uint16),
+                  'edges': np.zeros(len(indices_edges) // 2, dtype=np.uint16),
+                  'polylines': np.zeros(0, dtype=np.uint16)}
+        origin = np.zeros(3)
 
     if normalize and len(vertices) > 0:
         min_coords = vertices.min(axis=0)
@@ -226,40 +293,237 @@ def load_dxf_vertices(file_path, scale=1.0, normalize=False):
         size = max_coords - min_coords
         if np.any(size > 0):
             vertices = (vertices - min_coords) / size
-
-    return vertices, indices_faces_t, indices_faces_q, indices_edges
-
-# загрузка моделей из DXF файлов
-def create_dxf_object(file_path, normalize=False):
-    vertices, indices_faces_t, indices_faces_q, indices_edges = load_dxf_vertices(file_path, 1.0, normalize)
-
-    colors_edges = np.tile(np.array([0.9, 0.9, 0.9], dtype=np.float32), (len(vertices), 1))  # БЕЛЫЙ
-    colors_faces = np.tile(np.array([0.3, 0.3, 0.3, 1.0], dtype=np.float32), (len(vertices), 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (len(vertices), 1))
-
-    vertVBO = vbo.VBO(vertices.flatten().astype(np.float32))
-    colorVBO = vbo.VBO(colors_faces.flatten().astype(np.float32))
-
-    mesh = ObjectMesh(vertVBO, colorVBO, indices_faces_t, indices_faces_q, indices_edges)
-
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-
-    mesh.enableFaces = len(indices_faces_t) + len(indices_faces_q) > 0
+        # нормализованная модель - в своих единицах, без начала координат файла
+        origin = np.zeros(3)
+
+    return (vertices, indices_faces_t, indices_faces_q, indices_edges, indices_polylines, layers,
+            np.asarray(origin, dtype=np.float64))
+
+# массивы сетки DXF в кэше; индексы граней, ребер и ломаных (polylines, с перезапусками) отсортированы
+# по слоям, границы слоев - в *_ranges; вершины - относительно начала координат файла origin
+DXF_ARRAYS = ('vertices', 'faces_t', 'faces_q', 'edges', 'feature_edges', 'polylines', 'normals',
+              'face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges', 'origin')
+# массивы уровня детализации в кэше: lod<номер>_vertices и т.д., размеры ячеек - в lod_cells
+DXF_LOD_ARRAYS = ('vertices', 'normals', 'faces', 'edges', 'feature_edges', 'polylines',
+                  'face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges')
+# тайлы в кэше: массивы всех тайлов подряд, границы тайлов в tile_<имя>_offsets, рамки - в tile_bounds
+DXF_TILE_ARRAYS = ('vertices', 'normals', 'faces', 'edges', 'feature_edges', 'polylines')
+# границы слоев тайлов - по строке на тайл
+DXF_TILE_RANGES = ('face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges')
+
+# позиции сеток DXF в GPU - uint16 по рамке сетки (тайла), нормали - int8; False - float32
+DXF_QUANTIZE_VERTICES = True
+
+# цвета сеток DXF (грани освещаются в шейдере, см. SurfaceStyle)
+DXF_COLOR_EDGES = (0.9, 0.9, 0.9)  # БЕЛЫЙ
+DXF_COLOR_FACES = (0.3, 0.3, 0.3, 1.0)
+
+def _cached_lods(cached):
+    return [dict({'cell': float(cell)}, **{name: cached[f"lod{i}_{name}"] for name in DXF_LOD_ARRAYS})
+            for i, cell in enumerate(cached['lod_cells'])]
+
+def _pack_tiles(tiles, layer_count):
+    arrays = {'tile_bounds': np.array([[tile['min'], tile['max']] for tile in tiles],
+                                      dtype=np.float32).reshape(-1, 2, 3)}
+    for name in DXF_TILE_ARRAYS:
+        chunks = [tile[name] for tile in tiles]
+        if chunks:
+            arrays[f"tile_{name}"] = np.concatenate(chunks)
+        elif name in ('vertices', 'normals'):
+            arrays[f"tile_{name}"] = np.zeros((0, 3), dtype=np.float32)
+        else:
+            arrays[f"tile_{name}"] = np.zeros(0, dtype=np.uint32)
+        arrays[f"tile_{name}_offsets"] = np.cumsum([0] + [len(chunk) for chunk in chunks]).astype(np.int64)
+    for name in DXF_TILE_RANGES:
+        arrays[f"tile_{name}"] = np.array([tile[name] for tile in tiles], dtype=np.int64).reshape(-1, layer_count + 1)
+    return arrays
+
+def _cached_tiles(cached):
+    # срезы mmap - данные тайла читаются с диска, только когда тайл загружается в GPU
+    tiles = []
+    for i, (bounds_min, bounds_max) in enumerate(cached['tile_bounds']):
+        tile = {'min': bounds_min, 'max': bounds_max}
+        for name in DXF_TILE_ARRAYS:
+            offsets = cached[f"tile_{name}_offsets"]
+            tile[name] = cached[f"tile_{name}"][offsets[i]:offsets[i + 1]]
+        for name in DXF_TILE_RANGES:
+            tile[name] = cached[f"tile_{name}"][i]
+        tiles.append(tile)
+    return tiles
+
+def _cached_geometry(cached):
+    geometry = {name: cached[name] for name in DXF_ARRAYS}
+    geometry['origin'] = np.array(cached['origin'], dtype=np.float64)
+    geometry['layer_names'] = [str(name) for name in cached['layer_names']]
+    geometry['lods'] = _cached_lods(cached)
+    geometry['tiles'] = _cached_tiles(cached)
+    return geometry
+
+def load_dxf_geometry(file_path, scale=1.0, normalize=False, progress=None, crease_angle=FEATURE_CREASE_ANGLE):
+    """load_dxf_vertices через дисковый кэш: повторное открытие отдает массивы через mmap.
+
+    Возвращает словарь: массивы DXF_ARRAYS (вершины - относительно начала координат 'origin'),
+    имена слоев 'layer_names', уровни детализации 'lods' и тайлы 'tiles'.
+    """
+    cached = dxf_cache.load(file_path, scale=scale, normalize=normalize, crease_angle=crease_angle)
+    if cached is not None:
+        return _cached_geometry(cached)
+
+    vertices, indices_faces_t, indices_faces_q, indices_edges, indices_polylines, layers, origin = load_dxf_vertices(
+        file_path, scale, normalize, progress)
+    layer_count = len(layers['names'])
+
+    # общие углы граней сливаются в одну вершину, повторные грани и ребра убираются
+    # (четырехугольники загрузчики уже делят на треугольники, их слой - 0)
+    quads = quads_to_triangles(indices_faces_q).astype(np.int64)
+    triangles = np.concatenate([np.asarray(indices_faces_t, dtype=np.int64).reshape(-1), quads])
+    face_layers = np.concatenate([layers['faces'], np.zeros(len(quads) // 3, dtype=np.uint16)])
+    welded, triangles, edges, polylines, face_index, edge_index, polyline_index = weld_mesh(
+        vertices, triangles, indices_edges, indices_polylines, return_index=True)
+    face_layers = face_layers[face_index]
+    edge_layers = layers['edges'][edge_index]
+    polyline_layers = layers['polylines'][polyline_index]
+    print(f"Сварка сетки: вершин {len(vertices)} -> {len(welded)}, граней {len(triangles) // 3}, "
+          f"ребер {len(edges) // 2}, индексов ломаных {len(polylines)}, слоев {layer_count}")
+
+    # вместо всей сетки ребер по умолчанию рисуются границы, изломы и ребра не на гранях;
+    # ломаные рисуются всегда, отдельным буфером
+    loose = polyline_mask(triangles, edges)
+    features, feature_layers = feature_edges(welded, triangles, edges.reshape(-1, 2)[loose], crease_angle,
+                                             face_layers, edge_layers[loose])
+    print(f"Характерных ребер: {len(features) // 2} из {len(edges) // 2}")
+
+    # нормали для освещения в шейдере
+    normals = vertex_normals(welded, triangles)
+
+    # упрощенные копии для дальних планов - кластеризация вершин по сеткам убывающей плотности
+    lods = build_lods(welded, triangles, edges, loose, crease_angle=crease_angle, face_layers=face_layers,
+                      edge_layers=edge_layers, layer_count=layer_count, strips=polylines, strip_layers=polyline_layers)
+    if lods:
+        print("Уровни детализации: граней " + ", ".join(str(len(lod['faces']) // 3) for lod in lods))
+
+    # большие сетки рисуются тайлами с отсечением и подкачкой в GPU
+    tiles = split_tiles(welded, triangles, edges, features, normals, face_layers=face_layers,
+                        edge_layers=edge_layers, feature_layers=feature_layers, layer_count=layer_count,
+                        polylines=polylines, polyline_layers=polyline_layers)
+    if tiles:
+        print(f"Тайлов: {len(tiles)}")
+
+    # слои - непрерывные диапазоны индексов: смена видимости слоя меняет только диапазоны отрисовки
+    geometry = {'vertices': welded, 'faces_q': np.array([], dtype=triangles.dtype), 'normals': normals,
+                'origin': origin}
+    geometry['faces_t'], geometry['face_ranges'] = layer_ranges(triangles, face_layers, 3, layer_count)
+    geometry['edges'], geometry['edge_ranges'] = layer_ranges(edges, edge_layers, 2, layer_count)
+    geometry['feature_edges'], geometry['feature_ranges'] = layer_ranges(features, feature_layers, 2, layer_count)
+    geometry['polylines'], geometry['polyline_ranges'] = strip_ranges(polylines, polyline_layers, layer_count)
+
+    arrays = {name: geometry[name] for name in DXF_ARRAYS}
+    arrays['layer_names'] = np.array(layers['names'], dtype=str)
+    arrays['lod_cells'] = np.array([lod['cell'] for lod in lods], dtype=np.float64)
+    for i, lod in enumerate(lods):
+        arrays.update({f"lod{i}_{name}": lod[name] for name in DXF_LOD_ARRAYS})
+    arrays.update(_pack_tiles(tiles, layer_count))
+    dxf_cache.store(file_path, arrays, scale=scale, normalize=normalize, crease_angle=crease_angle)
+
+    geometry.update(layer_names=list(layers['names']), lods=lods, tiles=tiles)
+    return geometry
+
+# подготовка массивов DXF модели - без вызовов OpenGL, можно выполнять в фоновом потоке
+def prepare_dxf_geometry(file_path, normalize=False, progress=None, crease_angle=FEATURE_CREASE_ANGLE):
+    geometry = load_dxf_geometry(file_path, 1.0, normalize, progress, crease_angle)
+    vertices, tiles = geometry['vertices'], geometry['tiles']
+
+    if tiles:
+        # рамка модели по рамкам тайлов - без чтения всех вершин
+        bounds = np.array([[tile['min'], tile['max']] for tile in tiles])
+        min_v, max_v = bounds[:, 0].min(axis=0), bounds[:, 1].max(axis=0)
+    elif len(vertices) > 0:
+        min_v, max_v = vertices.min(axis=0), vertices.max(axis=0)
+    else:
+        min_v, max_v = np.array([0, 0, 0]), np.array([1, 1, 1])
+
+    geometry['vertices'] = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+    geometry['min'] = min_v
+    geometry['max'] = max_v
+    if progress is not None:
+        progress(1.0)
+    return geometry
+
+# создание объекта сцены из подготовленных массивов (в GUI-потоке)
+def _dxf_mesh(vertices, normals, faces_t, faces_q, edges, features=None, polylines=None, ranges=None,
+              max_error=QUANTIZE_MAX_ERROR):
+    # позиции квантуются в uint16 по рамке сетки, если ошибка не больше max_error;
+    # иначе float32 массивы (в т.ч. mmap из кэша) уходят в VBO без промежуточной копии. Цветов вершин нет
+    quantized = quantize_positions(vertices, max_error) if DXF_QUANTIZE_VERTICES else None
+    if quantized is None:
+        positions = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1)
+        normals = np.ascontiguousarray(normals, dtype=np.float32).reshape(-1)
+    else:
+        positions, offset, step = quantized
+        positions = positions.reshape(-1)
+        normals = quantize_normals(normals).reshape(-1)
+
+    mesh = ObjectMesh(vbo.VBO(positions), None, faces_t, faces_q, edges, features, polylines)
+    mesh.normalsVBO = vbo.VBO(normals)
+    if quantized is not None:
+        mesh.positionOffset, mesh.positionStep = tuple(map(float, offset)), tuple(map(float, step))
+    mesh.edgeColor = DXF_COLOR_EDGES
+    if ranges is not None:
+        mesh.faceRanges, mesh.edgeRanges, mesh.featureRanges, mesh.polylineRanges = ranges
+
+    mesh.enableFaces = len(faces_t) + len(faces_q) > 0
     mesh.enableEdges = True
-
-    min_v = vertices.min(axis=0) if len(vertices) > 0 else np.array([0, 0, 0])
-    max_v = vertices.max(axis=0) if len(vertices) > 0 else np.array([1, 1, 1])
+    return mesh
+
+def _layer_ranges(arrays):
+    return tuple(arrays[name] for name in ('face_ranges', 'edge_ranges', 'feature_ranges', 'polyline_ranges'))
+
+def _dxf_tile_mesh(tile):
+    return _dxf_mesh(tile.vertices, tile.normals, tile.indices('faces'), [], tile.indices('edges'),
+                     tile.indices('feature_edges'), tile.indices('polylines'), tile.ranges)
+
+def create_dxf_object_from_geometry(geometry):
+    if geometry.get('tiles'):
+        # полная сетка не загружается в GPU целиком - только видимые тайлы
+        mesh = ObjectMesh(None, None)
+        mesh.tiles = [MeshTile(tile['min'], tile['max'], tile['vertices'], tile['normals'], tile['faces'],
+                               tile['edges'], tile['feature_edges'], tile['polylines'], _dxf_tile_mesh,
+                               _layer_ranges(tile))
+                      for tile in geometry['tiles']]
+        mesh.enableFaces = len(geometry['faces_t']) + len(geometry['faces_q']) > 0
+    else:
+        mesh = _dxf_mesh(geometry['vertices'], geometry['normals'], geometry['faces_t'], geometry['faces_q'],
+                         geometry['edges'], geometry['feature_edges'], geometry['polylines'],
+                         _layer_ranges(geometry))
+    mesh.edgeColor = DXF_COLOR_EDGES
+    mesh.set_layers(geometry['layer_names'])
+
+    for lod in geometry.get('lods', []):
+        # вершины уровня и так смещены до размера ячейки - ошибка квантования до четверти ячейки незаметна
+        mesh.lods.append((lod['cell'], _dxf_mesh(lod['vertices'], lod['normals'], lod['faces'], [], lod['edges'],
+                                                 lod['feature_edges'], lod['polylines'], _layer_ranges(lod),
+                                                 max(QUANTIZE_MAX_ERROR, lod['cell'] / 4))))
+
+    # освещение и раскраска граней задаются uniform шейдера; шкала высот - по рамке модели
+    mesh.surfaceStyle = SurfaceStyle(DXF_COLOR_FACES, (float(geometry['min'][1]), float(geometry['max'][1])))
+
+    min_v = geometry['min']
+    max_v = geometry['max']
     collision = CollisionBox(glm.vec3(min_v), glm.vec3(max_v))
 
     center = (min_v + max_v) / 2.0
 
     obj = SceneObject(mesh, collision, center)
+    # вершины и рамка - относительно начала координат файла, само начало - в матрице объекта (double)
+    obj.location = np.array(geometry.get('origin', np.zeros(3)), dtype=np.float64)
+    obj.calculate_matrix()
     print(f"Создан DXF объект с ID: {obj.id}")
     return obj
 
+# загрузка моделей из DXF файлов
+def create_dxf_object(file_path, normalize=False):
+    return create_dxf_object_from_geometry(prepare_dxf_geometry(file_path, normalize))
+
 def create_cube():
     colors = np.array(
         [[0.0, 0.0, 0.0, 1.0],
@@ -273,9 +537,6 @@ def create_cube():
     colorVBO = vbo.VBO(np.reshape(colors,
                                   (1, -1)).astype(np.float32))
 
-    colors_edges = np.tile(np.array([0.5, 0.13, 0.13], dtype=np.float32), (8, 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (8, 1))
-
     vertices = np.array(
         [[0.0, 0.0, 0.0],
          [1.0, 0.0, 0.0],
@@ -315,10 +576,7 @@ def create_cube():
 
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, indices_quads, indices_edges)
 
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (0.5, 0.13, 0.13)
 
     mesh.enableFaces = True
     collision = CollisionBox(glm.vec3([0.0, 0.0, 0.0]), glm.vec3([1.0, 1.0, 1.0]))
@@ -380,13 +638,7 @@ def create_sphere(meridians=16, parallels=16, color=[1.0, 0.0, 0.0, 1.0]):
 
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, None, indices_edges)
 
-    colors_edges = np.tile(np.array([1.0, 1.0, 1.0], dtype=np.float32), (len(vertices), 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (len(vertices), 1))
-
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (1.0, 1.0, 1.0)
 
     mesh.enableFaces = True
     mesh.enableEdges = False  # Оставляем как было
@@ -480,13 +732,7 @@ def create_enhanced_sphere(meridians=32, parallels=32, base_color=[1.0, 0.0, 0.0
 
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, None, indices_edges)
 
-    colors_edges = np.tile(np.array([1.0, 1.0, 1.0], dtype=np.float32), (len(vertices), 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (len(vertices), 1))
-
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (1.0, 1.0, 1.0)
 
     mesh.enableFaces = True
     mesh.enableEdges = False
@@ -584,13 +830,7 @@ def create_beach_ball_hosohedron(base_color=[1.0, 0.0, 0.0, 1.0]):
 
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, None, indices_edges)
 
-    colors_edges = np.tile(np.array([0.0, 0.0, 0.0], dtype=np.float32), (len(vertices), 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (len(vertices), 1))
-
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (0.0, 0.0, 0.0)
 
     mesh.enableFaces = True
     mesh.enableEdges = False
@@ -700,13 +940,7 @@ def create_enhanced_beach_ball(base_color=[1.0, 0.0, 0.0, 1.0]):
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, None, indices_edges)
 
     # Черные ребра для контраста
-    colors_edges = np.tile(np.array([0.0, 0.0, 0.0], dtype=np.float32), (len(vertices), 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (len(vertices), 1))
-
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (0.0, 0.0, 0.0)
 
     mesh.enableFaces = True
     mesh.enableEdges = True  # Включаем отображение черных линий
@@ -718,30 +952,10 @@ def create_enhanced_beach_ball(base_color=[1.0, 0.0, 0.0, 1.0]):
     return obj
 
 
-def create_point(base_color=[1.0, 0.0, 0.0, 1.0]):
-    """Создает маленькую точку для отображения событий - С ПРОЗРАЧНОСТЬЮ"""
-    # Гарантируем RGBA формат
-    if len(base_color) == 3:
-        base_color = base_color + [1.0]
-
-    # Используем enhanced_sphere с прозрачностью
-    obj = create_enhanced_sphere(8, 8, base_color)
-
-    # Сохраняем прозрачность
-    if hasattr(obj, 'base_color'):
-        obj.base_color = base_color
-    if hasattr(obj, 'current_opacity'):
-        obj.current_opacity = base_color[3] if len(base_color) > 3 else 1.0
-
-    return obj
-
 def create_pyramid():
     colors = np.tile(np.array([1.0, 0.0, 1.0, 0.1], dtype=np.float32), (5, 1))
     colorVBO = vbo.VBO(np.reshape(colors,(1, -1)).astype(np.float32))
 
-    colors_edges = np.tile(np.array([0.5, 0.13, 0.13], dtype=np.float32), (5, 1))
-    colors_hovered = np.tile(np.array([1.0, 0.5, 0.0], dtype=np.float32), (5, 1))
-
     vertices = np.array(
         [[0.0, 0.0, 0.0],
          [1.0, 0.0, 0.0],
@@ -774,10 +988,7 @@ def create_pyramid():
 
     mesh = ObjectMesh(vertVBO, colorVBO, indices_triangles, indices_quads, indices_edges)
 
-    mesh.colorsEdgesVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
-    mesh.colorsHoveredVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsSelectedVBO = vbo.VBO(colors_hovered.flatten().astype(np.float32))
-    mesh.colorsEdgesActiveVBO = vbo.VBO(colors_edges.flatten().astype(np.float32))
+    mesh.edgeColor = (0.5, 0.13, 0.13)
 
     mesh.enableFaces = True
 
@@ -1,23 +1,112 @@
+import numpy as np
+
+# допустимая ошибка упрощенного уровня на экране (в пикселях)
+LOD_PIXEL_ERROR = 2.0
+
+
+# четырехугольники (по 4 индекса) -> пары треугольников
+def quads_to_triangles(quads):
+    quads = np.asarray(quads, dtype=np.uint32).reshape(-1, 4)
+    return quads[:, [0, 1, 2, 0, 2, 3]].reshape(-1)
+
+
+# индексы как есть, если они уже uint16/uint32, иначе uint32
+def index_array(indices):
+    indices = np.asarray(indices).reshape(-1)
+    if indices.dtype not in (np.uint16, np.uint32):
+        indices = indices.astype(np.uint32)
+    return indices
+
+
 class ObjectMesh:
-    def __init__(self, vertices, colors, faces_t=None, faces_q=None, edges=None):
+    def __init__(self, vertices, colors, faces_t=None, faces_q=None, edges=None, feature_edges=None, polylines=None):
         self.enableFaces = True
         self.enableEdges = True
 
         self.verticesVBO = vertices
         self.colorsFacesVBO = colors
-        self.colorsEdgesVBO = colors  # Будет переопределено
-        self.colorsHoveredVBO = colors
-        self.colorsSelectedVBO = colors
-        self.colorsEdgesActiveVBO = colors  # Будет переопределено
+        # нормали вершин - у поверхностей, которые освещаются в шейдере (DXF)
+        self.normalsVBO = None
+        # квантованные (uint16) позиции: вершина = positionOffset + значение * positionStep
+        self.positionOffset = (0.0, 0.0, 0.0)
+        self.positionStep = (1.0, 1.0, 1.0)
+
+        # ребра и подсветка - один цвет на сетку (uniform шейдера)
+        self.edgeColor = (1.0, 1.0, 1.0)
+        self.hoverColor = (1.0, 0.5, 0.0)
+        # SurfaceStyle: освещение и раскраска граней; None - цвета вершин из colorsFacesVBO
+        self.surfaceStyle = None
 
-        self.facesQuads = faces_q
-        self.facesTriangles = faces_t
-        self.edges = edges
+        # Четырехугольники переводятся в треугольники при создании - рисуем только GL_TRIANGLES
+        # (сваренные сетки DXF приходят с индексами uint16, если вершин мало)
+        triangles = [index_array(faces_t)] if faces_t is not None else []
+        if faces_q is not None and len(faces_q):
+            triangles.append(quads_to_triangles(faces_q))
+        if len(triangles) > 1:
+            self.facesTriangles = np.concatenate(triangles)
+        else:
+            # один массив (возможно mmap из кэша) - без копии
+            self.facesTriangles = triangles[0] if triangles else None
+        self.facesQuads = None
+        self.edges = index_array(edges) if edges is not None else None
+        # характерные ребра (границы, изломы, полилинии) - рисуются вместо всех ребер, если есть
+        self.featureEdges = index_array(feature_edges) if feature_edges is not None else None
+        # линии и полилинии - ломаные (GL_LINE_STRIP) с индексом перезапуска после каждой, рисуются вместе с ребрами
+        self.polylines = index_array(polylines) if polylines is not None else None
 
+        # объекты GPU (VAO и буферы индексов), создаются при первой отрисовке
+        self.facesVAO = None
+        self.edgesVAO = None
+        self.featureEdgesVAO = None
+        self.polylinesVAO = None
+        self.facesEBO = None
+        self.edgesEBO = None
+        self.featureEdgesEBO = None
+        self.polylinesEBO = None
+
+        # индексы граней и ребер, отсортированные по слоям: слой i - индексы с ranges[i] по ranges[i + 1];
+        # None - сетка без слоев (рисуется целиком)
+        self.faceRanges = None
+        self.edgeRanges = None
+        self.featureRanges = None
+        self.polylineRanges = None
+        # слои объекта: имена, видимость и свои цвета (None - цвет сетки); действуют и на уровни, и на тайлы
+        self.layerNames = []
+        self.layerVisible = None
+        self.layerColors = None
+
+        # упрощенные уровни детализации: [(размер ячейки, ObjectMesh)] от подробного к грубому
+        self.lods = []
+        # тайлы большой сетки (MeshTile), загружаются в GPU по видимости; у такой сетки своих буферов нет
+        self.tiles = []
+
+        self.hovered = False
         self.enabled = True
 
+    def level_for(self, pixels_per_unit):
+        """Самый грубый уровень, ошибка которого на экране не больше LOD_PIXEL_ERROR пикселей"""
+        chosen = self
+        for cell, level in self.lods:
+            if cell * pixels_per_unit > LOD_PIXEL_ERROR:
+                break
+            chosen = level
+        return chosen
+
+    def set_layers(self, names):
+        self.layerNames = list(names)
+        self.layerVisible = np.ones(len(self.layerNames), dtype=bool)
+        self.layerColors = [None] * len(self.layerNames)
+
+    def set_layer_visible(self, layer, visible):
+        self.layerVisible[layer] = visible
+
+    def set_layer_color(self, layer, color):
+        """color - (r, g, b) от 0 до 1 или None (цвет сетки)"""
+        self.layerColors[layer] = tuple(color) if color is not None else None
+
     def on_hover(self):
-        self.colorsEdgesActiveVBO = self.colorsHoveredVBO
+        # уровни детализации и тайлы рисуются с подсветкой этой сетки
+        self.hovered = True
 
     def on_unhover(self):
-        self.colorsEdgesActiveVBO = self.colorsEdgesVBO  # Возвращаем цвет ребер
\ No newline at end of file
+        self.hovered = False
@@ -0,0 +1,110 @@
+import numpy as np
+import OpenGL.GL as gl
+
+# Выбор объектов по цвету: сцена рисуется во внеэкранный буфер, где цвет пикселя -
+# идентификатор. RGB хранит 24-битный номер (объекта или экземпляра глифа),
+# альфа - метку, в каком пространстве номеров его искать.
+
+PICK_TAG_NONE = 0
+PICK_TAG_OBJECT = 1
+# для глифов метка = PICK_TAG_GLYPH + индекс типа глифа в GLYPH_TYPES
+PICK_TAG_GLYPH = 2
+
+MAX_PICK_ID = (1 << 24) - 1
+
+
+def encode_pick_color(pick_id, tag):
+    """Номер и метка -> цвет RGBA (байты)"""
+    if pick_id > MAX_PICK_ID:
+        raise ValueError(f"Номер {pick_id} не помещается в 24 бита")
+    return pick_id & 0xFF, (pick_id >> 8) & 0xFF, (pick_id >> 16) & 0xFF, tag
+
+
+def decode_pick_color(pixel):
+    """Цвет RGBA (байты) -> (метка, номер)"""
+    r, g, b, a = (int(c) for c in pixel)
+    return a, r | (g << 8) | (b << 16)
+
+
+class PickBuffer:
+    """Внеэкранный буфер идентификаторов размером с окно"""
+    def __init__(self):
+        self.framebuffer = None
+        self.colorBuffer = None
+        self.depthBuffer = None
+        self.size = (0, 0)
+        # состояние кадра на время прохода идентификаторов
+        self._savedClearColor = None
+        self._savedViewport = None
+
+    def _create(self, width, height):
+        self.release()
+
+        self.framebuffer = gl.glGenFramebuffers(1)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+
+        self.colorBuffer = gl.glGenRenderbuffers(1)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.colorBuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, width, height)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, self.colorBuffer)
+
+        self.depthBuffer = gl.glGenRenderbuffers(1)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.depthBuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH_COMPONENT24, width, height)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT, gl.GL_RENDERBUFFER, self.depthBuffer)
+
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+        self.size = (width, height)
+
+    def bind(self, width, height):
+        """Делает буфер текущим и очищает его (нулевой цвет - пусто)"""
+        width, height = max(1, width), max(1, height)
+        if self.framebuffer is None or self.size != (width, height):
+            self._create(width, height)
+        else:
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+
+        # цвет очистки и область вывода кадра восстанавливает unbind
+        self._savedClearColor = tuple(float(c) for c in gl.glGetFloatv(gl.GL_COLOR_CLEAR_VALUE))
+        self._savedViewport = tuple(int(v) for v in gl.glGetIntegerv(gl.GL_VIEWPORT))
+
+        gl.glViewport(0, 0, width, height)
+        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+
+        # идентификаторы нельзя смешивать и сглаживать
+        gl.glDisable(gl.GL_BLEND)
+        gl.glDisable(gl.GL_DITHER)
+        gl.glDisable(gl.GL_MULTISAMPLE)
+
+    def unbind(self, default_framebuffer=0):
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, default_framebuffer)
+        gl.glEnable(gl.GL_DITHER)
+        gl.glEnable(gl.GL_MULTISAMPLE)
+        if self._savedClearColor is not None:
+            gl.glClearColor(*self._savedClearColor)
+            gl.glViewport(*self._savedViewport)
+            self._savedClearColor = None
+            self._savedViewport = None
+
+    def read(self, x, y):
+        """Читает один пиксель (x, y в координатах окна, y сверху) -> (метка, номер)"""
+        width, height = self.size
+        if self.framebuffer is None or not (0 <= x < width and 0 <= y < height):
+            return PICK_TAG_NONE, 0
+
+        previous = gl.glGetIntegerv(gl.GL_READ_FRAMEBUFFER_BINDING)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.framebuffer)
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        pixel = gl.glReadPixels(int(x), int(height - 1 - y), 1, 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, int(previous))
+        return decode_pick_color(np.frombuffer(pixel, dtype=np.uint8)[:4])
+
+    def release(self):
+        if self.framebuffer is not None:
+            gl.glDeleteFramebuffers(1, [self.framebuffer])
+            gl.glDeleteRenderbuffers(2, [self.colorBuffer, self.depthBuffer])
+        self.framebuffer = None
+        self.colorBuffer = None
+        self.depthBuffer = None
+        self.size = (0, 0)
@@ -1,8 +1,8 @@
 import json
 import os
-import numpy as np
 from PyQt5 import QtCore, QtWidgets, QtGui
-from OpenGL.arrays import vbo
+
+from glyph_instancing import GLYPH_TYPES
 
 class PropertiesField(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -432,9 +432,9 @@ class PropertiesField(QtWidgets.QWidget):
             # Обновляем интерфейс
             self.update_tab_for_file(file_path, new_visualization_type)
 
-            # Применяем изменения к сцене
-            if self.main_window and hasattr(self.main_window, 'reload_file_with_settings'):
-                self.main_window.reload_file_with_settings(file_path)
+            # Применяем изменения к сцене - экземпляры переносятся в буфер нового типа глифа
+            if self.main_window and file_path in self.main_window.glWidget.event_sets:
+                self.main_window.change_evp_visualization(file_path, new_visualization_type)
 
         except Exception as e:
             print(f"Ошибка при смене визуализации: {e}")
@@ -498,9 +498,12 @@ class PropertiesField(QtWidgets.QWidget):
 
                 self.save_properties_settings()
 
-                # Применяем изменения
-                if self.main_window and hasattr(self.main_window, 'reload_file_with_settings'):
-                    self.main_window.reload_file_with_settings(file_path)
+                # Применяем изменения только к событиям диапазона
+                event_set, range_index = self.find_event_range(file_path, energy_threshold)
+                if event_set is not None:
+                    glyph_type = visualization_type if visualization_type in GLYPH_TYPES else "spheres"
+                    event_set.set_range_glyph(range_index, glyph_type)
+                    self.main_window.glWidget.request_update()
 
         except Exception as e:
             print(f"Ошибка при изменении визуализации диапазона: {e}")
@@ -543,9 +546,11 @@ class PropertiesField(QtWidgets.QWidget):
 
             self.save_properties_settings()
 
-            # Применяем изменения через reload_file_with_settings (как раньше)
-            if self.main_window and hasattr(self.main_window, 'reload_file_with_settings'):
-                self.main_window.reload_file_with_settings(file_path)
+            # Новый цвет записывается прямо в буферы экземпляров диапазона
+            event_set, range_index = self.find_event_range(file_path, energy_threshold)
+            if event_set is not None:
+                event_set.set_range_colors(range_index, rgb=new_color)
+                self.main_window.glWidget.request_update()
 
     def close_tab(self, index):
         """Закрывает вкладку"""
@@ -596,154 +601,40 @@ class PropertiesField(QtWidgets.QWidget):
 
             self.save_properties_settings()
 
-            # Определяем тип визуализации для этого диапазона
-            visualization_type = self.file_properties[file_path]['energy_ranges'][energy_threshold].get('visualization',
-                                                                                                        'spheres')
+            # Одинаково для сфер, мячиков и точек - меняется только альфа в буфере экземпляров
+            self.update_range_opacity(file_path, energy_threshold, opacity)
 
-            print(f"🎯 Тип визуализации для диапазона {energy_threshold}: {visualization_type}")
+    def find_event_range(self, file_path, energy_threshold):
+        """Набор событий файла в сцене и номер диапазона энергии -> (набор, номер) или (None, -1)"""
+        if not self.main_window or file_path not in self.main_window.glWidget.event_sets:
+            return None, -1
 
-            # В зависимости от типа визуализации используем разные методы
-            if visualization_type == "spheres":
-                # Для сфер используем специальный метод обновления
-                self.update_sphere_opacity(file_path, energy_threshold, opacity)
-            else:
-                # Для мячиков и точек используем перезагрузку файла
-                if self.main_window and hasattr(self.main_window, 'reload_file_with_settings'):
-                    self.main_window.reload_file_with_settings(file_path)
+        event_set = self.main_window.glWidget.event_sets[file_path]
+        catalog = event_set.catalog
 
-    def update_sphere_opacity(self, file_path, energy_threshold, opacity):
-        """Обновляет прозрачность сфер для конкретного диапазона"""
-        try:
-            print(f"🔄 Обновление прозрачности сфер для диапазона {energy_threshold}: {opacity}")
+        # пороги в настройках могли измениться после загрузки - пересчитываем индексы диапазонов
+        thresholds = sorted(self.file_properties[file_path]['energy_ranges'].keys(), reverse=True)
+        if catalog.thresholds != thresholds:
+            catalog.set_ranges(thresholds)
+
+        range_index = catalog.range_of(energy_threshold)
+        if range_index < 0:
+            return None, -1
+        return event_set, range_index
 
-            if not self.main_window or file_path not in self.main_window.loaded_files:
+    def update_range_opacity(self, file_path, energy_threshold, opacity):
+        """Обновляет прозрачность событий конкретного диапазона"""
+        try:
+            event_set, range_index = self.find_event_range(file_path, energy_threshold)
+            if event_set is None:
                 return
 
-            obj_ids = self.main_window.loaded_files[file_path]
-
-            for obj_id in obj_ids:
-                if obj_id in self.main_window.glWidget.objects:
-                    obj = self.main_window.glWidget.objects[obj_id]
-
-                    # Проверяем что это событие нужного типа
-                    if obj.obj_type == "event":
-                        # Получаем энергию объекта
-                        energy = obj.data.get("energy", 0)
-                        try:
-                            energy_float = float(energy) if energy else 0.0
-                        except (ValueError, TypeError):
-                            energy_float = 0.0
-
-                        # Проверяем попадает ли в наш диапазон
-                        thresholds = sorted(self.file_properties[file_path]['energy_ranges'].keys(), reverse=True)
-                        for thresh in thresholds:
-                            if energy_float >= thresh:
-                                if thresh == energy_threshold:
-                                    # Это наш объект - обновляем его прозрачность
-                                    self._update_single_sphere_opacity(obj, opacity)
-                                break
+            event_set.set_range_colors(range_index, alpha=opacity)
 
             # Обновляем сцену
-            self.main_window.glWidget.updateGL()
-
-        except Exception as e:
-            print(f"❌ Ошибка обновления прозрачности сфер: {e}")
-            import traceback
-            traceback.print_exc()
-
-    def _update_single_sphere_opacity(self, obj, opacity):
-        """Обновляет прозрачность одной сферы"""
-        try:
-            print(
-                f"🎨 Обновление сферы {obj.id}: старая прозрачность={obj.current_opacity if hasattr(obj, 'current_opacity') else 'нет'}, новая={opacity}")
-
-            # Обновляем сохраненную прозрачность
-            obj.current_opacity = opacity
-
-            # Если у объекта есть base_color, обновляем его альфа-канал
-            if hasattr(obj, 'base_color'):
-                if len(obj.base_color) == 4:
-                    obj.base_color[3] = opacity
-                elif len(obj.base_color) == 3:
-                    obj.base_color.append(opacity)
-
-            # Получаем текущие цвета VBO
-            if hasattr(obj.mesh, 'colorsFacesVBO') and obj.mesh.colorsFacesVBO:
-                try:
-                    # Получаем данные из VBO
-                    colors_data = obj.mesh.colorsFacesVBO.data
-
-                    # Проверяем структуру данных
-                    if colors_data is not None:
-                        # Преобразуем в numpy массив
-                        colors_array = np.array(colors_data, dtype=np.float32)
-
-                        # Меняем альфа-канал у каждого 4-го элемента (RGBA формат)
-                        colors_array[3::4] = opacity
-
-                        # Создаем новый VBO
-                        new_vbo = vbo.VBO(colors_array)
-
-                        # Заменяем старый VBO
-                        obj.mesh.colorsFacesVBO.delete()
-                        obj.mesh.colorsFacesVBO = new_vbo
-
-                        print(f"✅ VBO сферы {obj.id} обновлен с прозрачностью {opacity}")
-                    else:
-                        print(f"⚠️ VBO данных нет для сферы {obj.id}")
-
-                except Exception as e:
-                    print(f"⚠️ Ошибка обновления VBO: {e}")
-                    # Попробуем альтернативный способ
-                    self._recreate_sphere_with_opacity(obj, opacity)
-            else:
-                print(f"⚠️ У сферы {obj.id} нет colorsFacesVBO")
-                self._recreate_sphere_with_opacity(obj, opacity)
+            self.main_window.glWidget.request_update()
 
         except Exception as e:
-            print(f"❌ Ошибка обновления сферы: {e}")
+            print(f"❌ Ошибка обновления прозрачности диапазона: {e}")
             import traceback
             traceback.print_exc()
-
-    def _recreate_sphere_with_opacity(self, obj, opacity):
-        """Пересоздает сферу с новой прозрачностью"""
-        try:
-            print(f"🔄 Пересоздание сферы {obj.id} с прозрачностью {opacity}")
-
-            # Получаем параметры объекта
-            x, y, z = obj.location
-            event_type = obj.data.get("type", "unknown")
-            energy = obj.data.get("energy", 1.0)
-
-            # Получаем базовый цвет
-            if hasattr(obj, 'base_color'):
-                base_color = obj.base_color[:3]  # Берем только RGB
-            else:
-                base_color = [1.0, 0.0, 0.0]  # По умолчанию красный
-
-            # Формируем новый цвет с прозрачностью
-            rgba_color = base_color + [opacity]
-
-            # Очищаем старый объект
-            if hasattr(obj, 'mesh'):
-                self.main_window.cleanup_mesh_vbo(obj.mesh)
-
-            # Получаем ID объекта
-            obj_id = obj.id
-
-            # Удаляем старый объект из GLWidget
-            del self.main_window.glWidget.objects[obj_id]
-
-            # Создаем новую сферу с обновленной прозрачностью
-            new_obj = self.main_window.glWidget.add_object_event(x, y, z, event_type, energy, rgba_color)
-
-            # Сохраняем тип визуализации
-            new_obj.data['visualization'] = 'spheres'
-
-            # Сохраняем тот же ID
-            self.main_window.glWidget.objects[obj_id] = new_obj
-
-            print(f"✅ Сфера {obj_id} пересоздана с прозрачностью {opacity}")
-
-        except Exception as e:
-            print(f"❌ Ошибка пересоздания сферы: {e}")
\ No newline at end of file
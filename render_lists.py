@@ -0,0 +1,86 @@
+import numpy as np
+
+# Списки отрисовки объектов сцены. Перестраиваются только при изменении сцены (добавление, удаление,
+# включение/выключение объекта, смена прозрачности); в кадре объекты не перебираются.
+# Внутри прохода объекты сгруппированы по стилю поверхности и сетке - соседние вызовы не меняют uniform.
+# Углы ограничивающих прямоугольников всех объектов в мировых координатах хранятся одним массивом:
+# отсечение по пирамиде видимости и размер на экране для выбора детализации считаются векторно.
+# Порядок прозрачных объектов не нужен - они рисуются во взвешенную сумму (transparency.py).
+
+# порог альфы, ниже которого объект рисуется в прозрачном проходе
+TRANSPARENT_ALPHA = 0.99
+
+
+def is_transparent(obj):
+    """Полупрозрачный объект (события или поверхность с альфой стиля меньше 1)"""
+    if obj.current_opacity < TRANSPARENT_ALPHA:
+        return True
+    style = obj.mesh.surfaceStyle
+    return style is not None and style.base_color[3] < TRANSPARENT_ALPHA
+
+
+def world_corners(begin, end, matrix):
+    """Углы прямоугольника begin-end в мировых координатах (8 x 3)"""
+    begin, end = np.array(begin), np.array(end)
+    corners = np.array([[ex, ey, ez, 1.0] for ex in (begin[0], end[0])
+                        for ey in (begin[1], end[1]) for ez in (begin[2], end[2])])
+    return (corners @ np.array(matrix).T)[:, :3]
+
+
+class RenderPass:
+    """Объекты одного прохода и их углы в мировых координатах"""
+    def __init__(self, objects):
+        self.objects = objects
+        n = len(objects)
+        self.corners = np.zeros((n, 8, 3))
+        # наибольший масштаб объекта (пикселей на единицу модели = масштаб проекции * scale / расстояние)
+        self.scales = np.ones(n)
+        for i, obj in enumerate(objects):
+            self.corners[i] = world_corners(obj.collision.pointBegin, obj.collision.pointEnd, obj.matrix)
+            self.scales[i] = float(np.max(np.abs(obj.scale)))
+        self.boundsMin = self.corners.min(axis=1)
+        self.boundsMax = self.corners.max(axis=1)
+
+    def visible(self, planes):
+        """Номера объектов, не лежащих целиком за одной из плоскостей (planes None - все)"""
+        if planes is None or len(self.objects) == 0:
+            return np.arange(len(self.objects))
+        distances = self.corners @ planes[:, :3].T + planes[:, 3]
+        return np.flatnonzero(~(distances < 0).all(axis=1).any(axis=1))
+
+    def pixels_per_unit(self, indices, camera, projection_scale):
+        """Пикселей экрана на единицу модели в ближайшей к камере точке (inf - камера внутри, нет камеры)"""
+        if projection_scale is None:
+            return np.full(len(indices), np.inf)
+        camera = np.asarray(camera, dtype=np.float64)
+        nearest = np.clip(camera, self.boundsMin[indices], self.boundsMax[indices])
+        distances = np.linalg.norm(nearest - camera, axis=1)
+        with np.errstate(divide='ignore'):
+            return np.where(distances > 0, projection_scale * self.scales[indices] / distances, np.inf)
+
+
+class RenderLists:
+    """Кэш проходов отрисовки: непрозрачные и прозрачные включенные объекты сцены"""
+    def __init__(self):
+        self.opaque = RenderPass([])
+        self.transparent = RenderPass([])
+        self.valid = False
+
+    def invalidate(self):
+        """Сцена изменилась - списки перестроятся перед следующим кадром"""
+        self.valid = False
+
+    def update(self, objects):
+        if self.valid:
+            return
+        opaque, transparent = [], []
+        for obj in objects.values():
+            if obj.enabled and obj.mesh.enabled:
+                (transparent if is_transparent(obj) else opaque).append(obj)
+
+        # группировка по стилю поверхности и сетке
+        def group(obj):
+            return id(obj.mesh.surfaceStyle), id(obj.mesh)
+        self.opaque = RenderPass(sorted(opaque, key=group))
+        self.transparent = RenderPass(sorted(transparent, key=group))
+        self.valid = True
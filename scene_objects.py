@@ -35,21 +35,22 @@ class SceneObject:
 
     # вычисляет итоговую матрицу преобразования
     def calculate_matrix(self):
-        a, b, c = self.rotation
+        a, b, c = (glm.radians(float(angle)) for angle in self.rotation)
         x, y, z = self.location
         sx, sy, sz = self.scale
-        ox, oy, oz = self.origin
 
-        # Создаем матрицы преобразования
-        T = glm.translate(glm.mat4(1.0), glm.vec3(x, y, z))
-        R_x = glm.rotate(glm.mat4(1.0), a, glm.vec3(1.0, 0.0, 0.0))
-        R_y = glm.rotate(glm.mat4(1.0), b, glm.vec3(0.0, 1.0, 0.0))
-        R_z = glm.rotate(glm.mat4(1.0), c, glm.vec3(0.0, 0.0, 1.0))
-        S = glm.scale(glm.mat4(1.0), glm.vec3(sx, sy, sz))
-        O = glm.translate(glm.mat4(1.0), glm.vec3(-ox, -oy, -oz))
+        # Создаем матрицы преобразования (углы поворота хранятся в градусах).
+        # Матрица в double: location - начало координат набора данных (для рудничных координат - миллионы),
+        # во float32 такое смещение теряет сантиметры
+        T = glm.translate(glm.dmat4(1.0), glm.dvec3(x, y, z))
+        R_x = glm.rotate(glm.dmat4(1.0), a, glm.dvec3(1.0, 0.0, 0.0))
+        R_y = glm.rotate(glm.dmat4(1.0), b, glm.dvec3(0.0, 1.0, 0.0))
+        R_z = glm.rotate(glm.dmat4(1.0), c, glm.dvec3(0.0, 0.0, 1.0))
+        S = glm.scale(glm.dmat4(1.0), glm.dvec3(sx, sy, sz))
 
-        # Композиция: T * R_z * R_y * R_x * S * O
-        self.matrix = T * R_z * R_y * R_x * S * O
+        # Композиция как у прежних glTranslate/glRotatef/glScale: T * R_x * R_y * R_z * S
+        # (origin - точка вращения камеры, в матрицу модели не входит)
+        self.matrix = T * R_x * R_y * R_z * S
 
     # обработка наведения мыши
     def on_hover(self):
@@ -0,0 +1,62 @@
+import OpenGL.GL as gl
+
+# сборка шейдерных программ GLSL
+
+
+class ShaderError(RuntimeError):
+    pass
+
+
+def compile_shader(source, shader_type):
+    shader = gl.glCreateShader(shader_type)
+    gl.glShaderSource(shader, source)
+    gl.glCompileShader(shader)
+
+    if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+        log = gl.glGetShaderInfoLog(shader)
+        gl.glDeleteShader(shader)
+        raise ShaderError(f"Ошибка компиляции шейдера: {log.decode(errors='replace') if isinstance(log, bytes) else log}")
+
+    return shader
+
+
+def compile_program(vertex_source, fragment_source, attribute_locations=None):
+    """Собирает программу из вершинного и фрагментного шейдеров.
+
+    attribute_locations - словарь {имя атрибута: номер}, номера задаются до линковки,
+    чтобы VBO можно было привязывать без запросов glGetAttribLocation.
+    """
+    vertex = compile_shader(vertex_source, gl.GL_VERTEX_SHADER)
+    fragment = compile_shader(fragment_source, gl.GL_FRAGMENT_SHADER)
+
+    program = gl.glCreateProgram()
+    gl.glAttachShader(program, vertex)
+    gl.glAttachShader(program, fragment)
+
+    for name, location in (attribute_locations or {}).items():
+        gl.glBindAttribLocation(program, location, name)
+
+    gl.glLinkProgram(program)
+
+    gl.glDetachShader(program, vertex)
+    gl.glDetachShader(program, fragment)
+    gl.glDeleteShader(vertex)
+    gl.glDeleteShader(fragment)
+
+    if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+        log = gl.glGetProgramInfoLog(program)
+        gl.glDeleteProgram(program)
+        raise ShaderError(f"Ошибка линковки программы: {log.decode(errors='replace') if isinstance(log, bytes) else log}")
+
+    return program
+
+
+# кэш положений uniform-переменных, чтобы не спрашивать драйвер каждый кадр
+_UNIFORM_LOCATIONS = {}
+
+
+def uniform_location(program, name):
+    key = (program, name)
+    if key not in _UNIFORM_LOCATIONS:
+        _UNIFORM_LOCATIONS[key] = gl.glGetUniformLocation(program, name)
+    return _UNIFORM_LOCATIONS[key]
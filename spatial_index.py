@@ -0,0 +1,159 @@
+import numpy as np
+
+# Пространственный индекс событий: октодерево по кодам Мортона.
+# События сортируются по коду, каждый лист - непрерывный диапазон отсортированного порядка,
+# поэтому отсечение по пирамиде видимости работает с целыми листьями, а не с событиями.
+
+# глубина кодов Мортона (бит на ось)
+MORTON_BITS = 10
+
+# максимум событий в листе
+LEAF_SIZE = 4096
+
+# глифы меньше этого размера (в пикселях) не рисуются (по умолчанию, см. EventOctree.set_radii)
+MIN_GLYPH_PIXELS = 1.0
+
+
+def _spread_bits(values):
+    """Раздвигает 10 младших бит так, чтобы между ними было по два нулевых"""
+    v = values.astype(np.uint64) & np.uint64(0x3FF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+    return v
+
+
+def morton_codes(positions, bounds_min, bounds_max):
+    extent = np.maximum(bounds_max - bounds_min, 1e-9)
+    cells = (1 << MORTON_BITS) - 1
+    q = np.clip(((positions - bounds_min) / extent * cells).astype(np.int64), 0, cells)
+    return (_spread_bits(q[:, 0]) << np.uint64(2)) | (_spread_bits(q[:, 1]) << np.uint64(1)) | _spread_bits(q[:, 2])
+
+
+def frustum_planes(view_projection):
+    """Плоскости пирамиды видимости (6 x 4, нормали внутрь) из матрицы проекция * вид.
+
+    Матрица в строчной записи: clip = M @ [x, y, z, 1].
+    """
+    m = np.asarray(view_projection, dtype=np.float64)
+    planes = np.array([m[3] + m[0], m[3] - m[0],
+                       m[3] + m[1], m[3] - m[1],
+                       m[3] + m[2], m[3] - m[2]])
+    norms = np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+    return planes / np.maximum(norms, 1e-12)
+
+
+class EventOctree:
+    def __init__(self, positions, leaf_size=LEAF_SIZE):
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.leaf_size = leaf_size
+
+        n = len(self.positions)
+        if n == 0:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.leaf_starts = np.zeros(0, dtype=np.int64)
+            self.leaf_stops = np.zeros(0, dtype=np.int64)
+            self.leaf_min = np.zeros((0, 3))
+            self.leaf_max = np.zeros((0, 3))
+            self.leaf_radius = np.zeros(0)
+            self.radii = np.zeros(0, dtype=np.float32)
+            self.min_pixels = np.zeros(0, dtype=np.float32)
+            return
+
+        bounds_min = self.positions.min(axis=0).astype(np.float64)
+        bounds_max = self.positions.max(axis=0).astype(np.float64)
+        codes = morton_codes(self.positions.astype(np.float64), bounds_min, bounds_max)
+
+        self.order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[self.order]
+
+        starts = []
+        self._split(sorted_codes, 0, n, 0, 0, starts)
+        self.leaf_starts = np.array(starts, dtype=np.int64)
+        self.leaf_stops = np.append(self.leaf_starts[1:], n)
+
+        # границы листьев по отсортированным позициям
+        sorted_positions = self.positions[self.order].astype(np.float64)
+        self.leaf_min = np.minimum.reduceat(sorted_positions, self.leaf_starts, axis=0)
+        self.leaf_max = np.maximum.reduceat(sorted_positions, self.leaf_starts, axis=0)
+
+        self.set_radii(np.zeros(n, dtype=np.float32))
+
+    def _split(self, codes, start, stop, level, prefix, starts):
+        """Рекурсивно делит диапазон кодов на октанты, пока листья не станут достаточно малы"""
+        if stop - start <= self.leaf_size or level == MORTON_BITS:
+            starts.append(start)
+            return
+
+        shift = 3 * (MORTON_BITS - level - 1)
+        # младшие биты prefix нулевые, поэтому prefix + 8 << shift - граница следующего родителя
+        octants = np.array([prefix + (octant << shift) for octant in range(9)], dtype=np.uint64)
+        bounds = np.searchsorted(codes[start:stop], octants) + start
+        for octant in range(8):
+            if bounds[octant + 1] > bounds[octant]:
+                self._split(codes, bounds[octant], bounds[octant + 1], level + 1, prefix + (octant << shift), starts)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def set_radii(self, radii, min_pixels=MIN_GLYPH_PIXELS):
+        """Радиусы глифов (меняются при смене типа визуализации).
+
+        min_pixels - размер на экране, меньше которого глиф отбрасывается (число или значение для каждого события;
+        0 - глиф не отбрасывается по размеру, например спрайт с минимальным размером в шейдере).
+        """
+        self.radii = np.asarray(radii, dtype=np.float32)
+        self.min_pixels = np.broadcast_to(np.asarray(min_pixels, dtype=np.float32), self.radii.shape)
+        if len(self.radii):
+            self.leaf_radius = np.maximum.reduceat(self.radii[self.order], self.leaf_starts).astype(np.float64)
+            self.leaf_min_pixels = np.minimum.reduceat(self.min_pixels[self.order], self.leaf_starts)
+
+    def query(self, planes, camera, projection_scale):
+        """Видимые события и их размер на экране в пикселях.
+
+        planes - плоскости frustum_planes, camera - положение камеры,
+        projection_scale - пикселей на единицу тангенса угла (высота окна / (2 tg(fov/2))).
+        """
+        if len(self.positions) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        camera = np.asarray(camera, dtype=np.float64)
+        normals, offsets = planes[:, :3], planes[:, 3:4]
+
+        # проверка листьев: расширенный радиусом AABB против шести плоскостей
+        center = (self.leaf_min + self.leaf_max) / 2
+        extent = (self.leaf_max - self.leaf_min) / 2 + self.leaf_radius[:, None]
+        distance = normals @ center.T + offsets
+        reach = np.abs(normals) @ extent.T
+        outside = (distance + reach < 0).any(axis=0)
+        inside = (distance - reach >= 0).all(axis=0)
+
+        # лист целиком мельче порога всех своих событий - отбрасываем без проверки событий
+        nearest = np.clip(camera, self.leaf_min, self.leaf_max)
+        leaf_distance = np.linalg.norm(nearest - camera, axis=1)
+        with np.errstate(divide='ignore'):
+            leaf_pixels = 2 * self.leaf_radius * projection_scale / leaf_distance
+        visible = ~outside & (leaf_pixels >= self.leaf_min_pixels)
+
+        leaves = np.flatnonzero(visible)
+        if len(leaves) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        indices = np.concatenate([self.order[self.leaf_starts[i]:self.leaf_stops[i]] for i in leaves])
+        partial = np.repeat(~inside[leaves], self.leaf_stops[leaves] - self.leaf_starts[leaves])
+
+        positions = self.positions[indices].astype(np.float64)
+        radii = self.radii[indices].astype(np.float64)
+
+        keep = np.ones(len(indices), dtype=bool)
+        if partial.any():
+            # листья на границе - проверяем каждое событие сферой
+            d = positions[partial] @ normals.T + offsets.T
+            keep[partial] = (d >= -radii[partial, None]).all(axis=1)
+
+        event_distance = np.maximum(np.linalg.norm(positions - camera, axis=1) - radii, 1e-6)
+        pixels = 2 * radii * projection_scale / event_distance
+        keep &= pixels >= self.min_pixels[indices]
+
+        return indices[keep], pixels[keep].astype(np.float32)
@@ -0,0 +1,196 @@
+import numpy as np
+import OpenGL.GL as gl
+
+from shaders import compile_program, uniform_location
+
+# Прозрачность без сортировки (weighted blended OIT): прозрачные поверхности и события рисуются
+# в любом порядке в два буфера размером с окно:
+#   накопление (RGBA16F) - в RGB сумма цвет * альфа * вес, в A произведение (1 - альфа) (revealage),
+#   вес (R16F) - сумма альфа * вес.
+# GL 3.3 не задает смешивание для каждого буфера отдельно, поэтому функция общая:
+# RGB складываются, A умножается на (1 - альфа источника).
+# Затем средневзвешенный цвет накладывается на кадр с непрозрачностью 1 - revealage.
+# Вес убывает с глубиной вида, ближние слои преобладают над дальними.
+# Глубина непрозрачной сцены копируется в буфер OIT: прозрачное за стенами карьера не видно.
+
+# глубина вида (единицы сцены), на которой вес слоя спадает до 0.03
+OIT_DEPTH_SCALE = 500.0
+# пределы веса (сумма цвета в RGBA16F не должна переполняться)
+OIT_WEIGHT_RANGE = (1e-2, 3e2)
+
+# выходы фрагментного шейдера, рисующего в буфер OIT: вместо frag_color = ... вызывается write_color(...)
+OIT_FRAGMENT_OUTPUT = """
+layout(location = 0) out vec4 frag_color;
+layout(location = 1) out vec4 frag_weight;
+
+// 1 - прозрачный проход в буферы OIT, 0 - обычный вывод цвета
+uniform int u_oit;
+
+void write_color(vec4 color) {
+    if (u_oit == 1) {
+        // глубина вида = 1 / gl_FragCoord.w
+        float z = 1.0 / (gl_FragCoord.w * %(depth_scale)r);
+        float w = color.a * clamp(0.03 / (1e-5 + pow(z, 4.0)), %(min_weight)r, %(max_weight)r);
+        frag_color = vec4(color.rgb * color.a * w, color.a);
+        frag_weight = vec4(color.a * w);
+    } else {
+        frag_color = color;
+        frag_weight = vec4(0.0);
+    }
+}
+""" % {'depth_scale': OIT_DEPTH_SCALE, 'min_weight': OIT_WEIGHT_RANGE[0], 'max_weight': OIT_WEIGHT_RANGE[1]}
+
+# наложение на кадр: один треугольник на весь экран (координаты - по gl_VertexID, без буферов)
+OIT_COMPOSITE_VERTEX_SHADER = """
+#version 330 core
+
+const vec2 CORNERS[3] = vec2[](vec2(-1.0, -1.0), vec2(3.0, -1.0), vec2(-1.0, 3.0));
+
+void main() {
+    gl_Position = vec4(CORNERS[gl_VertexID], 0.0, 1.0);
+}
+"""
+
+OIT_COMPOSITE_FRAGMENT_SHADER = """
+#version 330 core
+
+uniform sampler2D u_accumulation;
+uniform sampler2D u_weight;
+
+out vec4 frag_color;
+
+void main() {
+    ivec2 pixel = ivec2(gl_FragCoord.xy);
+    vec4 accumulation = texelFetch(u_accumulation, pixel, 0);
+    float revealage = accumulation.a;
+    if (revealage >= 1.0) {
+        // прозрачного в пикселе нет
+        discard;
+    }
+    float weight = texelFetch(u_weight, pixel, 0).r;
+    // смешивание (1 - A, A): кадр * revealage + средний цвет * (1 - revealage)
+    frag_color = vec4(accumulation.rgb / clamp(weight, 1e-4, 5e4), revealage);
+}
+"""
+
+
+def _depth_format(framebuffer):
+    """Формат глубины буфера кадра - копия глубины (glBlitFramebuffer) требует совпадения форматов"""
+    gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, framebuffer)
+    attachment = gl.GL_DEPTH if framebuffer == 0 else gl.GL_DEPTH_ATTACHMENT
+    stencil = gl.glGetFramebufferAttachmentParameteriv(gl.GL_FRAMEBUFFER, attachment,
+                                                       gl.GL_FRAMEBUFFER_ATTACHMENT_STENCIL_SIZE)
+    return gl.GL_DEPTH24_STENCIL8 if int(np.ravel(stencil)[0]) else gl.GL_DEPTH_COMPONENT24
+
+
+class TransparencyBuffer:
+    """Буферы взвешенной прозрачности размером с область вывода и их наложение на кадр"""
+    def __init__(self):
+        self.framebuffer = None
+        self.accumulationTexture = None
+        self.weightTexture = None
+        self.depthBuffer = None
+        self.size = (0, 0)
+
+        self.program = None
+        # пустой VAO для треугольника наложения (в core profile рисовать без VAO нельзя)
+        self.vao = None
+
+    def _texture(self, internal_format, data_format, width, height):
+        texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, internal_format, width, height, 0, data_format, gl.GL_FLOAT, None)
+        return texture
+
+    def _create(self, width, height, default_framebuffer):
+        self.release()
+        depth_format = _depth_format(default_framebuffer)
+
+        self.framebuffer = gl.glGenFramebuffers(1)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+
+        self.accumulationTexture = self._texture(gl.GL_RGBA16F, gl.GL_RGBA, width, height)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_TEXTURE_2D,
+                                  self.accumulationTexture, 0)
+        self.weightTexture = self._texture(gl.GL_R16F, gl.GL_RED, width, height)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT1, gl.GL_TEXTURE_2D, self.weightTexture, 0)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+        self.depthBuffer = gl.glGenRenderbuffers(1)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.depthBuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, depth_format, width, height)
+        if depth_format == gl.GL_DEPTH24_STENCIL8:
+            attachment = gl.GL_DEPTH_STENCIL_ATTACHMENT
+        else:
+            attachment = gl.GL_DEPTH_ATTACHMENT
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, attachment, gl.GL_RENDERBUFFER, self.depthBuffer)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+
+        if gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) != gl.GL_FRAMEBUFFER_COMPLETE:
+            print("Буфер прозрачности не собран драйвером")
+        self.size = (width, height)
+
+    def begin(self, default_framebuffer=0):
+        """Переключает вывод в буферы OIT (размер - текущая область вывода) и копирует глубину кадра"""
+        _, _, width, height = (int(v) for v in gl.glGetIntegerv(gl.GL_VIEWPORT))
+        width, height = max(1, width), max(1, height)
+        if self.framebuffer is None or self.size != (width, height):
+            self._create(width, height, default_framebuffer)
+
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, default_framebuffer)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, self.framebuffer)
+        gl.glBlitFramebuffer(0, 0, width, height, 0, 0, width, height, gl.GL_DEPTH_BUFFER_BIT, gl.GL_NEAREST)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+
+        gl.glDrawBuffers(2, [gl.GL_COLOR_ATTACHMENT0, gl.GL_COLOR_ATTACHMENT1])
+        gl.glClearBufferfv(gl.GL_COLOR, 0, (0.0, 0.0, 0.0, 1.0))
+        gl.glClearBufferfv(gl.GL_COLOR, 1, (0.0, 0.0, 0.0, 0.0))
+
+        # глубина проверяется, но не пишется: все прозрачные слои попадают в сумму
+        gl.glDepthMask(gl.GL_FALSE)
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFuncSeparate(gl.GL_ONE, gl.GL_ONE, gl.GL_ZERO, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def end(self, default_framebuffer=0):
+        """Накладывает прозрачные слои на кадр и восстанавливает состояние смешивания и глубины"""
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, default_framebuffer)
+
+        if self.program is None:
+            self.program = compile_program(OIT_COMPOSITE_VERTEX_SHADER, OIT_COMPOSITE_FRAGMENT_SHADER)
+            self.vao = gl.glGenVertexArrays(1)
+
+        gl.glUseProgram(self.program)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.accumulationTexture)
+        gl.glActiveTexture(gl.GL_TEXTURE1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.weightTexture)
+        gl.glUniform1i(uniform_location(self.program, "u_accumulation"), 0)
+        gl.glUniform1i(uniform_location(self.program, "u_weight"), 1)
+
+        gl.glDisable(gl.GL_DEPTH_TEST)
+        gl.glBlendFunc(gl.GL_ONE_MINUS_SRC_ALPHA, gl.GL_SRC_ALPHA)
+        gl.glBindVertexArray(self.vao)
+        gl.glDrawArrays(gl.GL_TRIANGLES, 0, 3)
+        gl.glBindVertexArray(0)
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glUseProgram(0)
+
+        gl.glEnable(gl.GL_DEPTH_TEST)
+        gl.glDepthMask(gl.GL_TRUE)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def release(self):
+        if self.framebuffer is not None:
+            gl.glDeleteFramebuffers(1, [self.framebuffer])
+            gl.glDeleteTextures(2, [self.accumulationTexture, self.weightTexture])
+            gl.glDeleteRenderbuffers(1, [self.depthBuffer])
+        self.framebuffer = None
+        self.accumulationTexture = None
+        self.weightTexture = None
+        self.depthBuffer = None
+        self.size = (0, 0)